@@ -0,0 +1,279 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Builds and queries a cross-reference index of the native function calls in a corpus of AI scripts
+# if run from the command line, "build" reads every AI file in the given directories once, and writes the index
+# to a file; "query" answers a lookup from that file alone, without reading any script
+#
+# for each native function, the index lists the procedures that call it, and for each literal argument
+# passed to it, the procedures that pass that value, so that questions like "which AIs use skill 0x1F3"
+# or "who sets global flag 0x220" do not need the whole corpus to be decompiled
+# only literal arguments are indexed: a call whose argument is computed is found by its function, but not by a value
+#
+# building again only reads the files that changed since the index was written,
+# unless eo_value_lookup changed, which can change the function of every call
+#
+# the scripts are only read when building, so a query only imports what it needs to read the index, and starts quickly
+
+import argparse
+import json
+import os
+from sys import stderr
+
+from eo_value_lookup import game_codes
+
+def eprint(s):
+    stderr.write(s + "\n")
+
+# the index format; an index of another version is built again from scratch
+index_version = 1
+
+# names for groups of function arguments that refer to the same thing, usable in queries in place of a function
+# each is a list of (function, argument position) pairs; functions are named as in the decompilation (without a leading _)
+query_kinds = {
+    "skill" : [ ("set_action_skill", 0), ("set_action_leveled_skill", 0) ],
+    "enemy" : [ ("enemy_exists", 0), ("count_enemies_of_type", 0), ("set_targeting_enemy_type", 0), ("set_action_call_allies", 0) ],
+    "global_flag" : [ ("get_global_flag", 0), ("set_global_flag", 0), ("unset_global_flag", 0) ],
+    "flag" : [ ("get_flag", 0), ("set_flag", 0), ("unset_flag", 0) ],
+    "storage" : [ ("retrieve", 0), ("store", 1) ],
+}
+
+def parseArguments():
+    # Create argument parser
+    parser = argparse.ArgumentParser(description="Builds and queries an index of the native functions called by Etrian Odyssey AI files, and the literal arguments they are called with.")
+
+    # Print version
+    parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
+
+    subparsers = parser.add_subparsers(dest="command", help="what to do with the index")
+    subparsers.required = True
+
+    sub = subparsers.add_parser("build", help="read the AI files and write the index")
+    sub.add_argument("game", choices=game_codes, help="which game the data is from")
+    sub.add_argument("index_file", help="name of the file in which to place the index; an existing index of the same game is updated")
+    sub.add_argument("input_paths", nargs="+", metavar="input_path", help="AI files, or directories to search for .bf files")
+    sub.add_argument("--hide_alerts", action="store_true", help="the summary of the warnings raised while reading the files will not be printed to stderr")
+
+    sub = subparsers.add_parser("query", help="look up the callers of a function, or of a function with a given argument")
+    sub.add_argument("index_file", help="name of the file containing the index")
+    sub.add_argument("function", help="a native function (as named in the decompilation), or one of: " + ", ".join(sorted(query_kinds)))
+    sub.add_argument("value", nargs="?", help="the literal argument to look for (0x for hex); if not given, every literal argument used is listed")
+    sub.add_argument("--arg", type=int, metavar="N", help="only look at the Nth argument of the function (counting from 0); by default, every argument is looked at")
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    return args
+
+# returns the name a native function is displayed with in the decompilation
+def function_name(natives, index):
+    if index in natives:
+        name = natives[index].name
+        if name[0] == "_":
+            name = name[1:]
+        return name
+    return "func_" + "{:#06x}".format(index)
+
+# returns the native function calls of an abstracted script, as a list of (procedure name, function name, arguments)
+# arguments are given in the order the decompilation shows them, and are None if they are not a literal
+# the stack is followed within each basic block, so a value pushed in an earlier block counts as not a literal
+def script_calls(natives, basic_blocks, proc_info):
+    import decompile_ai
+
+    def block_targets(block_num):
+        targets = []
+        for oper in basic_blocks[block_num].operations:
+            if oper.opcode == 0x25:   # COND
+                targets += oper.args
+            elif oper.opcode == 0x0D:   # GOTO
+                targets.append( oper.args[0] )
+        return targets
+
+    calls = []
+    for proc in proc_info:
+        for block_num in sorted( decompile_ai.depth_first_search([proc.block_num], block_targets) ):
+            stack = []
+            for oper in basic_blocks[block_num].operations:
+                # the top of the stack is the first argument
+                popped = [ stack.pop() if stack else None for _ in range(oper.pops) ]
+                if oper.opcode in [0x23, 0x24]:   # FUNC or SEND
+                    calls.append( (proc.name, function_name(natives, oper.args[0]), popped) )
+                if oper.opcode in decompile_ai.lit_ops:
+                    stack.append( oper.args[0] )
+                else:
+                    stack += [None] * oper.pushes
+    return calls
+
+# returns the native function calls of the AI file at path (see script_calls)
+def file_calls(path, game_context):
+    import unpack_ai
+    import decompile_ai
+    flow = unpack_ai.Flow_File(path, game_context)
+    basic_blocks, proc_info, special_labels = decompile_ai.abstract_flow(flow)
+    return script_calls(game_context.native_functions, basic_blocks, proc_info)
+
+# returns the AI files at or under the given paths
+def find_ai_files(input_paths):
+    paths = []
+    for input_path in input_paths:
+        if not os.path.isdir(input_path):
+            paths.append(input_path)
+            continue
+        for subdir, dirs, files in os.walk(input_path):
+            paths += [ os.path.join(subdir, file) for file in files if file.endswith('.bf') ]
+    return sorted(paths)
+
+# returns what changes when a file changes
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_mtime, stat.st_size]
+
+# adds the calls of the file at path to the inverted index of the calls of every file
+# the index maps each function to the procedures that call it ("callers"), and, for each argument position,
+# each literal value to the procedures that pass it ("args"); procedures are listed as {file : [procedure names]}
+def add_calls(functions, path, calls):
+    for proc_name, name, call_args in calls:
+        function = functions.setdefault( name, { "callers" : {}, "args" : [] } )
+        add_caller( function["callers"], path, proc_name )
+        while len(function["args"]) < len(call_args):
+            function["args"].append( {} )
+        for position, value in enumerate(call_args):
+            if value is not None:
+                add_caller( function["args"][position].setdefault(str(value), {}), path, proc_name )
+
+def add_caller(callers, path, proc_name):
+    procs = callers.setdefault(path, [])
+    if proc_name not in procs:
+        procs.append(proc_name)
+
+# removes the calls of the given files from the inverted index, dropping functions and values that are left unused
+def remove_files(functions, paths):
+    for name in list(functions.keys()):
+        function = functions[name]
+        for path in paths:
+            function["callers"].pop(path, None)
+        if not function["callers"]:
+            del functions[name]
+            continue
+        for values in function["args"]:
+            for value in list(values.keys()):
+                for path in paths:
+                    values[value].pop(path, None)
+                if not values[value]:
+                    del values[value]
+
+# builds the index of the AI files at or under the given paths, and writes it to index_file
+# if an index of the same game (read with the same eo_value_lookup) is already there, only the files that changed are read
+# returns the alerts raised while reading the files
+def build_index(game, index_file, input_paths):
+    import eo_value_lookup
+    import alerts
+    from game_context import Game_Context
+    game_context = Game_Context(game)
+    lookup_stamps = [ file_stamp(source) for source in eo_value_lookup.source_files() ]
+
+    index = { "version" : index_version, "game" : game, "lookup" : lookup_stamps, "files" : {}, "functions" : {} }
+    if os.path.exists(index_file):
+        with open(index_file, "r") as f:
+            old_index = json.load(f)
+        if [old_index.get("version"), old_index.get("game"), old_index.get("lookup")] == [index_version, game, lookup_stamps]:
+            index = old_index
+
+    # the stamp of each file at the time it was read
+    files = index["files"]
+    paths = find_ai_files(input_paths)
+    stamps = dict( (path, file_stamp(path)) for path in paths )
+    stale = [ path for path in files if stamps.get(path) != files[path] ]
+    remove_files(index["functions"], stale)
+    for path in stale:
+        del files[path]
+
+    total_alerts = alerts.Alert_Collector()
+    read_count = 0
+    for path in paths:
+        if path in files:
+            continue
+        alerts.start_collecting(path)
+        try:
+            add_calls( index["functions"], path, file_calls(path, game_context) )
+        finally:
+            total_alerts.merge( alerts.stop_collecting().as_dict() )
+        files[path] = stamps[path]
+        read_count += 1
+
+    with open(index_file, "w") as f:
+        json.dump(index, f, sort_keys=True)
+    eprint("Read " + str(read_count) + " of " + str(len(files)) + " files")
+    return total_alerts
+
+# returns the (function, argument position) pairs a query looks at; position is None for every argument
+def query_targets(function, arg):
+    if function in query_kinds:
+        return [ (name, position) for name, position in query_kinds[function] if arg is None or arg == position ]
+    return [ (function, arg) ]
+
+# returns the value as it is written in the index
+def index_value(value):
+    try:
+        return str( int(value, 0) )
+    except ValueError:
+        return str( float(value) )
+
+# returns the lines answering a query on the index
+# with a value, these are the procedures passing that value, by file; without one, they are the values passed,
+# with the number of files passing each (or the callers, if no argument of the function is ever a literal)
+def query_index(index, function, value=None, arg=None):
+    functions = index["functions"]
+    targets = [ (name, position) for name, position in query_targets(function, arg) if name in functions ]
+    if not targets:
+        return ["No calls to " + function]
+
+    if value is None:
+        lines = []
+        for name, position in targets:
+            positions = range( len(functions[name]["args"]) ) if position is None else [position]
+            for pos in positions:
+                if pos >= len(functions[name]["args"]):
+                    continue
+                values = functions[name]["args"][pos]
+                for val in sorted( values, key=lambda v : float(v) ):
+                    lines.append( name + " arg " + str(pos) + " = " + val + "\t" + str(len(values[val])) + " files" )
+        if lines:
+            return lines
+        callers = {}
+        for name, position in targets:
+            for path, procs in functions[name]["callers"].items():
+                for proc_name in procs:
+                    add_caller(callers, path, proc_name)
+        return display_callers(callers)
+
+    val = index_value(value)
+    callers = {}
+    for name, position in targets:
+        arg_values = functions[name]["args"]
+        positions = range( len(arg_values) ) if position is None else [position]
+        for pos in positions:
+            if pos < len(arg_values) and val in arg_values[pos]:
+                for path, procs in arg_values[pos][val].items():
+                    for proc_name in procs:
+                        add_caller(callers, path, proc_name + " (" + name + ")")
+    if not callers:
+        return ["No calls to " + function + " with " + val]
+    return display_callers(callers)
+
+# returns a line for each file, listing the procedures in it
+def display_callers(callers):
+    return [ path + "\t" + ", ".join(callers[path]) for path in sorted(callers) ]
+
+if __name__ == '__main__':
+    # Parse the arguments
+    args = parseArguments()
+
+    if args.command == "build":
+        total_alerts = build_index(args.game, args.index_file, args.input_paths)
+        if total_alerts.total and not args.hide_alerts:
+            stderr.write( total_alerts.summary() )
+    else:
+        with open(args.index_file, "r") as f:
+            index = json.load(f)
+        print( "\n".join( query_index(index, args.function, args.value, args.arg) ) )
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Contains functionality for collecting the alerts raised while converting files
+# the library code raises an alert (with alert) for each unexpected value it finds; unless a collector
+# has been started, each alert is written to stderr as soon as it is raised
+#
+# a collector instead counts the alerts by kind and by the file they were raised in, keeps each distinct
+# message once (with how many times, and the first few places, it was raised), and gives a summary
+# or a JSON report at the end; collectors of separate processes can be merged
+#
+# a message can be given as a function that returns it, so that code raising many alerts does not build
+# messages nobody reads: the function is only called if the collector keeps messages (see wants_messages)
+#
+# each thread has its own collector, so that files converted at the same time in different threads
+# keep their alerts apart
+
+import json
+import threading
+from sys import stderr
+
+# holds the collector of each thread; see collector()
+thread_state = threading.local()
+
+# the number of places kept for each distinct message
+max_locations = 5
+
+# the alerts of one run
+class Alert_Collector():
+
+    # records an alert raised in the current file
+    # location says where in the file it was raised, if the message does not
+    def add(self, kind, message, location=None):
+        self.total += 1
+        record = self.kinds.setdefault( kind, { "count" : 0, "files" : {}, "messages" : {} } )
+        record["count"] += 1
+        record["files"][self.file] = record["files"].get(self.file, 0) + 1
+        if not self.keep_messages:
+            return
+        if callable(message):
+            message = message()
+        where = self.file if location is None else self.file + ": " + location
+        message_record = record["messages"].setdefault( message, { "count" : 0, "locations" : [] } )
+        message_record["count"] += 1
+        if len(message_record["locations"]) < max_locations and where not in message_record["locations"]:
+            message_record["locations"].append(where)
+
+    # adds the alerts of another collector (in the form given by as_dict) to this one
+    def merge(self, other):
+        self.total += other["total"]
+        for kind, other_record in other["kinds"].items():
+            record = self.kinds.setdefault( kind, { "count" : 0, "files" : {}, "messages" : {} } )
+            record["count"] += other_record["count"]
+            for filename, count in other_record["files"].items():
+                record["files"][filename] = record["files"].get(filename, 0) + count
+            for message, other_message in other_record["messages"].items():
+                message_record = record["messages"].setdefault( message, { "count" : 0, "locations" : [] } )
+                message_record["count"] += other_message["count"]
+                for where in other_message["locations"]:
+                    if len(message_record["locations"]) < max_locations and where not in message_record["locations"]:
+                        message_record["locations"].append(where)
+
+    def as_dict(self):
+        return { "total" : self.total, "kinds" : self.kinds }
+
+    # returns a readable summary: the count of each kind, and its most frequent messages
+    def summary(self, messages_per_kind=3):
+        if not self.total:
+            return "No alerts\n"
+        files = set( filename for record in self.kinds.values() for filename in record["files"] )
+        lines = [ str(self.total) + " alerts in " + str(len(files)) + " files" ]
+        for kind, record in sorted( self.kinds.items(), key=lambda item : -item[1]["count"] ):
+            lines.append( "  " + kind + ": " + str(record["count"]) + " in " + str(len(record["files"])) + " files, " + str(len(record["messages"])) + " distinct" )
+            frequent = sorted( record["messages"].items(), key=lambda item : -item[1]["count"] )
+            for message, message_record in frequent[:messages_per_kind]:
+                lines.append( "    " + str(message_record["count"]) + "x " + message + " (" + ", ".join(message_record["locations"]) + ")" )
+            if len(frequent) > messages_per_kind:
+                lines.append( "    ..." )
+        return "\n".join(lines) + "\n"
+
+    # writes the collected alerts to a file as JSON
+    def write_report(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
+
+    # file names the file alerts are raised in, until it is changed
+    # if keep_messages is not set, only the counts are kept
+    def __init__(self, file="", keep_messages=True):
+        self.file = file
+        self.keep_messages = keep_messages
+        self.total = 0
+        # the counts, files, and distinct messages of each kind of alert
+        self.kinds = {}
+
+# returns the collector this thread's alerts go to, or None if they are written to stderr
+def collector():
+    return getattr(thread_state, "collector", None)
+
+# raises an alert of the given kind; message is a string, or a function returning it
+# location says where in the file it was raised, if the message does not (written to stderr before the message)
+def alert(kind, message, location=None):
+    current = collector()
+    if current is not None:
+        current.add(kind, message, location)
+        return
+    if callable(message):
+        message = message()
+    if location is not None:
+        message = location + ": " + message
+    stderr.write(message + "\n")
+
+# writes a collector's alerts to a file as JSON, and its summary to stderr
+def report(collector, filename):
+    collector.write_report(filename)
+    stderr.write(collector.summary())
+
+# returns whether raised alerts are read, rather than only counted
+def wants_messages():
+    current = collector()
+    return current is None or current.keep_messages
+
+# starts collecting this thread's alerts in a new collector, which is returned
+def start_collecting(file="", keep_messages=True):
+    thread_state.collector = Alert_Collector(file, keep_messages)
+    return thread_state.collector
+
+# names the file this thread's later alerts are raised in, if they are being collected
+def set_file(file):
+    current = collector()
+    if current is not None:
+        current.file = file
+
+# stops collecting this thread's alerts, returning the collector that was collecting
+def stop_collecting():
+    current = collector()
+    thread_state.collector = None
+    return current
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Times each stage of disassembling and decompiling synthetic AI scripts of increasing size
+# if run from the command line, will generate a script for each size (see generate_flow_file.py),
+# decompile it, and write a table of the time each stage took into the output file
+#
+# the last row of the table is each stage's growth: the slope of its time against the number of
+# instructions on a log-log scale, so 1 is linear, 2 is quadratic, and so on
+
+import argparse
+import math
+import os
+import tempfile
+from sys import stderr
+
+import unpack_ai
+import decompile_ai
+import phase_profile
+from game_context import Game_Context
+from eo_value_lookup import game_codes
+from generate_flow_file import Flow_Shape, generate_flow_data
+
+def eprint(s):
+    stderr.write(s + "\n")
+
+# the shape parameters a benchmark can grow
+scalable_parameters = ["procedures", "statements", "depth", "if_chain", "special_labels"]
+
+def parseArguments():
+    # Create argument parser
+    parser = argparse.ArgumentParser(description="Times each stage of decompiling synthetic Etrian Odyssey AI scripts of increasing size.")
+
+    # Positional mandatory arguments
+    parser.add_argument("output_file", help="name of the file in which to place the table of times (tab separated)")
+
+    # Optional arguments
+    parser.add_argument("--show_output", action="store_true", help="output will be printed to console in addition to being saved to the output_file")
+    parser.add_argument("--hide_alerts", action="store_true", help="warnings will not be printed to stderr if unexpected values are encountered while disassembling")
+    parser.add_argument("--game", choices=game_codes, default="EO3", help="which game's native functions to use")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated scripts")
+    parser.add_argument("--scale", choices=scalable_parameters, default="statements", help="the shape parameter that is set to each size; the others keep their generate_flow_file.py defaults")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 20, 40, 80, 160], help="the values of the scaled parameter to benchmark")
+    parser.add_argument("--repeats", type=int, default=3, help="each size is decompiled this many times, and the fastest time of each stage is kept")
+    parser.add_argument("--no_optimize", action="store_true", help="no optimization passes are run; by default they all are")
+    parser.add_argument("--handwritten", action="store_true", help="decompile as if --handwritten was given")
+
+    # Print version
+    parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    return args
+
+# the top level stages, in the order they run
+stage_order = ["Flow_File", "abstract_flow", "ABST", "flatten_abst_conds", "eliminate_useless_elses",
+               "fold_constants", "infer_types", "simplify_boolean_expressions", "display"]
+
+# returns the key stages are sorted by: top level stages in the order they run, each followed by the stages inside it
+def stage_sort_key(path):
+    parts = path.split("/")
+    top = stage_order.index(parts[0]) if parts[0] in stage_order else len(stage_order)
+    return (top, parts)
+
+# disassembles and decompiles a script from the given file, returning the profile of doing so
+def profile_decompilation(filename, game_context, handwritten, optimize_flags):
+    phase_profile.start_profile()
+    flow = unpack_ai.Flow_File(filename, game_context)
+    basic_blocks, proc_info, special_labels = decompile_ai.abstract_flow(flow)
+    tree = decompile_ai.ABST(game_context, basic_blocks, proc_info, special_labels, handwritten)
+    tree.optimize_abst(*optimize_flags)
+    tree.display_decompilation()
+    return phase_profile.stop_profile()
+
+# returns the slope of the least squares line through the given points on a log-log scale, or None if there is none
+def log_log_slope(xs, ys):
+    points = [ (math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y is not None and y > 0 ]
+    if len(points) < 2:
+        return None
+    mean_x = sum(p[0] for p in points) / len(points)
+    mean_y = sum(p[1] for p in points) / len(points)
+    var_x = sum( (p[0] - mean_x) ** 2 for p in points )
+    if var_x == 0:
+        return None
+    return sum( (p[0] - mean_x) * (p[1] - mean_y) for p in points ) / var_x
+
+# times the stages for each size
+# returns the table rows: a header, a row for each size, and the growth row
+def run_benchmark(game, seed, scale, sizes, repeats, handwritten, optimize_flags, show_alerts=True):
+    game_context = Game_Context(game, show_alerts=show_alerts)
+
+    # the fastest time of each stage, and the number of instructions, for each size
+    size_times = []
+    size_instructions = []
+    for size in sizes:
+        shape = Flow_Shape()
+        setattr(shape, scale, size)
+        data = generate_flow_data(game, seed, shape)
+        handle, filename = tempfile.mkstemp(suffix=".bf")
+        try:
+            with os.fdopen(handle, "wb") as f:
+                f.write(data)
+            size_instructions.append( unpack_ai.count_instructions(filename) )
+            times = {}
+            for _ in range(repeats):
+                profile = profile_decompilation(filename, game_context, handwritten, optimize_flags)
+                run_times = dict( (path, record["wall"]) for path, record in profile.phases.items() )
+                run_times["total"] = profile.total["wall"]
+                for path, wall in run_times.items():
+                    times[path] = min(times.get(path, wall), wall)
+            size_times.append(times)
+        finally:
+            os.remove(filename)
+        eprint(scale + " = " + str(size) + ": " + "{:.3f}".format(times["total"]) + "s")
+
+    stages = sorted( set(path for times in size_times for path in times if path != "total"), key=stage_sort_key ) + ["total"]
+    rows = [ [scale, "instructions"] + stages ]
+    for size, instructions, times in zip(sizes, size_instructions, size_times):
+        rows.append( [str(size), str(instructions)] + [ "{:.6f}".format(times[stage]) if stage in times else "" for stage in stages ] )
+    growth = []
+    for stage in stages:
+        slope = log_log_slope( size_instructions, [times.get(stage) for times in size_times] )
+        growth.append( "" if slope is None else "{:.2f}".format(slope) )
+    rows.append( ["growth", ""] + growth )
+    return rows
+
+def benchmark_main():
+    # Parse the arguments
+    args = parseArguments()
+
+    if args.no_optimize:
+        optimize_flags = (False, False, False, False)
+    else:
+        optimize_flags = (True, True, True, True)
+    rows = run_benchmark(args.game, args.seed, args.scale, args.sizes, args.repeats, args.handwritten, optimize_flags, not args.hide_alerts)
+    output = "\n".join( "\t".join(row) for row in rows )
+
+    if args.show_output:
+        print(output)
+
+    # Write result to a file
+    with open(args.output_file, "w") as f:
+        f.write(output)
+
+if __name__ == '__main__':
+    benchmark_main()
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Measures the throughput of the table parsers and the EOstring conversions
+# if run from the command line, will generate synthetic tables (see generate_table_files.py),
+# parse each one, and save the speed of each parser as JSON in the output file
+#
+# given the output of an earlier run as a baseline, the speed of each parser
+# relative to that run is reported as well
+
+import argparse
+import json
+import time
+from sys import stderr
+
+import convert_EOstring
+import unpack_EO_name_table
+import unpack_EO_skill_table
+import unpack_msg
+from game_context import Game_Context
+from eo_value_lookup import game_codes
+from generate_table_files import generate_name_table_data, generate_msg_data, generate_skill_data
+
+def eprint(s):
+    stderr.write(s + "\n")
+
+def parseArguments():
+    # Create argument parser
+    parser = argparse.ArgumentParser(description="Measures the throughput of the Etrian Odyssey table parsers and EOstring conversions on synthetic data.")
+
+    # Positional mandatory arguments
+    parser.add_argument("output_file", help="name of the file in which to place the results (JSON)")
+
+    # Optional arguments
+    parser.add_argument("--show_output", action="store_true", help="output will be printed to console in addition to being saved to the output_file")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated tables")
+    parser.add_argument("--entries", type=int, default=2000, help="number of names, messages, or skills in each generated table")
+    parser.add_argument("--repeats", type=int, default=5, help="each parser is run this many times, and the fastest time is kept")
+    parser.add_argument("--baseline", help="results of an earlier run, to compare against")
+
+    # Print version
+    parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    return args
+
+# returns the fastest time, in seconds, of running func the given number of times
+def best_time(func, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+# returns the result of a case: its size and how fast it was processed
+def case_result(num_bytes, entries, seconds):
+    # guard against a timer too coarse to see the run
+    seconds = max(seconds, 1e-9)
+    return {
+        "bytes" : num_bytes,
+        "entries" : entries,
+        "seconds" : seconds,
+        "mb_per_s" : num_bytes / seconds / 1e6,
+        "entries_per_s" : entries / seconds,
+    }
+
+# runs every case, returning the result of each by name
+def run_benchmark(seed, entries, repeats):
+    results = {}
+
+    # name tables, with both index widths
+    for width in [2, 4]:
+        data = generate_name_table_data(seed, entries, width)
+        def parse_names():
+            unpack_EO_name_table.EO_name_table().build_from_data(data, width)
+        results["name_table_" + str(width)] = case_result( len(data), entries, best_time(parse_names, repeats) )
+
+    # MSG2 files
+    msg_data = generate_msg_data(seed, entries)
+    def parse_msg():
+        unpack_msg.EO_MSG_table().build_from_data(msg_data)
+    results["msg"] = case_result( len(msg_data), entries, best_time(parse_msg, repeats) )
+
+    # skill tables, for each game
+    for game in game_codes:
+        skill_data, name_data = generate_skill_data(game, seed, entries)
+        unpacker = unpack_EO_skill_table.get_game_unpacker(game)
+        game_context = Game_Context(game)
+        names = unpack_EO_name_table.EO_name_table()
+        names.build_from_data(name_data, 2)
+        def parse_skills():
+            unpack_EO_skill_table.unpack_skills(skill_data, unpacker, names, game_context, True)
+        results["skill_table_" + game] = case_result( len(skill_data), entries, best_time(parse_skills, repeats) )
+
+    # EOstring conversions, on the text of the generated messages
+    msg = unpack_msg.EO_MSG_table()
+    msg.build_from_data(msg_data)
+    eostrings = msg.raw_names
+    strings = msg.names
+    def decode():
+        for eostring in eostrings:
+            convert_EOstring.eostring_to_string(eostring)
+    results["eostring_decode"] = case_result( sum(map(len, eostrings)), len(eostrings), best_time(decode, repeats) )
+    def encode():
+        for s in strings:
+            convert_EOstring.string_to_eostring(s)
+    results["eostring_encode"] = case_result( sum(map(len, strings)), len(strings), best_time(encode, repeats) )
+
+    return results
+
+# adds to each result its speed relative to the same case in the baseline (above 1 is faster)
+def compare_to_baseline(results, baseline):
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        result["speedup"] = baseline[name]["seconds"] / result["seconds"]
+        eprint(name + ": " + "{:.2f}".format(result["speedup"]) + "x the baseline")
+
+def benchmark_tables_main():
+    # Parse the arguments
+    args = parseArguments()
+
+    results = run_benchmark(args.seed, args.entries, args.repeats)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        compare_to_baseline(results, baseline["results"])
+
+    output = json.dumps( { "seed" : args.seed, "entries" : args.entries, "repeats" : args.repeats, "results" : results }, indent=2, sort_keys=True )
+
+    if args.show_output:
+        print(output)
+
+    # Write result to a file
+    with open(args.output_file, "w") as f:
+        f.write(output)
+
+if __name__ == '__main__':
+    benchmark_tables_main()
@@ -5,7 +5,8 @@
 # written by TheOnlyOne (@modest_ralts)
 
 from struct import pack, unpack
-from sys import stderr
+
+import alerts
 
 # lookup table for special chars
 special_chars = {
@@ -85,7 +86,7 @@ def eochar_to_char(eochar, alert_unk=False):
 
     # otherwise, the character is unkown
     if alert_unk:
-        stderr.write("Could not convert EOchar: " + display_eostring(eochar) + "\n")
+        alerts.alert("unknown character", lambda : "Could not convert EOchar: " + display_eostring(eochar))
     return '<' + display_eostring(eochar) + '>'
 
 # convert a single char into an EOchar
@@ -114,7 +115,7 @@ def char_to_eochar(c, alert_unk=False):
 
     # otherwise, the character is unkown
     if alert_unk:
-        stderr.write("Could not convert char: " + c + "\n")
+        alerts.alert("unknown character", lambda : "Could not convert char: " + c)
     return reverse_special_chars['?']
 
 # convert a full EOstring into a readable string
@@ -4,18 +4,24 @@
 # Contains functionality for further decompiling an EO AI script
 # from its disassembly into a more easily readable form
 #
-# when calling this from outside, make sure to call set_game_specific_values()
-# with the appropriate game code first
+# when calling this from outside, make sure the Flow_File is read with a Game_Context
+# for the appropriate game (or pass one to abstract_flow)
 #
 # written by TheOnlyOne (@modest_ralts)
 
 import argparse
 import copy
+import json
+import os
+import sys
 from sys import stderr
+from collections import deque
 from itertools import compress
 
 from unpack_ai import *
-import eo_value_lookup
+from game_context import Game_Context
+import phase_profile
+import alerts
 from eo_value_lookup import game_codes
 
 def eprint(s):
@@ -24,6 +30,43 @@ def eprint(s):
 def compose(f, g):
   return lambda x : f(g(x))
 
+# walks a graph depth first with an explicit stack, so that deep scripts do not hit the recursion limit
+# vertices are visited in the same order a recursive search would visit them
+# roots are the vertices to start from; children(v) gives the vertices below v, in order
+# enter(v, parent) is called when v is first reached (parent is None for a root)
+# edge(v, u, is_new) is called for each child u of v; is_new is False if u had already been reached
+# leave(v) is called once everything below v has been left
+# vertices in seen are never entered again, and every entered vertex is added to it,
+# so a set can be shared between several searches; the set is returned
+def depth_first_search(roots, children, enter=None, edge=None, leave=None, seen=None):
+  if seen is None:
+    seen = set([])
+  for root in roots:
+    if root in seen:
+      continue
+    seen.add(root)
+    if enter is not None:
+      enter(root, None)
+    # each entry is a vertex and the iterator over its remaining children
+    stack = [ (root, iter(children(root))) ]
+    while stack:
+      v, remaining = stack[-1]
+      for u in remaining:
+        is_new = u not in seen
+        if edge is not None:
+          edge(v, u, is_new)
+        if is_new:
+          seen.add(u)
+          if enter is not None:
+            enter(u, v)
+          stack.append( (u, iter(children(u))) )
+          break
+      else:
+        stack.pop()
+        if leave is not None:
+          leave(v)
+  return seen
+
 def parseArguments():
   # Create argument parser
   parser = argparse.ArgumentParser(description="Decompiles an Etrian Odyssey AI file (.bf, or something with the FLW0 tag.)")
@@ -42,6 +85,13 @@ def parseArguments():
   parser.add_argument("--constant_folding", action="store_true", help="any arithmetic containing only constants will be replaced with the value of that expression")
   parser.add_argument("--simplify_conditions", action="store_true", help="boolean conditions will be simplified when it is permissable; see docs/ai_notes.txt for some warnings about this flag")
   parser.add_argument("--handwritten", action="store_true", help="use this for handwritten scripts if they don't seem to decompile well without it; see docs/ai_notes.txt for more details")
+  parser.add_argument("--proc", action="append", metavar="NAME", help="only decompile the procedures with this name (wildcards are allowed) and the procedures they call; may be given more than once, and a name that matches no procedure is an error")
+  parser.add_argument("--procedure_cache", metavar="FILE", help="decompiled procedures are saved to and reused from this file, so procedures seen before (even in other scripts or games) are not decompiled again")
+  parser.add_argument("--jobs", type=int, default=1, help="number of processes to split the script's procedures between")
+  parser.add_argument("--share_expressions", action="store_true", help="identical expressions will be stored once and shared, which saves time and memory on scripts that repeat the same expressions")
+  parser.add_argument("--alert_report", metavar="FILE", help="alerts are collected instead of printed as they are raised, and written to this file as JSON, with a summary printed to stderr")
+  parser.add_argument("--profile", metavar="FILE", help="the time spent in each phase of decompilation, and counts of blocks, nodes, and pass iterations, are written to this file as JSON")
+  parser.add_argument("--profile_memory", action="store_true", help="with --profile, the peak memory allocated in each phase is recorded too (this makes decompilation much slower)")
 
   # Print version
   parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
@@ -51,8 +101,6 @@ def parseArguments():
 
   return args
 
-show_alerts = True
-
 # add to the list of instruction names
 operation_names = instruction_names
 operation_names[0x23] = "FUNC" # a COMM with a return value
@@ -154,14 +202,6 @@ mon_symbols = {
   "boolnot" : "!",
 }
 
-native_functions = {}
-
-# Modifies game specific maps
-def set_game_specific_values(game):
-  global native_functions
-
-  native_functions = eo_value_lookup.native_functions[game]
-
 # an operation is an opcode and a variable number of arguments
 class Operation():
 
@@ -176,7 +216,8 @@ class Operation():
     return "\t".join(output)
 
   # create the operation from an opcode and a list of arguments
-  def __init__(self, opcode, args):
+  # natives are the game's native functions, which give the number of arguments of a FUNC or SEND
+  def __init__(self, opcode, args, natives=None):
     self.opcode = opcode
     self.args = args
     self.pushes = None
@@ -186,8 +227,8 @@ class Operation():
     if self.opcode in [0x23, 0x24]:   # FUNC or SEND
       self.pushes = 1 if self.opcode == 0x23 else 0
       # pushes might remain None if we do not know it
-      if self.args[0] in native_functions:
-        self.pops = native_functions[ self.args[0] ].num_params
+      if natives is not None and self.args[0] in natives:
+        self.pops = natives[ self.args[0] ].num_params
     elif self.opcode == 0x0B:   # CALL
       # we can't know anything about a call from the start
       pass
@@ -228,14 +269,18 @@ class Control_Flow_Graph():
   
   # build the graph as an adjacency list, in both directions
   # storing the full edge set as well
-  def build_graph(self, tree):
+  # blocks limits the graph to a set of used blocks (such as a single procedure's), and defaults to all used blocks
+  def build_graph(self, tree, blocks):
     # vertices are the used block indices
-    self.vertices = set( compress(range(len(tree.block_nodes)), tree.block_used) )
+    if blocks is None:
+      self.vertices = set( compress(range(len(tree.block_nodes)), tree.block_used) )
+    else:
+      self.vertices = set(blocks)
     # sources are the starts of procedures
-    self.sources = set(p.block_num for p in tree.procedure_info)
+    self.sources = set(p.block_num for p in tree.procedure_info if p.block_num in self.vertices)
     # sinks are the special_gotos and returns
     # returns will be filled in below
-    self.sinks = set(tree.special_gotos)
+    self.sinks = self.vertices.intersection(tree.special_gotos)
     # start with empty adjacency lists 
     self.succs = dict( (v, set([])) for v in self.vertices )
     self.preds = dict( (v, set([])) for v in self.vertices )
@@ -300,30 +345,27 @@ class Control_Flow_Graph():
     # my_path stores the first path used to discover a node
     # it also marks if a vertex is discovered if the vertex is a key
     my_path = {}
-    # recursive step for the depth-first search
-    def dfs(v, cur_path):
-      my_path[v] = cur_path + [v]
-      for u in self.succs[v]:
-        if u not in my_path:
-          # new vertex; edge is a tree edge, and we should keep searching
-          self.edge_labels[(v,u)] = "tree"
-          dfs(u, my_path[v])
+    def enter(v, parent):
+      my_path[v] = (my_path[parent] if parent is not None else []) + [v]
+    def label_edge(v, u, is_new):
+      if is_new:
+        # new vertex; edge is a tree edge, and the search continues from it
+        self.edge_labels[(v,u)] = "tree"
+      else:
+        # old vertex, determine what kind of edge this is
+        if u in my_path[v]:
+          self.edge_labels[(v,u)] = "back"
+          self.has_cycles = True
+        elif v in my_path[u]:
+          self.edge_labels[(v,u)] = "forward"
         else:
-          # old vertex, determine what kind of edge this is
-          if u in my_path[v]:
-            self.edge_labels[(v,u)] = "back"
-            self.has_cycles = True
-          elif v in my_path[u]:
-            self.edge_labels[(v,u)] = "forward"
-          else:
-            self.edge_labels[(v,u)] = "cross"
+          self.edge_labels[(v,u)] = "cross"
     # start the dfs at each source node
-    for v in self.sources:
-      dfs(v, [])
+    depth_first_search(self.sources, lambda v : self.succs[v], enter, label_edge)
     self.dfs_paths = my_path
 
   # find the loops in the control flow graph, and collect up the relevant blocks for each
-  def build_loops(self):
+  def build_loops(self, show_alerts):
     self.loops = []
     # every back edge signifies a loop (if the graph is sufficiently well behaved)
     for (u, v), label in self.edge_labels.items():
@@ -333,15 +375,15 @@ class Control_Flow_Graph():
         # the entry should have 2 children, should dominate both of them and the continue block
         # and be post-dominated by the continue block
         # the continue block should only have 1 succ
-        if len(self.succs[entry_block]) != 2:
-          eprint("Entry block " + str(entry_block) + " does not have 2 children.")
-        if len(self.succs[continue_block]) != 1:
-          eprint("Continue block " + str(continue_block) + " does not have 1 child.")
+        if show_alerts and len(self.succs[entry_block]) != 2:
+          alerts.alert("loop structure", "Entry block " + str(entry_block) + " does not have 2 children.")
+        if show_alerts and len(self.succs[continue_block]) != 1:
+          alerts.alert("loop structure", "Continue block " + str(continue_block) + " does not have 1 child.")
         should_be_dominated = self.succs[entry_block].union(set([continue_block]))
-        if not all( map(lambda b : entry_block in self.dominators[b], iter(should_be_dominated)) ):
-          eprint("Entry block does not dominate a child or the continue block")
-        if entry_block not in self.post_dominators[continue_block]:
-          eprint("Entry block is not post-dominated by the continue block.")
+        if show_alerts and not all( map(lambda b : entry_block in self.dominators[b], iter(should_be_dominated)) ):
+          alerts.alert("loop structure", "Entry block does not dominate a child or the continue block")
+        if show_alerts and entry_block not in self.post_dominators[continue_block]:
+          alerts.alert("loop structure", "Entry block is not post-dominated by the continue block.")
         # the break block is the child that is not on the path to the continue block
         filtered_children = list(filter(lambda c : c not in self.dfs_paths[continue_block], self.succs[entry_block]))
         if len(filtered_children) != 1:
@@ -362,12 +404,12 @@ class Control_Flow_Graph():
     # sort the loops so that any nested loop comes before the loop it is nested in
     self.loops.sort(key=lambda l : l.all_blocks)
         
-  def __init__(self, tree):
-    self.build_graph(tree)
+  def __init__(self, tree, blocks=None):
+    self.build_graph(tree, blocks)
     self.dominators = self.compute_dominators("forward")
     self.post_dominators = self.compute_dominators("backward")
     self.dfs_info()
-    self.build_loops()
+    self.build_loops(tree.game_context.show_alerts)
 
 # node for an abstract syntax tree; it represents a single statement or expression
 # a node has a tag saying what kind of statement or expression it is
@@ -453,6 +495,89 @@ class AST_Node():
 
   __repr__ = __str__
 
+# schedules the passes that rewrite the blocks of an ABST
+# block passes are driven by a worklist of dirty blocks: when a block is rewritten,
+# it and its neighbours in the control flow graph are visited again first
+# a rewrite can also matter to blocks further away (an if whose branches are followed through
+# a chain of gotos, for one), so once the worklist runs dry after a change, every block is queued again,
+# and the pass only ends once all of them have been visited without a change, as the old fixed point loop did
+# passes may require other passes to have been run before them
+class Pass_Manager():
+
+  # maps a pass (the name of an ABST method) to the passes it requires
+  requirements = {
+    "simplify_boolean_expressions" : ["infer_types"],
+  }
+
+  # runs the named pass on the tree, running any required passes that have not been run yet
+  def run(self, name):
+    for required in self.requirements.get(name, []):
+      if required not in self.completed:
+        self.run(required)
+    with phase_profile.phase(name):
+      getattr(self.tree, name)()
+      self.completed.add(name)
+      # passes are a natural point to drop the nodes they left dead
+      self.tree.compact_if_needed()
+
+  # performs the given function once on all used blocks
+  def block_loop(self, name, func):
+    tree = self.tree
+    for idx in range( len(tree.block_nodes) ):
+      if tree.block_used[idx]:
+        self.visit_counts[name] = self.visit_counts.get(name, 0) + 1
+        phase_profile.count(name + " visits")
+        func( tree.block_nodes[idx] )
+
+  # performs the given functions on dirty blocks until no new changes occur
+  # each function takes a block node and returns True if it changed anything
+  # as with any(), a block's remaining functions are skipped once one of them makes a change
+  # only used blocks are visited, unless every_block is set: blocks that are no longer used can still
+  # be reached through a goto and displayed, so passes that tidy up what is displayed visit every block
+  def worklist_block_loop(self, name, funcs, every_block=False):
+    tree = self.tree
+    def visited(idx):
+      return every_block or tree.block_used[idx]
+    # guard against passes that never settle, as the old fixed point loop did
+    timeout = 1000 * max(1, len(tree.block_nodes))
+    visits = 0
+    worklist = deque([])
+    queued = set([])
+    changed = True
+    while changed and visits < timeout:
+      changed = False
+      # every block is queued for the sweep, behind the neighbours of the last change
+      for idx in range( len(tree.block_nodes) ):
+        if idx not in queued and visited(idx):
+          worklist.append(idx)
+          queued.add(idx)
+      while worklist and visits < timeout:
+        idx = worklist.popleft()
+        queued.discard(idx)
+        if not visited(idx):
+          continue
+        visits += 1
+        if not any( map(lambda f : f( tree.block_nodes[idx] ), funcs) ):
+          continue
+        changed = True
+        # the block was rewritten, so update its edges and revisit it and its neighbours
+        old_succs = tree.block_succs[idx]
+        tree.update_block_edges(idx)
+        neighbours = [idx] + sorted( old_succs.union(tree.block_succs[idx]).union(tree.block_preds[idx]) )
+        for neighbour in neighbours:
+          if neighbour not in queued and visited(neighbour):
+            worklist.append(neighbour)
+            queued.add(neighbour)
+    self.visit_counts[name] = self.visit_counts.get(name, 0) + visits
+    phase_profile.count(name + " visits", visits)
+
+  def __init__(self, tree):
+    self.tree = tree
+    # number of block visits made by each pass
+    self.visit_counts = {}
+    # passes that have already been run
+    self.completed = set([])
+
 # abstract block syntax tree for the ai program
 # contains a list of block nodes (a seq-statement) indexed as the blocks are
 # and a map mapping inner node identifiers to actual nodes
@@ -477,24 +602,159 @@ class ABST():
       return self.inner_nodes[pointer]
     return (b_node, in_node)
 
-  # fixed point operations will perform the given functions on all blocks
-  # until no new changes occur
-  def fixed_point_block_loop(self, funcs):
-    changed = True
-    timeout = 1000
-    tries = 0
-    while changed and tries < timeout:
-      changed = False
-      tries += 1
-      for idx in range( len(self.block_nodes) ):
-        if self.block_used[idx]:
-          changed |= any( map(lambda f : f( self.block_nodes[idx] ), funcs) )
-
-  # performs the given function on all blocks
-  def block_loop(self, func):
-    for idx in range( len(self.block_nodes) ):
-      if self.block_used[idx]:
-        func( self.block_nodes[idx] )
+  # returns the set of blocks that the given block can jump to, read from its statements
+  def block_successors(self, index):
+    succs = set([])
+    for stmt in map(lambda ptr : self.inner_nodes[ptr], self.block_nodes[index].children):
+      if stmt.tag in ["if", "goto", "loop"]:
+        succs.update(stmt.vals)
+    return succs
+
+  # build the successor and predecessor index for every block from scratch
+  # block_succs[i] is the set of blocks block i can jump to
+  # block_preds[i] is the set of blocks that can jump to block i
+  # unused blocks are kept in the index; use used_predecessors to skip them
+  def build_block_index(self):
+    self.block_succs = [ self.block_successors(idx) for idx in range(len(self.block_nodes)) ]
+    self.block_preds = [ set([]) for _ in self.block_nodes ]
+    for idx, succs in enumerate(self.block_succs):
+      for succ in succs:
+        self.block_preds[succ].add(idx)
+
+  # recompute a block's successors from its statements, and update the predecessors of
+  # the blocks it gained or lost; this must be called whenever a rewrite changes a block's jumps
+  # (once blocks have been merged or duplicated they can share statements, and a rewrite through
+  # one block can leave extra edges on the others; users of the index only treat it as a superset
+  # of the real edges from that point on)
+  def update_block_edges(self, index):
+    old_succs = self.block_succs[index]
+    new_succs = self.block_successors(index)
+    for succ in old_succs.difference(new_succs):
+      self.block_preds[succ].discard(index)
+    for succ in new_succs.difference(old_succs):
+      self.block_preds[succ].add(index)
+    self.block_succs[index] = new_succs
+
+  # stores a new block node, adds it to the index, and returns its index
+  def add_block(self, node):
+    self.block_nodes.append( node )
+    self.block_used.append( True )
+    self.block_succs.append( set([]) )
+    self.block_preds.append( set([]) )
+    index = len(self.block_nodes) - 1
+    self.update_block_edges(index)
+    return index
+
+  # returns the used blocks that can jump to the given block, in block order
+  def used_predecessors(self, index):
+    return sorted( filter(lambda b : self.block_used[b], self.block_preds[index]) )
+
+  # when more than this fraction of the stored blocks and inner nodes are dead,
+  # compact_if_needed rebuilds the node stores; None turns automatic compaction off
+  compaction_threshold = 0.1
+
+  # finds everything that can still be reached from the procedures, following
+  # node children and the blocks named by if, goto, and loop statements
+  # the first blocks of called procedures are kept too, but only followed if they are one of this tree's procedures
+  # returns the set of live block indices and the set of live inner node pointers
+  # (liveness is decided by reachability, since the used flags are not always kept up to date)
+  def live_nodes(self):
+    b_node, in_node = self.get_node_lookup_functions()
+    live_blocks = set([])
+    live_inner = set([])
+    called_blocks = set([])
+    block_stack = [p.block_num for p in self.procedure_info]
+    while block_stack:
+      block_num = block_stack.pop()
+      if block_num in live_blocks:
+        continue
+      live_blocks.add(block_num)
+      node_stack = list( b_node(block_num).children )
+      while node_stack:
+        ptr = node_stack.pop()
+        if ptr in live_inner:
+          continue
+        live_inner.add(ptr)
+        node = in_node(ptr)
+        node_stack.extend(node.children)
+        if node.tag in ["if", "goto", "loop"]:
+          block_stack.extend(node.vals)
+        elif node.tag == "call":
+          called_blocks.update(node.vals)
+    return (live_blocks.union(called_blocks), live_inner)
+
+  # rebuilds the block list and inner node map with only the live nodes,
+  # renumbering blocks and pointers densely (in their old order) and remapping every reference to them
+  # label and reallygoto statements name special labels rather than blocks, so they are left alone
+  # live should be the result of live_nodes, which is computed if it is not given
+  @phase_profile.profiled("compact")
+  def compact(self, live=None):
+    if live is None:
+      live = self.live_nodes()
+    live_blocks, live_inner = live
+    old_blocks = sorted(live_blocks)
+    old_ptrs = sorted(live_inner, key=lambda s : int(s[1:]))
+    block_map = dict( (old, new) for new, old in enumerate(old_blocks) )
+    ptr_map = dict( (old, "v" + str(new + 1)) for new, old in enumerate(old_ptrs) )
+
+    # nodes can share their children and vals lists, so each list is remapped once,
+    # and every node that held it gets the same new list
+    # (the old lists are kept in the cache so their ids are not reused while it is alive)
+    remapped_lists = {}
+    def remap_list(old_list, mapping):
+      key = id(old_list)
+      if key not in remapped_lists:
+        remapped_lists[key] = (old_list, [mapping[v] for v in old_list])
+      return remapped_lists[key][1]
+
+    # nodes can also be shared between pointers, so each distinct node is rewritten once
+    nodes = dict( (id(self.inner_nodes[ptr]), self.inner_nodes[ptr]) for ptr in old_ptrs )
+    for node in nodes.values():
+      node.children = remap_list(node.children, ptr_map)
+      if node.tag in ["if", "goto", "loop", "call"]:
+        node.vals = remap_list(node.vals, block_map)
+    blocks = dict( (id(self.block_nodes[b]), self.block_nodes[b]) for b in old_blocks )
+    for block in blocks.values():
+      if all(ptr in ptr_map for ptr in block.children):
+        block.children = remap_list(block.children, ptr_map)
+      else:
+        # only kept as the first block of a called procedure that this tree does not hold
+        block.children = []
+
+    self.block_nodes = [ self.block_nodes[b] for b in old_blocks ]
+    self.block_used = [ self.block_used[b] for b in old_blocks ]
+    self.inner_nodes = dict( (ptr_map[ptr], self.inner_nodes[ptr]) for ptr in old_ptrs )
+    self.inner_used = dict( (ptr_map[ptr], self.inner_used[ptr]) for ptr in old_ptrs )
+    self.var_count = len(old_ptrs)
+
+    # the procedure info may be shared with the caller, so it is copied rather than renumbered in place
+    new_procedure_info = []
+    for p in self.procedure_info:
+      new_p = Procedure_Info(block_map[p.block_num], p.name)
+      new_p.pushes = p.pushes
+      new_p.pops = p.pops
+      new_procedure_info.append(new_p)
+    self.procedure_info = new_procedure_info
+    # these also name procedures that are only called (when the tree only holds some of the procedures)
+    self.procedure_map = dict( (block_map[b], name) for b, name in self.procedure_map.items() if b in block_map )
+    self.procedure_pop_map = dict( (block_map[b], pops) for b, pops in self.procedure_pop_map.items() if b in block_map )
+    self.special_blocks = set( block_map[b] for b in self.special_blocks if b in block_map )
+    self.special_gotos = set( block_map[b] for b in self.special_gotos if b in block_map )
+    self.build_block_index()
+    self.compactions += 1
+
+  # compacts the tree if the fraction of dead blocks and inner nodes is above compaction_threshold
+  # returns True if the tree was compacted
+  def compact_if_needed(self):
+    if self.compaction_threshold is None:
+      return False
+    live_blocks, live_inner = live = self.live_nodes()
+    total = len(self.block_nodes) + len(self.inner_nodes)
+    dead = total - len(live_blocks) - len(live_inner)
+    if total == 0 or float(dead) / total <= self.compaction_threshold:
+      return False
+    self.compact(live)
+    return True
 
   # creates and stores a new expression that is the boolean negation of the given
   # exp should be a pointer to an exp node
@@ -532,8 +792,41 @@ class ABST():
   __repr__ = __str__
 
 
+  # replaces structurally identical expression subtrees with a single shared node,
+  # so that each distinct expression is stored (and typed, folded, and rendered) once
+  # statements are not shared, since structuring rewrites them in place;
+  # the passes that rewrite expressions only look at a node's own subtree, so they are safe on shared nodes
+  @phase_profile.profiled("intern expressions")
+  def intern_expressions(self):
+    b_node, in_node = self.get_node_lookup_functions()
+    # maps (tag, vals, children) to the pointer of the node with that structure
+    interned = {}
+
+    # interns the given expression's children, then the expression itself
+    # returns the pointer to use in place of the given one
+    def intern_exp(ptr):
+      node = in_node(ptr)
+      node.children = list(map(intern_exp, node.children))
+      key = (node.tag, tuple(node.vals), tuple(node.children))
+      if key in interned:
+        # a freshly built expression has a single parent, so the duplicate can be dropped
+        del self.inner_nodes[ptr]
+        del self.inner_used[ptr]
+        return interned[key]
+      interned[key] = ptr
+      return ptr
+
+    for block in self.block_nodes:
+      for stmt in map(in_node, block.children):
+        stmt.children = list(map(intern_exp, stmt.children))
+
   # build a ABST from a list of blocks
-  def __init__(self, block_list, procedure_info, special_labels, handwritten):
+  # if share_expressions is set, identical expressions are interned as they are built
+  # if procedures is given, only those procedures (indices into procedure_info) are structured and displayed
+  # game_context gives the game's native functions, and whether alerts are shown
+  @phase_profile.profiled("ABST")
+  def __init__(self, game_context, block_list, procedure_info, special_labels, handwritten, share_expressions=False, procedures=None):
+    self.game_context = game_context
     self.var_count = 0
     self.block_nodes = []
     self.block_used = []
@@ -545,6 +838,8 @@ class ABST():
     self.special_labels = special_labels
     self.special_blocks = set([])
     self.special_gotos = set([])
+    self.compactions = 0
+    self.pass_manager = Pass_Manager(self)
 
     # build the nodes for each block
     for blocknum, block in enumerate(block_list):
@@ -575,7 +870,8 @@ class ABST():
           for fvar in reversed(fresh_vars):
             var_stack.append(fvar)
           # create and store the actual node
-          node = AST_Node( tag, vals, fresh_vars )
+          # the vals are copied, since passes rewrite them in place and the block list should be left as it was given
+          node = AST_Node( tag, list(vals), fresh_vars )
           self.inner_nodes[loc] = node
           self.inner_used[loc] = True
 
@@ -610,25 +906,57 @@ class ABST():
           found_name = True
 
         # any other opcodes are errors or unhandled
-        if not found_name:
-          eprint("Operation " + str(oper) + " could not be added to the ABST")
+        if not found_name and game_context.show_alerts:
+          alerts.alert("unhandled operation", lambda : "Operation " + str(oper) + " could not be added to the ABST")
         
       # create the block's node
       node = AST_Node( "seq", [], block_stmts )
       self.block_nodes.append( node )
       self.block_used.append( True )
 
+    if share_expressions:
+      self.intern_expressions()
+    self.build_block_index()
     self.handle_special_labels()
-    self.handle_directed_cycles()
-    self.clear_single_gotos()
-    if not handwritten:
-      self.handle_undirected_cycles()
+    # the blocks of unwanted procedures are dropped before any real work is done on them
+    # (calls to them still display their names)
+    if procedures is not None:
+      self.procedure_info = [ procedure_info[idx] for idx in procedures ]
+      wanted_blocks = set([])
+      for proc in self.procedure_info:
+        wanted_blocks.update( self.reachable_blocks(proc.block_num) )
+      for idx in range( len(self.block_nodes) ):
+        if idx not in wanted_blocks:
+          self.block_used[idx] = False
+    for proc in self.procedure_info:
+      self.structure_procedure(proc.block_num, handwritten)
 
     self.clean_loops()
     self.clean_empty_blocks()
 
+    # structuring leaves many merged away blocks and replaced statements behind
+    self.compact_if_needed()
+    phase_profile.count( "ABST blocks", sum(self.block_used) )
+    phase_profile.count( "ABST nodes", sum(self.inner_used.values()) )
+
+  # returns the sorted list of used blocks that can be reached from the given block
+  # given a procedure's first block, these are the procedure's blocks, since procedures never jump into each other
+  def reachable_blocks(self, entry):
+    found = depth_first_search([entry], lambda b : self.block_succs[b])
+    return sorted( filter(lambda b : self.block_used[b], found) )
+
+  # structures the blocks of the procedure starting at the given block:
+  # loops are introduced, single gotos removed, and then (unless handwritten) blocks with several predecessors merged
+  # each step only looks at this procedure's blocks, so procedures can be structured independently
+  def structure_procedure(self, entry, handwritten):
+    self.handle_directed_cycles( self.reachable_blocks(entry) )
+    self.clear_single_gotos( self.reachable_blocks(entry) )
+    if not handwritten:
+      self.handle_undirected_cycles( self.reachable_blocks(entry) )
+
   # if there were actual gotos in the original code (special labels)
   # we should take care of them first because they can create difficult graph structures
+  @phase_profile.profiled("special labels")
   def handle_special_labels(self):
     b_node, in_node = self.get_node_lookup_functions()
 
@@ -661,15 +989,15 @@ class ABST():
       # collect blocks that go to this one
       if_reaches = []
       goto_reaches = []
-      for idx, block in enumerate(self.block_nodes):
-        last_stmt = in_node( block.children[-1] )
+      for idx in sorted( self.block_preds[block_num] ):
+        last_stmt = in_node( b_node(idx).children[-1] )
         # goto and if branch to specific blocks
         if last_stmt.tag == "goto" and block_num in last_stmt.vals:
           goto_reaches.append(idx)
         if last_stmt.tag == "if" and block_num in last_stmt.vals:
           if_reaches.append(idx)
-      if len(if_reaches) > 1:
-        eprint("2 or more if statements have branches to the same label")
+      if len(if_reaches) > 1 and self.game_context.show_alerts:
+        alerts.alert("if structure", "2 or more if statements have branches to the same label")
       # change the gotos to really gotos
       # leaving an arbitrary one alone, or the if branch if there is one
       # this chosen branch must now point to chain end
@@ -678,8 +1006,8 @@ class ABST():
       reaches = if_reaches + goto_reaches
       
       chain_has_preds = False
-      for idx, block in enumerate(self.block_nodes):
-        last_stmt = in_node( block.children[-1] )
+      for idx in self.block_preds[chain_end]:
+        last_stmt = in_node( b_node(idx).children[-1] )
         if last_stmt.tag in ["goto", "if"] and chain_end in last_stmt.vals:
           chain_has_preds = True
       
@@ -693,13 +1021,17 @@ class ABST():
         else:
           goto_stmt = in_node( b_node( first ).children[-1] )
           goto_stmt.vals[0] = chain_end
+        self.update_block_edges(first)
       for idx in reaches:
         block = b_node(idx)
         block.children[-1] = stmt_from_node( AST_Node("reallygoto", [block_num], []) )
+        self.update_block_edges(idx)
         self.special_gotos.add(idx)
 
   # handles directed cycles by introducing loop constructs
-  def handle_directed_cycles(self):
+  # blocks is the list of used blocks to work on (such as a single procedure's), and defaults to all of them
+  @phase_profile.profiled("directed cycles")
+  def handle_directed_cycles(self, blocks=None):
     b_node, in_node = self.get_node_lookup_functions()
 
     # creates and stores a new tag stmt, and returns its pointer
@@ -715,12 +1047,10 @@ class ABST():
     def new_single_block(tag):
       tag_stmt = new_single_stmt(tag)
       node = AST_Node( "seq", [], [tag_stmt] )
-      self.block_nodes.append( node )
-      self.block_used.append( True )
-      return len(self.block_nodes) - 1
+      return self.add_block( node )
 
     # completely anylyze the control flow graph
-    cfg = Control_Flow_Graph(self)
+    cfg = Control_Flow_Graph(self, blocks)
     #print "\n".join([str(loop.__dict__) for loop in cfg.loops])
     
     # for each loop in the graph, add loop constructs
@@ -743,10 +1073,12 @@ class ABST():
       loop_stmt = AST_Node( "loop", [inner_block, break_block, loop.continue_block], [cond_exp] )
       # replace the if
       self.inner_nodes[ entry_node.children[-1] ] = loop_stmt
+      self.update_block_edges( loop.entry_block )
 
       # next, remove the jump at the end of the continue_block (this breaks the explicit cycle)
       continue_node = b_node( loop.continue_block )
       continue_node.children.pop()
+      self.update_block_edges( loop.continue_block )
 
       # finally, replace any jumps inside the loop to the break or continue nodes appropriately
       for block in loop.other_blocks:
@@ -765,6 +1097,7 @@ class ABST():
           new_stmt = new_single_stmt(new_tag)
           self.inner_used[ block_node.children[-1] ] = False
           block_node.children[-1] = new_stmt
+          self.update_block_edges( block )
         # for ifs, create a new block with a single statement, and replace the branch
         elif last_stmt.tag == "if":
           for idx, destination in enumerate(last_stmt.vals):
@@ -777,24 +1110,33 @@ class ABST():
               continue
             new_block = new_single_block(new_tag)
             last_stmt.vals[idx] = new_block
+          self.update_block_edges( block )
 
   # removes all blocks that contain a single statement that is a goto
   # and updates its predecessors accordingly
-  def clear_single_gotos(self):
+  # blocks is the list of used blocks to work on (such as a single procedure's), and defaults to all of them
+  @phase_profile.profiled("single gotos")
+  def clear_single_gotos(self, blocks=None):
     b_node, in_node = self.get_node_lookup_functions()
 
     # remove blocks with only a single goto statement
+    # only the blocks that jump to the removed block need to be retargeted
     def remove_single_goto(comes_from, goes_to):
-      for idx, block in enumerate(self.block_nodes):
-        if self.block_used[idx] and block.children:
+      for idx in self.used_predecessors(comes_from):
+        block = b_node(idx)
+        if block.children:
           ptr = block.children[-1]
           stmt = in_node(ptr)
           if stmt.tag in ["if", "goto", "loop"]:
             for branch_loc, b in enumerate(stmt.vals):
               if b == comes_from:
                 stmt.vals[branch_loc] = goes_to
+            self.update_block_edges(idx)
       self.block_used[comes_from] = False
-    for idx, block in enumerate(self.block_nodes):
+    if blocks is None:
+      blocks = range(len(self.block_nodes))
+    for idx in blocks:
+      block = b_node(idx)
       if self.block_used[idx]:
         if len(block.children) == 1:
           stmt = in_node( block.children[0] )
@@ -805,7 +1147,9 @@ class ABST():
   # handles cycles in the underlying undirected graph
   # this should be run before flattening conditionals
   # it will not handle directed cycles (that should be done first)
-  def handle_undirected_cycles(self):
+  # blocks is the list of used blocks to work on (such as a single procedure's), and defaults to all of them
+  @phase_profile.profiled("undirected cycles")
+  def handle_undirected_cycles(self, blocks=None):
     b_node, in_node = self.get_node_lookup_functions()
 
     # compute the least common ancestor of 2 blocks
@@ -816,59 +1160,48 @@ class ABST():
       cur_b = b1
       while cur_b not in self.procedure_map:
         # arbitrarily walk towards the root
-        cur_b = predecesors[cur_b][0]
+        cur_b = self.used_predecessors(cur_b)[0]
         b1_path.append(cur_b)
       # do the same for b2, until we have a match
       cur_b = b2
       while cur_b not in b1_path:
-        cur_b = predecesors[cur_b][0]
+        cur_b = self.used_predecessors(cur_b)[0]
       return cur_b
 
     # compute the least common ancestor of a list of blocks
     # do this by performing pairwise lca, in a binary tree fasion
     def lca(blocks):
-      # base case
-      if len(blocks) == 1:
-        return blocks[0]
-      # compute lca of pairs in the list
-      lcas = list(map( lambda p : lca2(p[0],p[1]), zip(blocks[0::2], blocks[1::2]) ))
-      # add in the odd element if there is one
-      if len(blocks) % 2 == 1:
-        lcas.append(blocks[-1])
-      # recursively reduce the size of the list
-      return lca(lcas)
-    
-    # compute each block's predecesors
-    predecesors = [[] for _ in range( len(self.block_nodes) )]
-    for idx, block in enumerate(self.block_nodes):
-      if self.block_used[idx] and block.children:
-        ptr = block.children[-1]
-        stmt = in_node(ptr)
-        if stmt.tag in ["if", "goto", "loop"]:
-          for b in stmt.vals:
-            predecesors[b].append(idx)
+      while len(blocks) > 1:
+        # compute lca of pairs in the list
+        lcas = list(map( lambda p : lca2(p[0],p[1]), zip(blocks[0::2], blocks[1::2]) ))
+        # add in the odd element if there is one
+        if len(blocks) % 2 == 1:
+          lcas.append(blocks[-1])
+        # repeat on the reduced list
+        blocks = lcas
+      return blocks[0]
 
     # get a reverse topological sort of the block graph
     # using DFS algorithm here: https://en.wikipedia.org/wiki/Topological_sorting
-    # note that this algorithm will get stuck in an infinite loop if cycles remain in the CFG
-    # (this is easy to fix, but the crash will catch bad loop fixing if it happens...)
-    rev_top_sort = []
-    marked = []
-    def visit(b):
-      if b in marked:
-        return
-      for b_pred in predecesors[b]:
-        visit(b_pred)
-      marked.append(b)
-      rev_top_sort.insert(0, b)
-    for b in compress(range(len(self.block_nodes)), self.block_used):
-      if b not in marked:
-        visit(b)
+    # a block is only left once all of its predecessors have been, so reversing the order blocks are left in gives the sort
+    # if a cycle remains in the CFG (bad loop fixing), there is no such order; it is reported, and the sort is not trustworthy
+    top_sort = []
+    top_sort_set = set([])
+    def check_cycle(b, b_pred, is_new):
+      if not is_new and b_pred not in top_sort_set and self.game_context.show_alerts:
+        alerts.alert("loop structure", "Directed cycle remains after loops were handled, at block " + str(b_pred))
+    def mark(b):
+      top_sort.append(b)
+      top_sort_set.add(b)
+    if blocks is None:
+      blocks = compress(range(len(self.block_nodes)), self.block_used)
+    depth_first_search(blocks, self.used_predecessors, edge=check_cycle, leave=mark)
+    rev_top_sort = top_sort[::-1]
 
     # merge a block into the lca of its predecesors
     def merge_into(inner, outer):
       # strip predecesors of their links to this node
-      for pred in predecesors[inner]:
+      for pred in self.used_predecessors(inner):
         node = b_node(pred)
         stmt = in_node( node.children[-1] )
         # simply remove the goto statment altogether
@@ -883,19 +1216,28 @@ class ABST():
           else:
             stmt.children[0] = self.negate_bool( stmt.children[0] )
             stmt.vals.pop(0)
+        self.update_block_edges(pred)
       # add the statements of the inner block to the outer one
       b_node(outer).children += b_node(inner).children
+      self.update_block_edges(outer)
       self.block_used[inner] = False
             
     # any block with multiple predecesors should be moved
     # this should be done in reverse topological order so we do not combine into blocks that have already been merged away
     for b in rev_top_sort:
-      if len( predecesors[b] ) > 1:
-        merge_into(b, lca( predecesors[b] ))
+      preds = self.used_predecessors(b)
+      if len( preds ) > 1:
+        merge_into(b, lca( preds ))
  
   # returns a string representing the code of an ABST
   # if a function formater is given, it it will be used in place of function display default behavior
   def display_decompilation(self, func_display=None):
+    return "\n\n".join( self.display_procedures(func_display) )
+
+  # returns a list with the code of each procedure, in procedure order
+  # func_display is as in display_decompilation
+  @phase_profile.profiled("display")
+  def display_procedures(self, func_display=None):
     b_node, in_node = self.get_node_lookup_functions()
 
     def indent(s):
@@ -914,34 +1256,42 @@ class ABST():
         return 'p' + str(-1 - index)
 
     def display_native_name(index):
-      if index in native_functions:
-        name = native_functions[index].name
+      if index in self.game_context.native_functions:
+        name = self.game_context.native_functions[index].name
         if name[0] == "_":
           name = name[1:]
         return name
       else:
         return "func_" + "{:#06x}".format(index)
 
-    def display_func_or_send(node):
-      function_params = list(map( compose(display_exp_node, in_node), node.children))
+    def display_func_or_send(node, function_params):
       if func_display is not None:
         formated_name = func_display(node.vals[0], list(map( in_node, node.children )), function_params )
         if formated_name[0]:
           return formated_name[1]
       function_name = display_native_name(node.vals[0])
       return function_name + "(" + ", ".join(function_params) + ")"
-    
-    def display_stmt_node(node):
-      
+
+    # the nodes whose strings are needed to display the given node:
+    # its sub-statements or expressions, followed by the blocks it jumps to
+    def display_parts(node):
+      parts = list(map(in_node, node.children))
+      if node.tag in ["goto", "if", "loop"]:
+        parts += list(map(b_node, node.vals))
+      return parts
+
+    # the string for a node, given the strings of its display_parts
+    def display_node_from_parts(node, parts):
+
       # seq stmt
       if node.tag == "seq":
-        if not node.children:
+        if not parts:
           return "pass"
-        return "\n".join( map(compose(display_stmt_node, in_node), node.children) )
+        return "\n".join(parts)
 
       # assign stmt
       elif node.tag == "assign":
-        return display_var_name(node.vals[0]) + " = " + display_exp_node( in_node(node.children[0]) )
+        return display_var_name(node.vals[0]) + " = " + parts[0]
 
       # return, break, continue stmt
       elif node.tag in ["return", "break", "continue"]:
@@ -949,7 +1299,7 @@ class ABST():
 
       # goto stmt
       elif node.tag == "goto":
-        return display_stmt_node( b_node(node.vals[0]) )
+        return parts[0]
 
       # label stmt
       elif node.tag == "label":
@@ -964,28 +1314,24 @@ class ABST():
       # call stmt
       elif node.tag in "call":
         function_name = self.procedure_map[ node.vals[0] ]
-        function_params = ", ".join( map( compose(display_exp_node, in_node), node.children) )
+        function_params = ", ".join(parts)
         return function_name + "(" + function_params + ")"
 
-      # send stmt
-      elif node.tag == "send":
-        return display_func_or_send(node)
+      # send stmt or func exp
+      elif node.tag in ["send", "func"]:
+        return display_func_or_send(node, parts)
 
       # if stmt
       elif node.tag == "if":
         cond_lines = []
         first = True
-        for child in node.children:
+        for cond_str in parts[:len(node.children)]:
           cond_name = "if" if first else "elif"
-          cond = cond_name + " " + display_exp_node( in_node( child ) ) + ":"
+          cond = cond_name + " " + cond_str + ":"
           cond_lines.append(cond)
           first = False
-        blocks = []
-        for jump_loc in node.vals:
-          block = display_stmt_node( b_node( jump_loc ) )
-          # indent the blocks
-          block = indent(block)
-          blocks.append(block)
+        # indent the blocks
+        blocks = list(map(indent, parts[len(node.children):]))
         # create full stmt
         if len(cond_lines) == len(blocks):
           interleaved = [val for pair in zip(cond_lines, blocks) for val in pair]
@@ -996,8 +1342,8 @@ class ABST():
 
       # loop stmt
       elif node.tag == "loop":
-        cond_str = display_exp_node( in_node(node.children[0]) )
-        branch_strs = list(map( compose(display_stmt_node, b_node), node.vals ))
+        cond_str = parts[0]
+        branch_strs = parts[1:]
         inner_str = indent( branch_strs[0] )
         top_line = ""
         if len(node.vals) == 3:
@@ -1007,20 +1353,15 @@ class ABST():
           top_line = "while " + cond_str + ":"
         return "\n".join([ top_line, inner_str, branch_strs[1] ])
 
-    def display_exp_node(node):
-      
       # binary exp
-      if node.tag in bin_symbols:
-        lhs = display_exp_node( in_node(node.children[0]) )
-        rhs = display_exp_node( in_node(node.children[1]) )
+      elif node.tag in bin_symbols:
         sym = bin_symbols[node.tag]
-        return "(" + lhs + " " + sym + " " + rhs + ")"
+        return "(" + parts[0] + " " + sym + " " + parts[1] + ")"
 
       # unary exp
       elif node.tag in mon_symbols:
-        arg = display_exp_node( in_node(node.children[0]) )
         sym = mon_symbols[node.tag]
-        return sym + arg
+        return sym + parts[0]
 
       # var exp
       elif node.tag == "var":
@@ -1030,23 +1371,42 @@ class ABST():
       elif node.tag == "lit":
         return str( node.vals[0] )
 
-      # func exp
-      elif node.tag == "func":
-        return display_func_or_send(node)
+    # nodes are displayed bottom up with an explicit stack, since goto chains can be very long
+    # a node's string does not depend on where it appears, so shared nodes (and blocks reached from
+    # several gotos) are only displayed once; each string is kept until every node using it has been displayed,
+    # since the strings of nested code repeat everything below them, and keeping all of them grows quadratically
+    def display_node(node):
+      # the number of nodes still to be displayed that use each node's string
+      uses = {}
+      def count_use(v, part, is_new):
+        uses[part] = uses.get(part, 0) + 1
+      depth_first_search([node], display_parts, edge=count_use)
+
+      displayed = {}
+      def leave(v):
+        parts = display_parts(v)
+        displayed[v] = display_node_from_parts( v, [displayed[part] for part in parts] )
+        for part in parts:
+          uses[part] -= 1
+          if not uses[part]:
+            del displayed[part]
+      depth_first_search([node], display_parts, leave=leave)
+      return displayed[node]
 
     # display each procedure
     proc_strs = []
     for proc in self.procedure_info:
       args_strs = map(display_var_name, range(-1, -1 - proc.pops, -1))
       proc_str = proc.name + "(" + ",".join(args_strs) + "):\n"
-      proc_str += indent(display_stmt_node( b_node(proc.block_num) ))
+      proc_str += indent(display_node( b_node(proc.block_num) ))
       proc_str = unindent_labels(proc_str)
       proc_strs.append(proc_str)
-    return "\n\n".join(proc_strs)
+    return proc_strs
 
   # cleaning up loops is done by moving continues out of conditionals when it's safe
   # removing code after continues in a sequence
   # and moving the update step to replace are remaining continues
+  @phase_profile.profiled("clean loops")
   def clean_loops(self):
     b_node, in_node = self.get_node_lookup_functions()
 
@@ -1084,11 +1444,12 @@ class ABST():
       return end
       
     # moves continues down to outside an if statement
-    def move_safe_continues(block):
+    def move_safe_continues(block_num):
+      block = b_node(block_num)
       for idx, child in enumerate( map(in_node, block.children) ):
         if child.tag == "if":
           # recursively move out continues
-          map( compose(move_safe_continues, b_node), child.vals)
+          map( move_safe_continues, child.vals)
           # find the blocks ending the goto chains of a branch
           chain_ends = []
           for val in child.vals:
@@ -1114,12 +1475,13 @@ class ABST():
               self.inner_used[ptr] = False
             continue_stmt = new_single_stmt("continue")
             block.children[idx+1:] = [continue_stmt]
+            self.update_block_edges(block_num)
 
     # move continues out for each loop
     for block in self.block_nodes:
       for stmt in map( in_node, block.children ):
         if stmt.tag == "loop":
-          move_safe_continues( b_node(stmt.vals[0]) )
+          move_safe_continues( stmt.vals[0] )
 
     # remove continues that end a loop
     for block in self.block_nodes:
@@ -1144,14 +1506,20 @@ class ABST():
       return any( map( compose(stmt_has_continues, in_node), block.children ) )
 
     # if a loop does not have continues, move the update step (if there is one) to the bottom of the loop
-    for block in self.block_nodes:
+    # (merged away blocks share their statements with the block they were merged into,
+    # so only used blocks are checked, keeping the index of the block that shows the loop current)
+    for block_num in compress(range(len(self.block_nodes)), self.block_used):
+      block = b_node(block_num)
       for stmt in map( in_node, block.children ):
         if stmt.tag == "loop" and len(stmt.vals) == 3:
           inner_block = b_node( stmt.vals[0] )
           inner_block.children.append( new_goto_stmt(stmt.vals[2]) )
+          self.update_block_edges( stmt.vals[0] )
           stmt.vals.pop()
+          self.update_block_edges( block_num )
     
   # clean up empty blocks
+  @phase_profile.profiled("clean empty blocks")
   def clean_empty_blocks(self):
     b_node, in_node = self.get_node_lookup_functions()
 
@@ -1160,52 +1528,57 @@ class ABST():
       block = b_node(block_num)
       return len(block.children) == 0
 
-    # go through each block and remove statements as necessary
-    has_changes = True
-    while has_changes:
+    # go through a block and remove statements as necessary
+    # returns True if the block was changed
+    def clean_block(block):
       has_changes = False
-      for block in self.block_nodes:
-        for idx, stmt in enumerate( map(in_node, block.children) ):
-          # goto to empty block can just be removed
-          if stmt.tag == "goto":
+      for idx, stmt in enumerate( map(in_node, block.children) ):
+        # goto to empty block can just be removed
+        if stmt.tag == "goto":
+          dest = stmt.vals[0]
+          if block_is_empty( dest ):
+            del block.children[idx]
+            has_changes = True
+            self.block_used[dest] = False
+        # there are a few cases for ifs depending on how many branches
+        # there are, and how many/which are empty
+        # this pass is run before elif blocks can be created, so there
+        # are at most two branches
+        elif stmt.tag == "if":
+          # no else case
+          if len(stmt.vals) == 1:
             dest = stmt.vals[0]
             if block_is_empty( dest ):
               del block.children[idx]
               has_changes = True
               self.block_used[dest] = False
-          # there are a few cases for ifs depending on how many branches
-          # there are, and how many/which are empty
-          # this pass is run before elif blocks can be created, so there
-          # are at most two branches
-          elif stmt.tag == "if":
-            # no else case
-            if len(stmt.vals) == 1:
-              dest = stmt.vals[0]
-              if block_is_empty( dest ):
-                del block.children[idx]
-                has_changes = True
-                self.block_used[dest] = False
-            else:
-              # note that if both blocks are empty, it is not necessarily safe to
-              # remove the whole if stmt because the condition may have side-effects
-              t_block = stmt.vals[0]
-              f_block = stmt.vals[1]
-              # if f_block is empty, just remove it
-              if block_is_empty(f_block):
-                stmt.vals.pop()
-                self.block_used[f_block] = False
-              # if t_block is empty, flip the condition and remove the now false block
-              elif block_is_empty(t_block):
-                stmt.children[0] = negate_bool( stmt.children[0] )
-                stmt.vals.pop(0)
-                self.block_used[t_block] = False
-          # loops with empty updates can drop the update step
-          elif stmt.tag == "loop" and len(stmt.vals) == 3:
-            u_block = stmt.vals[2]
-            if block_is_empty(u_block):
+          else:
+            # note that if both blocks are empty, it is not necessarily safe to
+            # remove the whole if stmt because the condition may have side-effects
+            t_block = stmt.vals[0]
+            f_block = stmt.vals[1]
+            # if f_block is empty, just remove it
+            if block_is_empty(f_block):
               stmt.vals.pop()
-              self.block_used[u_block] = False
- 
+              has_changes = True
+              self.block_used[f_block] = False
+            # if t_block is empty, flip the condition and remove the now false block
+            elif block_is_empty(t_block):
+              stmt.children[0] = self.negate_bool( stmt.children[0] )
+              stmt.vals.pop(0)
+              has_changes = True
+              self.block_used[t_block] = False
+        # loops with empty updates can drop the update step
+        elif stmt.tag == "loop" and len(stmt.vals) == 3:
+          u_block = stmt.vals[2]
+          if block_is_empty(u_block):
+            stmt.vals.pop()
+            has_changes = True
+            self.block_used[u_block] = False
+      return has_changes
+
+    self.pass_manager.worklist_block_loop("clean_empty_blocks", [clean_block], True)
+
   # flatten the branch structure of the tree by converting
   # if ... else (if ... else ...)   to
   # if ... elif ... else ...
@@ -1238,7 +1611,7 @@ class ABST():
               break
       return change
 
-    self.fixed_point_block_loop([flatten_block])
+    self.pass_manager.worklist_block_loop("flatten_abst_conds", [flatten_block])
 
   # if every execution of an if block results in a return,
   # we can move the else's code up into the if block
@@ -1246,17 +1619,27 @@ class ABST():
     b_node, in_node = self.get_node_lookup_functions()
   
     # returns true if the given block never jumps outside
-    def check_always_returns(node):
-      last_stmt = in_node( node.children[-1] )
-      if last_stmt.tag == "return":
-        return True
-      elif last_stmt.tag in ["if", "goto"]:
-        # recursively check if the branches return at the end
-        for block in map( b_node, last_stmt.vals ):
-          if not check_always_returns:
-            return False
-        return True
-      return False
+    # every branch is followed (with an explicit stack, since goto chains can be long),
+    # and all of them have to end in a return; an if without an else can fall through, so it never counts,
+    # and a loop continues at its break block; an empty block falls through too
+    def check_always_returns(block_num):
+      to_check = [block_num]
+      checked = set([])
+      while to_check:
+        num = to_check.pop()
+        if num in checked:
+          continue
+        checked.add(num)
+        if not b_node(num).children:
+          return False
+        last_stmt = in_node( b_node(num).children[-1] )
+        if last_stmt.tag == "goto" or (last_stmt.tag == "if" and len(last_stmt.vals) > len(last_stmt.children)):
+          to_check.extend(last_stmt.vals)
+        elif last_stmt.tag == "loop":
+          to_check.append(last_stmt.vals[1])
+        elif last_stmt.tag != "return":
+          return False
+      return True
     
     # run on every block
     def eliminate_block_elses(node):
@@ -1264,7 +1647,7 @@ class ABST():
       for child_idx, child in enumerate( map(in_node, node.children) ):
         if child.tag == "if" and len(child.vals) > len(child.children):
           # check if the block before the else block always returns
-          always_returns = check_always_returns( b_node(child.vals[-2]) )
+          always_returns = check_always_returns( child.vals[-2] )
           if always_returns:
             # move the block up
             else_block_idx = child.vals.pop()
@@ -1275,19 +1658,25 @@ class ABST():
             return True
       return False
 
-    self.fixed_point_block_loop([eliminate_block_elses])
+    self.pass_manager.worklist_block_loop("eliminate_useless_elses", [eliminate_block_elses])
 
 
   # perform constant folding on all of the blocks of the given tree
   def fold_constants(self):
     b_node, in_node = self.get_node_lookup_functions()
 
+    # integer division, as / was in python 2; float literals still divide normally
+    def divide(a, b):
+      if isinstance(a, int) and isinstance(b, int):
+        return a // b
+      return a / b
+
     # foldable expressions and their functions
     foldable = {
       "add" : (lambda v : v[0] + v[1]),
       "sub" : (lambda v : v[0] - v[1]),
       "mul" : (lambda v : v[0] * v[1]),
-      "div" : (lambda v : v[0] if v[1] == 0 else v[0] / v[1]),
+      "div" : (lambda v : v[0] if v[1] == 0 else divide(v[0], v[1])),
       "neg" : (lambda v : -1 * v[0]),
       "bitnot" : (lambda v : (~v[0]) ),
       "boolnot" : (lambda v : (0 if v[0] == 1 else 1) ),
@@ -1301,11 +1690,8 @@ class ABST():
       "gte" : (lambda v : 1 if v[0] >= v[1] else 0),
     }
     
-    # fold constants within a given node
+    # fold constants in a single node, whose children have already been folded
     def fold_const_in_node(node):
-      # recursively fold constants in all sub-children
-      for child in node.children:
-        fold_const_in_node( in_node(child) )
       # make sure this can be folded
       if node.tag not in foldable:
         return
@@ -1324,18 +1710,22 @@ class ABST():
         self.inner_used[child] = False
       node.children = []
 
-    self.block_loop(fold_const_in_node)
+    # nodes that have already been folded; shared nodes only need to be folded once
+    folded = set([])
+
+    # fold constants in all of a block's statements, sub-expressions first
+    def fold_block(block):
+      depth_first_search(block.children, lambda ptr : in_node(ptr).children, leave=compose(fold_const_in_node, in_node), seen=folded)
+
+    self.pass_manager.block_loop("fold_constants", fold_block)
 
           
   # infer the types of all nodes for which it is possible
   def infer_types(self):
     b_node, in_node = self.get_node_lookup_functions()
  
-    # infer the type of a given node
+    # infer the type of a given node, whose children have already been typed
     def infer_node_type(node):
-      # recursively infer types of sub-expressions
-      for child in node.children:
-        infer_node_type( in_node(child) )
       # statements are just statements
       if node.tag in ["seq", "assign", "send", "return", "if", "goto"]:
         node.type = "stmt"
@@ -1358,10 +1748,18 @@ class ABST():
       # functions have their return type as their type
       elif node.tag in ["func"]:
         func_id = node.vals[0]
-        if func_id in native_functions:
-          node.type = native_functions[func_id].type
+        if func_id in self.game_context.native_functions:
+          node.type = self.game_context.native_functions[func_id].type
+
+    # nodes whose types have already been inferred; shared nodes only need to be visited once
+    typed = set([])
+
+    # infer the types in a block's statements, sub-expressions first, then the block itself
+    def infer_block_types(block):
+      depth_first_search(block.children, lambda ptr : in_node(ptr).children, leave=compose(infer_node_type, in_node), seen=typed)
+      infer_node_type(block)
 
-    self.block_loop(infer_node_type)
+    self.pass_manager.block_loop("infer_types", infer_block_types)
 
 
   # simplify boolean expressions where it is safe to do so
@@ -1369,13 +1767,12 @@ class ABST():
     b_node, in_node = self.get_node_lookup_functions()
 
     # simplifies a boolean expression by replacing them with more compact versions
+    # its sub-expressions should already have been simplified
     def simplify_boolean_expression(node):
       changed = False
-      # recursively infer types of sub-expressions
       for child in node.children:
         if child == 1:
           eprint (", ".join(map(str, [node.tag, node.vals, node.children, node.type])))
-        changed |= simplify_boolean_expression( in_node(child) )
       def mark_unused(pointer):
         self.inner_used[pointer] = False
       if node.tag in ["and", "or"]:
@@ -1389,11 +1786,13 @@ class ABST():
             bool_side = lhs
             lit_side = rhs
           if lit_side.vals[0] == other_val:
-            map(mark_unused, node.children)
+            for child in node.children:
+              mark_unused(child)
             node.copy_node(bool_side)
             changed = True
           elif lit_side.vals[0] == set_val:
-            map(mark_unused, node.children)
+            for child in node.children:
+              mark_unused(child)
             node.update("lit", [set_val], [], "bool")
             changed = True
       
@@ -1410,7 +1809,8 @@ class ABST():
             bool_idx = 1
             lit_idx = 0
           if lit_side.vals[0] == 1:
-            map(mark_unused, node.children)
+            for child in node.children:
+              mark_unused(child)
             node.copy_node(bool_side)
             changed = True
           elif lit_side.vals[0] == 0:
@@ -1420,27 +1820,35 @@ class ABST():
 
       return changed
 
+    # simplifies all of the expressions in a block's statements, sub-expressions first
+    def simplify_block(block):
+      changes = []
+      def leave(ptr):
+        changes.append( simplify_boolean_expression( in_node(ptr) ) )
+      depth_first_search(block.children, lambda ptr : in_node(ptr).children, leave=leave)
+      return any(changes)
+
     # push down boolean nots when applicable
     # TODO: write this when it seems appropriate
     def simplify_not_expression(node):
       return False
 
     # fixed point operation; simplification could introduce nots that can be pushed down
-    self.fixed_point_block_loop( [simplify_boolean_expression, simplify_not_expression] )
+    self.pass_manager.worklist_block_loop( "simplify_boolean_expressions", [simplify_block, simplify_not_expression] )
 
  
   # run all required optimization passes on the given ABST
   # there is a boolean flag for each optimization pass, which all default to True
+  # passes needed by another pass (such as infer_types) are run by the pass manager
   def optimize_abst(self, flatten_conditionals=True, flatten_elses=True, constant_folding=True, simplify_conditions=True):
     if flatten_conditionals:
-      self.flatten_abst_conds()
+      self.pass_manager.run("flatten_abst_conds")
     if flatten_elses:
-      self.eliminate_useless_elses()
+      self.pass_manager.run("eliminate_useless_elses")
     if constant_folding:
-      self.fold_constants()
+      self.pass_manager.run("fold_constants")
     if simplify_conditions:
-      self.infer_types()
-      self.simplify_boolean_expressions()
+      self.pass_manager.run("simplify_boolean_expressions")
 
 # a list of instructions with exactly one entry and one exit
 class Basic_Block():
@@ -1460,29 +1868,46 @@ class Basic_Block():
 
 # transform an unpacked flow file into a list of basic blocks,
 # with slightly more powerful instruction representation
-def abstract_flow(orig_flow):
+# procedures, if given, are the procedure label indices of the only procedures to abstract
+# they should include every procedure they call (see call_graph_closure)
+# if not given, the flow's live procedures are used, so procedures pruned from the flow are skipped
+# game_context is the context the flow was read with, unless another is given
+@phase_profile.profiled("abstract_flow")
+def abstract_flow(orig_flow, procedures=None, game_context=None):
+  if game_context is None:
+    game_context = orig_flow.game_context
+  natives = game_context.native_functions
 
-  flow = copy.deepcopy(orig_flow)
   proc_info = []
   special_labels = {}
 
+  # the flow blocks of the procedures to abstract, paired with their block graphs and original flow blocks
+  # only the flow blocks are renamed and retargeted below, so only they are copied
+  orig_procs = list( zip(orig_flow.block_graphs, orig_flow.flow_blocks) )
+  if procedures is None:
+    procedures = orig_flow.live_procedures
+  if procedures is not None:
+    procedures = set(procedures)
+    orig_procs = [ (graph, orig_proc) for graph, orig_proc in orig_procs if orig_proc[0].label_index in procedures ]
+  new_procs = copy.deepcopy( [orig_proc for _, orig_proc in orig_procs] )
+  flow_procs = [ (graph, proc, orig_proc) for (graph, orig_proc), proc in zip(orig_procs, new_procs) ]
+
   # rename all of the blocks
+  # the new ids of jump (and special) labels and of procedure labels, by their old ids
+  new_jump_ids = {}
+  new_proc_ids = {}
   new_id = 0
-  for graph, proc in zip(flow.block_graphs, flow.flow_blocks):
+  for graph, proc, _ in flow_procs:
     for block in proc:
       # skip unreachable
       if block.label_kind == "jump" and not graph.reachable[block.label_index]:
         continue
       old_id = block.label_index
       block.label_index = new_id
-      # make sure jumps that used to jump to this block still do
-      for new_proc, orig_proc in zip(flow.flow_blocks, orig_flow.flow_blocks):
-        for new_block, orig_block in zip(new_proc, orig_proc):
-          for new_instr, orig_instr in zip(new_block.instructions, orig_block.instructions):
-            if block.label_kind in ["jump", "special"] and orig_instr.opcode in jumpers and orig_instr.operand == old_id:
-              new_instr.operand = new_id
-            elif block.label_kind == "proc" and orig_instr.opcode in callers and orig_instr.operand == old_id:
-              new_instr.operand = new_id
+      if block.label_kind in ["jump", "special"]:
+        new_jump_ids[old_id] = new_id
+      elif block.label_kind == "proc":
+        new_proc_ids[old_id] = new_id
       # create new procedure info if this is the start of a procedure
       if block.label_kind == "proc":
         proc_info.append( Procedure_Info(new_id, block.name) )
@@ -1491,10 +1916,19 @@ def abstract_flow(orig_flow):
         special_labels[new_id] = block.name
       new_id += 1
 
+  # make sure jumps and calls that used to go to a block still do
+  for _, new_proc, orig_proc in flow_procs:
+    for new_block, orig_block in zip(new_proc, orig_proc):
+      for new_instr, orig_instr in zip(new_block.instructions, orig_block.instructions):
+        if orig_instr.opcode in jumpers and orig_instr.operand in new_jump_ids:
+          new_instr.operand = new_jump_ids[orig_instr.operand]
+        elif orig_instr.opcode in callers and orig_instr.operand in new_proc_ids:
+          new_instr.operand = new_proc_ids[orig_instr.operand]
+
   basic_blocks = new_id * [0]
 
   # construct the new basic blocks, replacing instructions with operations
-  for graph, proc, orig_proc in zip(flow.block_graphs, flow.flow_blocks, orig_flow.flow_blocks):
+  for graph, proc, orig_proc in flow_procs:
     for block, orig_block in zip(proc, orig_proc):
       # skip unreachable
       if block.label_kind == "jump" and not graph.reachable[orig_block.label_index]:
@@ -1529,9 +1963,9 @@ def abstract_flow(orig_flow):
           next_instr = block.instructions[idx + 1]
           if next_instr.opcode == 0x04:  # PUSHREG
             need_skip = True
-            operations.append( Operation(0x23, [instr.operand]) )  # FUNC
+            operations.append( Operation(0x23, [instr.operand], natives) )  # FUNC
           else:
-            operations.append( Operation(0x24, [instr.operand]) )  # SEND
+            operations.append( Operation(0x24, [instr.operand], natives) )  # SEND
         # we transform a JUMP into a CALL followed by an END
         elif instr.opcode == 0x0A:  # JUMP
           operations.append( Operation(0x0B, [instr.operand]) )  # CALL
@@ -1564,7 +1998,8 @@ def abstract_flow(orig_flow):
         if oper.pops is not None:
           proc.pops += oper.pops
         else:
-          eprint("An unknown native function begins a procedure. Cannot determine the number of arguments to the procedure.")
+          if game_context.show_alerts:
+            alerts.alert("procedure arguments", "An unknown native function begins a procedure. Cannot determine the number of arguments to the procedure.")
           break
       else:
         break
@@ -1572,6 +2007,7 @@ def abstract_flow(orig_flow):
     proc.pushes = 0
     
   procedure_pop_map = dict( (p.block_num, p.pops) for p in proc_info)
+  procedures_by_block = dict( (p.block_num, p) for p in proc_info)
   for block_num, block in enumerate(basic_blocks):
     def find_low_after(idx, height):
       lowest = height
@@ -1587,17 +2023,19 @@ def abstract_flow(orig_flow):
       height = procedure_pop_map[block_num]
     for idx, oper in enumerate(block.operations):
       if oper.opcode == 0x0B:  # CALL
-        for proc in proc_info:
-          if proc.block_num == oper.args[0]:
-            oper.pushes = proc.pushes
-            oper.pops = proc.pops
+        if oper.args[0] in procedures_by_block:
+          proc = procedures_by_block[ oper.args[0] ]
+          oper.pushes = proc.pushes
+          oper.pops = proc.pops
       if oper.pops is None:
         oper.pops = find_low_after(idx, height)
       height -= oper.pops
-      if height < 0:
-        eprint("Stack underflowed in block " + str(block.identifier) + "!")
+      if height < 0 and game_context.show_alerts:
+        alerts.alert("stack underflow", "Stack underflowed in block " + str(block.identifier) + "!")
       height += oper.pushes
 
+  phase_profile.count( "procedures", len(proc_info) )
+  phase_profile.count( "basic blocks", len(basic_blocks) )
   return basic_blocks, proc_info, special_labels
 
 # returns a special function formater for enemy ai
@@ -1605,7 +2043,8 @@ def abstract_flow(orig_flow):
 # if it is False the default formatting is used
 # otherwise, the second element of the tuple is the format
 def get_enemy_function_formater(tree, enemy_names, skill_names):
-  
+  native_functions = tree.game_context.native_functions
+
   def format_function(func_id, params, param_strs):
     # checks if a node is a literal, if so returns the tuple (True, lit)
     # otherwise returns (False, None)
@@ -1679,17 +2118,212 @@ def get_enemy_function_formater(tree, enemy_names, skill_names):
    
   return format_function 
 
-def decompile_ai_main():
-  global show_alerts
+# returns a structural hash of each procedure of an abstracted script (as returned by abstract_flow), in proc_info order
+# the hash ignores the procedure's own name, the names of its plain jump labels, and the numbers of its blocks
+# (only their order, which structuring depends on, is kept), so procedures with the same hash decompile to the same code
+# native functions are hashed by name and type rather than index, so the same code can be matched across games
+@phase_profile.profiled("procedure hashes")
+def procedure_hashes(game_context, basic_blocks, proc_info, special_labels):
+  # imported here, like Pool below, since most runs do not need it and it is slow to import
+  import hashlib
+  native_functions = game_context.native_functions
+  procedure_names = dict( (p.block_num, p.name) for p in proc_info )
+
+  def block_targets(block_num):
+    targets = []
+    for oper in basic_blocks[block_num].operations:
+      if oper.opcode == 0x25:   # COND
+        targets += oper.args
+      elif oper.opcode == 0x0D:   # GOTO
+        targets.append( oper.args[0] )
+    return targets
+
+  hashes = []
+  for proc in proc_info:
+    proc_blocks = sorted( depth_first_search([proc.block_num], block_targets) )
+    renumber = dict( (block_num, idx) for idx, block_num in enumerate(proc_blocks) )
+    parts = [proc.pops]
+    for block_num in proc_blocks:
+      parts.append( special_labels.get(block_num) )
+      for oper in basic_blocks[block_num].operations:
+        args = oper.args
+        if oper.opcode in [0x25, 0x0D]:   # COND, GOTO
+          args = [renumber[arg] for arg in args]
+        elif oper.opcode == 0x0B:   # CALL
+          args = [procedure_names.get(args[0], args[0])]
+        elif oper.opcode in [0x23, 0x24] and args[0] in native_functions:   # FUNC, SEND
+          args = [native_functions[args[0]].name, native_functions[args[0]].type]
+        parts.append( (oper.opcode, tuple(args), oper.pushes, oper.pops) )
+    hashes.append( hashlib.sha1( repr(parts).encode("utf-8") ).hexdigest() )
+  return hashes
+
+# the version of the decompiled code kept in a procedure cache file; a file of another version is not used
+# this must be changed whenever a change to structuring, optimizing, or displaying changes the decompiled code
+procedure_cache_version = 3
+
+# the decompiled code of procedures, by the settings used to decompile them and their structural hash (see procedure_hashes)
+# the code is stored without the procedure's name, since procedures with different names can share it
+# if a filename is given, the cache is loaded from it if it exists (and was written by this version), and save writes it back
+class Procedure_Cache():
+
+  def key(self, context, proc_hash):
+    return context + ":" + proc_hash
+
+  def save(self):
+    if self.filename is not None:
+      with open(self.filename, "w") as f:
+        json.dump( { "version" : procedure_cache_version, "code" : self.code }, f, sort_keys=True )
+
+  def __init__(self, filename=None):
+    self.filename = filename
+    self.code = {}
+    # keys added since the cache was loaded, so that caches filled in several processes can be merged
+    self.new_keys = []
+    self.hits = 0
+    self.misses = 0
+    if filename is not None and os.path.exists(filename):
+      with open(filename, "r") as f:
+        saved = json.load(f)
+      # the code in a file of another version may be stale, so it starts over
+      if isinstance(saved, dict) and saved.get("version") == procedure_cache_version:
+        self.code = saved["code"]
+      else:
+        eprint("The procedure cache " + filename + " is from another version of the decompiler, and will be replaced")
+
+# decompiles the procedures of an abstracted script, reusing the code of procedures found in the cache
+# context names everything other than the procedure that affects its code (settings, and the function display)
+# decompile_procedures(indices) decompiles the procedures at the given proc_info indices, returning their code in that order
+# game_context is the Game_Context the script was abstracted in
+# returns the same string display_decompilation would, with the procedures in proc_info order
+def decompile_with_cache(cache, context, game_context, basic_blocks, proc_info, special_labels, decompile_procedures):
+  keys = [ cache.key(context, proc_hash) for proc_hash in procedure_hashes(game_context, basic_blocks, proc_info, special_labels) ]
+
+  # only the first procedure with each key needs to be decompiled
+  missing = {}
+  for idx, key in enumerate(keys):
+    if key not in cache.code and key not in missing:
+      missing[key] = idx
+  cache.misses += len(missing)
+  cache.hits += len(keys) - len(missing)
+  phase_profile.count( "procedure cache misses", len(missing) )
+  phase_profile.count( "procedure cache hits", len(keys) - len(missing) )
+  if missing:
+    indices = sorted( missing.values() )
+    for idx, proc_str in zip( indices, decompile_procedures(indices) ):
+      cache.code[ keys[idx] ] = proc_str[ len(proc_info[idx].name): ]
+      cache.new_keys.append( keys[idx] )
+
+  return "\n\n".join( proc.name + cache.code[key] for proc, key in zip(proc_info, keys) )
+
+# the abstracted script and options shared by every job in a decompilation process pool
+# set in each worker by init_procedure_worker
+worker_state = None
+
+# sets up a process pool worker; the arguments are as in decompile_in_parallel
+# profiling is None, or whether to trace memory if the worker should profile its groups
+# collecting is None, or the file and whether to keep messages if the worker should collect its groups' alerts
+def init_procedure_worker(game_context, basic_blocks, proc_info, special_labels, handwritten, share_expressions, optimize_flags, profiling, collecting):
+  global worker_state
+  worker_state = (game_context, basic_blocks, proc_info, special_labels, handwritten, share_expressions, optimize_flags, profiling, collecting)
+
+# decompiles a group of procedures (indices into proc_info) in a worker
+# returns the displayed procedures, in the order of the group, the group's profile (None if not profiling),
+# and the group's alerts (None if not collecting)
+def decompile_procedure_group(group):
+  game_context, basic_blocks, proc_info, special_labels, handwritten, share_expressions, optimize_flags, profiling, collecting = worker_state
+  if profiling is not None:
+    phase_profile.start_profile(profiling)
+  if collecting is not None:
+    alerts.start_collecting(*collecting)
+  tree = ABST(game_context, basic_blocks, proc_info, special_labels, handwritten, share_expressions, group)
+  tree.optimize_abst(*optimize_flags)
+  proc_strs = tree.display_procedures()
+  profile = None
+  if profiling is not None:
+    profile = phase_profile.stop_profile().as_dict()
+  group_alerts = None
+  if collecting is not None:
+    group_alerts = alerts.stop_collecting().as_dict()
+  return (proc_strs, profile, group_alerts)
+
+# decompiles the procedures of an abstracted script using a pool of the given number of processes
+# procedures are split into groups of roughly equal size, and each group is structured, optimized, and displayed
+# in its own ABST; optimize_flags are the arguments to optimize_abst
+# procedures are the indices into proc_info of the procedures to decompile (all of them if not given)
+# returns the code of each of those procedures, in order
+def decompile_in_parallel(game_context, basic_blocks, proc_info, special_labels, handwritten, share_expressions, optimize_flags, jobs, procedures=None):
+  if procedures is None:
+    procedures = list( range(len(proc_info)) )
+
+  # a procedure's size is estimated by the number of blocks numbered from its first block up to the next procedure's
+  # (abstract_flow numbers each procedure's blocks together, apart from the blocks split off at IFs)
+  starts = sorted(p.block_num for p in proc_info) + [len(basic_blocks)]
+  next_start = dict( zip(starts, starts[1:]) )
+  sizes = [ next_start[p.block_num] - p.block_num for p in proc_info ]
+
+  # hand out the largest procedures first, always to the smallest group
+  # there are a few more groups than processes, so that a slow group does not hold up the others
+  num_groups = min( len(procedures), 2 * jobs )
+  groups = [ [] for _ in range(num_groups) ]
+  group_sizes = [0] * num_groups
+  for idx in sorted( procedures, key=lambda i : -sizes[i] ):
+    smallest = group_sizes.index( min(group_sizes) )
+    groups[smallest].append(idx)
+    group_sizes[smallest] += sizes[idx]
+  groups = [ sorted(group) for group in groups if group ]
+
+  # the workers are profiled if this process is, and their profiles are merged into this one's
+  profiling = None
+  if phase_profile.current is not None:
+    profiling = phase_profile.current.trace_memory
+  # likewise, the workers collect alerts if this process does
+  collecting = None
+  collector = alerts.collector()
+  if collector is not None:
+    collecting = (collector.file, collector.keep_messages)
+  from multiprocessing import Pool
+  pool = Pool(jobs, init_procedure_worker, (game_context, basic_blocks, proc_info, special_labels, handwritten, share_expressions, optimize_flags, profiling, collecting))
+  try:
+    results = pool.map(decompile_procedure_group, groups)
+  finally:
+    pool.close()
+    pool.join()
+
+  # stitch the procedures back together in their original order
+  proc_strs = {}
+  for group, (group_strs, profile, group_alerts) in zip(groups, results):
+    for idx, proc_str in zip(group, group_strs):
+      proc_strs[idx] = proc_str
+    if profile is not None:
+      # the worker's total time is already part of this process's wall time
+      profile["total"] = { "wall" : 0.0, "cpu" : profile["total"]["cpu"] }
+      phase_profile.current.merge(profile)
+    if group_alerts is not None:
+      collector.merge(group_alerts)
+  return [ proc_strs[idx] for idx in procedures ]
 
+def decompile_ai_main():
   # Parse the arguments
   args = parseArguments()
-  show_alerts = not args.hide_alerts
+  game_context = Game_Context(args.game, show_alerts=not args.hide_alerts)
 
-  set_game_specific_values(args.game)
+  if args.alert_report:
+    alerts.start_collecting(args.input_file)
+  if args.profile:
+    phase_profile.start_profile(args.profile_memory)
 
   # disassemble the AI script file
-  flow = Flow_File(args.input_file)
+  flow = Flow_File(args.input_file, game_context)
+
+  # only the requested procedures and the ones they call are decompiled
+  # a pattern that matches nothing is an error, rather than an empty decompilation
+  if args.proc:
+    try:
+      roots = flow.find_procedures(args.proc)
+    except ValueError as e:
+      eprint(str(e))
+      sys.exit(1)
+    flow.prune_procedures(roots)
 
   output = ""
   # decompile the AI disassembly
@@ -1699,15 +2333,32 @@ def decompile_ai_main():
   #output +=  "\n\n".join(map(str, basic_blocks))
   #print output
     
-  tree = ABST(basic_blocks, proc_info, special_labels, args.handwritten)
-  #print str( tree )
-
   if args.fully_optimize:
-    tree.optimize_abst()
+    optimize_flags = (True, True, True, True)
+  else:
+    optimize_flags = (args.flatten_conditionals, args.flatten_elses, args.constant_folding, args.simplify_conditions)
+
+  # decompiles the procedures at the given proc_info indices, returning their code
+  def decompile_procedures(procedures):
+    if args.jobs > 1:
+      return decompile_in_parallel(game_context, basic_blocks, proc_info, special_labels, args.handwritten, args.share_expressions, optimize_flags, args.jobs, procedures)
+    tree = ABST(game_context, basic_blocks, proc_info, special_labels, args.handwritten, args.share_expressions, procedures)
+    #print str( tree )
+    tree.optimize_abst(*optimize_flags)
+    return tree.display_procedures()
+
+  if args.procedure_cache:
+    cache = Procedure_Cache(args.procedure_cache)
+    context = repr( (args.handwritten, optimize_flags) )
+    output += decompile_with_cache(cache, context, game_context, basic_blocks, proc_info, special_labels, decompile_procedures) + "\n\n"
+    cache.save()
   else:
-    tree.optimize_abst(args.flatten_conditionals, args.flatten_elses, args.constant_folding, args.simplify_conditions)
+    output += "\n\n".join( decompile_procedures(None) ) + "\n\n"
 
-  output += tree.display_decompilation() + "\n\n"
+  if args.profile:
+    phase_profile.write_profile(phase_profile.stop_profile(), args.profile)
+  if args.alert_report:
+    alerts.report(alerts.stop_collecting(), args.alert_report)
 
   if args.show_output:
     print(output)
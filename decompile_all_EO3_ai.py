@@ -6,8 +6,8 @@
 # assumes directory structure:
 # ./EO3/
 #     AI/
-#       BtlBSTScrFileTable.tbl
-#       BtlNPCScrFileTable.tbl
+#       BtlBSTScrFileTable.tbl (optional)
+#       BtlNPCScrFileTable.tbl (optional)
 #       BtlScrFileTable.tbl
 #       *.bf
 #     Skills/
@@ -31,10 +31,28 @@
 import argparse
 from sys import stderr
 import os
+import hashlib
+import signal
+import time
+from multiprocessing import Pool
+try:
+    from importlib import reload
+except ImportError:
+    pass
+import eo_value_lookup
+from game_context import Game_Context
 import unpack_EO_name_table
 import unpack_ai_proc_list
 import unpack_ai
 import decompile_ai
+import phase_profile
+import alerts
+
+def eprint(s):
+    stderr.write(s + "\n")
+
+# the cheaper ways of decompiling a file, for when it runs out of time
+fallback_modes = ["handwritten", "unoptimized", "disassembly"]
 
 def parseArguments():
     # Create argument parser
@@ -45,6 +63,18 @@ def parseArguments():
     parser.add_argument("--flatten_elses", action="store_true", help="(if t return else f ) will be converted to (if t return f) when permissable to reduce the nesting depth and resulting indentation of code")
     parser.add_argument("--constant_folding", action="store_true", help="any arithmetic containing only constants will be replaced with the value of that expression")
     parser.add_argument("--simplify_conditions", action="store_true", help="boolean conditions will be simplified when it is permissable; see docs/ai_notes.txt for some warnings about this flag")
+    parser.add_argument("--prune_unreachable", action="store_true", help="procedures that cannot be reached from a procedure named in the procedure table (or after the file) are not decompiled")
+    parser.add_argument("--procedure_cache", metavar="FILE", help="decompiled procedures are saved to and reused from this file, so procedures decompiled in an earlier run (even of another game) are not decompiled again")
+    parser.add_argument("--share_expressions", action="store_true", help="identical expressions will be stored once and shared, which saves time and memory on scripts that repeat the same expressions")
+    parser.add_argument("--profile", metavar="FILE", help="the time spent in each phase of decompilation (in total and for each file), and counts of blocks, nodes, and pass iterations, are written to this file as JSON")
+    parser.add_argument("--profile_memory", action="store_true", help="with --profile, the peak memory allocated in each phase is recorded too (this makes decompilation much slower)")
+    parser.add_argument("--alert_report", metavar="FILE", help="the alerts of every file are written to this file as JSON (a summary of them is always printed to stderr at the end)")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes to decompile files in; the largest files are started first")
+    parser.add_argument("--time_budget", type=float, default=0, metavar="SECONDS", help="a file that takes longer than this to decompile is decompiled again in the fallback mode (and, if that also runs out of time, only disassembled); 0 means no limit")
+    parser.add_argument("--fallback", choices=fallback_modes, default="handwritten", help="the cheaper mode used for files that run out of time: as if --handwritten was given, with no optimizations, or only disassembled")
+    parser.add_argument("--watch", action="store_true", help="after decompiling everything, keep watching the AI files, name tables, procedure lists, and eo_value_lookup files, and redo only the outputs affected by each change (until interrupted)")
+    parser.add_argument("--watch_interval", type=float, default=0.5, metavar="SECONDS", help="with --watch, how often to check for changes")
+    parser.add_argument("--debounce", type=float, default=0.2, metavar="SECONDS", help="with --watch, how long the files must stay unchanged before a burst of changes is handled")
 
     # Print version
     parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
@@ -54,21 +84,136 @@ def parseArguments():
 
     return args
 
+# raised when a file has taken longer than its time budget
+class Time_Budget_Exceeded(Exception):
+    pass
+
+# returns func(), raising Time_Budget_Exceeded if it takes more than the given number of seconds
+# a budget of 0 is no limit; there is also no limit where the platform has no interval timer
+def run_with_time_budget(func, seconds):
+    if not seconds or not hasattr(signal, "setitimer"):
+        return func()
+    def out_of_time(signum, frame):
+        raise Time_Budget_Exceeded()
+    old_handler = signal.signal(signal.SIGALRM, out_of_time)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        return func()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+
+# the arguments, game context, tables, and procedure cache used to decompile every file of a batch
+# set in each process by init_batch_worker
+batch_state = None
+
+# sets up a process for decompiling files; in a process pool, each worker gets its own copy of the procedure cache
+def init_batch_worker(args, scr_names, scr_skill_names, procedure_index, procedure_cache):
+    global batch_state
+    game_context = Game_Context("EO3")
+    # enemy functions are displayed with names from the tables, so cached enemy code is only good for the same names
+    names_digest = hashlib.sha1( "\n".join(scr_names.names + scr_skill_names.names).encode("utf-8") ).hexdigest()
+    batch_state = (args, game_context, scr_names, scr_skill_names, procedure_index, procedure_cache, names_digest)
+
+# decompiles the AI file at path in the given mode ("normal", or one of the fallback_modes), returning its code
+# kind and listed_proc_name are as returned by unpack_ai_proc_list.listed_procedure_name
+def decompile_file(path, kind, listed_proc_name, mode):
+    args, game_context, scr_names, scr_skill_names, procedure_index, procedure_cache, names_digest = batch_state
+
+    flow = unpack_ai.Flow_File(path, game_context)
+    # the entry points are the procedures an entity can be given, or the one named after the file
+    # if none are found, nothing is known to be unreachable, so everything is kept
+    if args.prune_unreachable:
+        entry_names = set(procedure_index.procedure_names() + [listed_proc_name])
+        roots = [label.index for label in flow.proc_labels if label.name in entry_names]
+        if roots:
+            flow.prune_procedures(roots)
+    if mode == "disassembly":
+        return flow.display_disassembly()
+    basic_blocks, proc_info, special_labels = decompile_ai.abstract_flow(flow)
+
+    handwritten = mode == "handwritten"
+    if mode == "unoptimized":
+        optimize_flags = (False, False, False, False)
+    elif args.fully_optimize:
+        optimize_flags = (True, True, True, True)
+    else:
+        optimize_flags = (args.flatten_conditionals, args.flatten_elses, args.constant_folding, args.simplify_conditions)
+
+    # decompiles the procedures at the given proc_info indices, returning their code
+    def decompile_procedures(procedures):
+        abst = decompile_ai.ABST(game_context, basic_blocks, proc_info, special_labels, handwritten, args.share_expressions, procedures)
+        abst.optimize_abst(*optimize_flags)
+        if kind == "scr":
+            func_display = decompile_ai.get_enemy_function_formater(abst, scr_names.names, scr_skill_names.names)
+            return abst.display_procedures(func_display)
+        return abst.display_procedures()
+
+    # procedures repeated within and across files are only decompiled once
+    # enemy functions are displayed with this game's names, so their code is kept apart from the rest
+    context = repr( (handwritten, optimize_flags, "EO3 enemy " + names_digest if kind == "scr" else None) )
+    return decompile_ai.decompile_with_cache(procedure_cache, context, game_context, basic_blocks, proc_info, special_labels, decompile_procedures)
+
+# decompiles one file's worth of work, falling back to cheaper modes when the time budget runs out
+# work is a tuple of a content key and the path, kind, and listed procedure name of a file with that content
+# returns the content key, the code, the mode used, the procedure cache entries that were added,
+# the file's profile (None if not profiling), and the file's alerts (in the form given by Alert_Collector.as_dict)
+def decompile_batch_work(work):
+    args, game_context, scr_names, scr_skill_names, procedure_index, procedure_cache, names_digest = batch_state
+    content_key, path, kind, listed_proc_name = work
+    if args.profile:
+        phase_profile.start_profile(args.profile_memory)
+    # alerts are collected rather than printed, so that the batch can summarize them instead of interleaving them
+    alerts.start_collecting(path)
+
+    modes = ["normal", args.fallback]
+    if args.fallback != "disassembly":
+        modes.append("disassembly")
+    for mode in modes:
+        # disassembly is cheap and is the last resort, so it always runs to the end
+        budget = 0 if mode == "disassembly" else args.time_budget
+        try:
+            code = run_with_time_budget( lambda : decompile_file(path, kind, listed_proc_name, mode), budget )
+            break
+        except Time_Budget_Exceeded:
+            alerts.alert("time budget", "Took longer than " + str(args.time_budget) + " seconds to decompile in " + mode + " mode")
+    if mode != "normal":
+        alerts.alert("fallback", "Decompiled in " + mode + " mode")
+
+    new_entries = dict( (key, procedure_cache.code[key]) for key in procedure_cache.new_keys )
+    procedure_cache.new_keys = []
+    profile = None
+    if args.profile:
+        profile = phase_profile.stop_profile().as_dict()
+    return (content_key, code, mode, new_entries, profile, alerts.stop_collecting().as_dict())
+
 if __name__ == '__main__':
     # Parse the arguments
     args = parseArguments()
 
-    # Build the enemy name table
-    scr_names = unpack_EO_name_table.EO_name_table()
-    scr_names.build_from_file("EO3/Enemy/enemynametable.tbl", 2, False)
-    # Build the enemy skill name table
-    scr_skill_names = unpack_EO_name_table.EO_name_table()
-    scr_skill_names.build_from_file("EO3/Skill/enemyskillnametable.tbl", 2, False)
-    # Build the player skill name table
-    scrn_skill_names = unpack_EO_name_table.EO_name_table()
-    scrn_skill_names.build_from_file("EO3/Skill/playerskillnametable.tbl", 2, False)
-    # Build the procedure name list for enemies
-    scr_proc_list = unpack_ai_proc_list.get_procedure_names("EO3/AI/BtlScrFileTable.tbl", scr_names.size)
+    # the name tables and procedure lists the batch reads, other than the AI files themselves
+    table_files = ["EO3/Enemy/enemynametable.tbl", "EO3/Skill/enemyskillnametable.tbl", "EO3/Skill/playerskillnametable.tbl"]
+    table_files += sorted( os.path.join("EO3", list_file) for list_file, name_file in unpack_ai_proc_list.procedure_list_files.values() )
+
+    # builds the name tables and the procedure index
+    def load_tables():
+        global scr_names, scr_skill_names, scrn_skill_names, procedure_index
+        # Build the enemy name table
+        scr_names = unpack_EO_name_table.EO_name_table()
+        scr_names.build_from_file("EO3/Enemy/enemynametable.tbl", 2, False)
+        # Build the enemy skill name table
+        scr_skill_names = unpack_EO_name_table.EO_name_table()
+        scr_skill_names.build_from_file("EO3/Skill/enemyskillnametable.tbl", 2, False)
+        # Build the player skill name table
+        scrn_skill_names = unpack_EO_name_table.EO_name_table()
+        scrn_skill_names.build_from_file("EO3/Skill/playerskillnametable.tbl", 2, False)
+        # Build the index between procedure names and the entities that use them
+        procedure_index = unpack_ai_proc_list.build_procedure_index("EO3")
+    load_tables()
+
+    # the content digest and size of each AI file, with the modification time and size they were found at
+    # so that watching only reads the files that changed
+    file_facts = {}
 
     # holds all info in, and determined about a single AI file
     class AI_Info():
@@ -101,57 +246,73 @@ if __name__ == '__main__':
 
             return output
 
-        # computes everything about the ai from its file
+        # determines everything about the ai that is known from its name and headers, without decompiling it
         def __init__(self, subdir, filename):
             # name analysis
             self.filename = filename
-            name_info = file[:-3].split('_', 2)  # 'AI_scr?_name.bf'
-            self.type = name_info[1]
-            listed_proc_name = '_'.join(name_info[1:])
-            self.possible_names = []
-            for idx, proc_name in enumerate(scr_proc_list):
-                if proc_name == listed_proc_name:
-                    self.possible_names.append( scr_names.names[idx] )
+            self.path = os.path.join(subdir, filename)
+            self.type, self.listed_proc_name = unpack_ai_proc_list.listed_procedure_name(filename)
+            # sea allies and summons have no known name lists yet, so only enemies get possible names
+            self.possible_names = procedure_index.entity_names_of(self.listed_proc_name)
 
             #if self.type == "scr" and not self.possible_names:
             #    print "No possible name found: " + self.filename
-            # TODO: this loop for sea allies and summons once a name list is found
 
             # when there are multiple enemies with the same name, use a non-zero version to distinguish them
             self.version = 0
-            
-            self.flow = unpack_ai.Flow_File(os.path.join(subdir, filename))
-            self.basic_blocks, self.proc_info, self.special_labels = decompile_ai.abstract_flow(self.flow)
-            self.abst = decompile_ai.ABST(self.basic_blocks, self.proc_info, self.special_labels, False)
-            if args.fully_optimize:
-              self.abst.optimize_abst()
-            else:
-              self.abst.optimize_abst(args.flatten_conditionals, args.flatten_elses, args.constant_folding, args.simplify_conditions)
 
-    decompile_ai.set_game_specific_values("EO3")
-    ai_info = []            
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime, stat.st_size)
+            if self.path not in file_facts or file_facts[self.path][0] != stamp:
+                with open(self.path, "rb") as f:
+                    digest = hashlib.sha1( f.read() ).hexdigest()
+                # used to start the largest files first
+                size = unpack_ai.count_instructions(self.path)
+                file_facts[self.path] = (stamp, digest, size)
+            stamp, digest, self.size = file_facts[self.path]
+
+            # byte-identical files decompile to the same code, unless their names make them decompile differently
+            self.content_key = (digest, self.type, self.listed_proc_name if args.prune_unreachable else None)
 
-    for subdir, dirs, files in os.walk('EO3/AI/'):
-        for file in files:
-            if file.endswith('.bf'):
-                # create the raw disassembly flow
-                ai_info.append( AI_Info(subdir, file) )
+    # first pass: find every file, and work out its name and version
+    # this only needs the file names and headers, so nothing is decompiled yet
+    # returns the files grouped by content key
+    def find_ai_files():
+        ai_info = []
+        for subdir, dirs, files in os.walk('EO3/AI/'):
+            for file in files:
+                if file.endswith('.bf'):
+                    ai_info.append( AI_Info(subdir, file) )
     
-    # adds versions to AIs with the same first possible name
-    # note that this is not particularly efficient
-    for out_idx, out_info in enumerate(ai_info):
-        matches = [out_info]
-        for in_idx, in_info in enumerate(ai_info):
-            if out_idx != in_idx and out_info.possible_names and in_info.possible_names:
-                if out_info.possible_names[0] == in_info.possible_names[0]:
-                    matches.append(in_info)
-        if len(matches) > 1:
-            matches.sort(key=lambda i : i.filename)
-            for in_idx, in_info in enumerate(matches):
-                in_info.version = in_idx + 1
-
-    for info in ai_info:
-        
+        # adds versions to AIs with the same first possible name
+        same_name = {}
+        for info in ai_info:
+            if info.possible_names:
+                same_name.setdefault(info.possible_names[0], []).append(info)
+        for matches in same_name.values():
+            if len(matches) > 1:
+                matches.sort(key=lambda i : i.filename)
+                for in_idx, in_info in enumerate(matches):
+                    in_info.version = in_idx + 1
+
+        # byte-identical files are decompiled once, and the code is written out for each of them
+        same_content = {}
+        for info in ai_info:
+            same_content.setdefault(info.content_key, []).append(info)
+        return same_content
+
+    # returns the work of decompiling each content key, with the largest files first
+    # (so that a large file started late does not hold up the end of the batch)
+    def batch_work(same_content, content_keys):
+        work = [ (key, same_content[key][0].path, same_content[key][0].type, same_content[key][0].listed_proc_name) for key in content_keys ]
+        work.sort( key=lambda w : -same_content[ w[0] ][0].size )
+        return work
+
+    same_content = find_ai_files()
+    work = batch_work(same_content, same_content.keys())
+
+    # returns the text of an AI file's output
+    def output_text(info, code, mode):
         # header info
         output = []
         if info.possible_names:
@@ -159,13 +320,153 @@ if __name__ == '__main__':
             if info.version > 0:
                 output[0] += " (version " + str(info.version) + ")"
         output += ["Original filename: " + info.filename]
+        if mode != "normal":
+            output += ["Decompiled in " + mode + " mode, since the time budget ran out"]
         output += [""]
-        if info.type == "scr":
-            func_display = decompile_ai.get_enemy_function_formater(info.abst, scr_names.names, scr_skill_names.names)
-            output += [info.abst.display_decompilation(func_display)]
-        else:
-            output += [info.abst.display_decompilation()]
-
-        # Write decompilation to a file
-        with open(info.get_full_output_name(), "w") as f:
-            f.write( "\n".join(output) )
+        output += [code]
+        return "\n".join(output)
+
+    # when watching, the code of each content key and the text of each output file are kept,
+    # so that a change only redoes what it affects
+    decompiled = {}
+    written = {}
+
+    # writes the decompilation of every file with the given content
+    def write_files(content_key, code, mode):
+        if args.watch:
+            decompiled[content_key] = (code, mode)
+        for info in same_content[content_key]:
+            text = output_text(info, code, mode)
+            output_name = info.get_full_output_name()
+            if args.watch:
+                if written.get(output_name) == text:
+                    continue
+                written[output_name] = text
+
+            # Write decompilation to a file
+            with open(output_name, "w") as f:
+                f.write( text )
+
+    # the profiles of each file, and their sum
+    file_profiles = {}
+    total_profile = phase_profile.Profile()
+    # adds a file's profile to the batch's
+    def add_profile(content_key, profile):
+        if profile is not None:
+            file_profiles[ same_content[content_key][0].path ] = profile
+            total_profile.merge(profile)
+
+    # the alerts of every file
+    total_alerts = alerts.Alert_Collector()
+
+    # second pass: decompile and write each file in turn, so only the files being worked on are held at a time
+    procedure_cache = decompile_ai.Procedure_Cache(args.procedure_cache)
+    worker_args = (args, scr_names, scr_skill_names, procedure_index, procedure_cache)
+    if args.jobs > 1:
+        pool = Pool(args.jobs, init_batch_worker, worker_args)
+        try:
+            for content_key, code, mode, new_entries, profile, file_alerts in pool.imap_unordered(decompile_batch_work, work):
+                procedure_cache.code.update(new_entries)
+                add_profile(content_key, profile)
+                total_alerts.merge(file_alerts)
+                write_files(content_key, code, mode)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        init_batch_worker(*worker_args)
+        for w in work:
+            content_key, code, mode, new_entries, profile, file_alerts = decompile_batch_work(w)
+            add_profile(content_key, profile)
+            total_alerts.merge(file_alerts)
+            write_files(content_key, code, mode)
+
+    procedure_cache.save()
+    if args.profile:
+        phase_profile.write_profile( { "total" : total_profile.as_dict(), "files" : file_profiles }, args.profile )
+    if args.alert_report:
+        total_alerts.write_report(args.alert_report)
+    if total_alerts.total:
+        stderr.write( total_alerts.summary() )
+
+    # the sources of eo_value_lookup, whose native functions decide how scripts decompile
+    lookup_sources = eo_value_lookup.source_files()
+
+    # returns the modification time and size of every watched file (None for a missing one)
+    def watched_stamps():
+        paths = table_files + lookup_sources
+        for subdir, dirs, files in os.walk('EO3/AI/'):
+            paths += [ os.path.join(subdir, file) for file in files if file.endswith('.bf') ]
+        stamps = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                stamps[path] = (stat.st_mtime, stat.st_size)
+            except OSError:
+                stamps[path] = None
+        return stamps
+
+    # redoes the outputs affected by a change to the given files
+    # the procedure cache keeps every procedure decompiled so far, so only changed procedures are decompiled again
+    def update(changed):
+        global same_content
+        start = time.time()
+        if any(path in changed for path in lookup_sources):
+            # changed native functions change the procedure hashes, so the procedure cache is still good
+            reload(eo_value_lookup)
+            decompiled.clear()
+        if any(path in changed for path in table_files):
+            load_tables()
+            decompiled.clear()
+        init_batch_worker(args, scr_names, scr_skill_names, procedure_index, procedure_cache)
+
+        same_content = find_ai_files()
+        for key in list(decompiled.keys()):
+            if key not in same_content:
+                del decompiled[key]
+
+        # outputs of files that are gone, or were renamed, are removed
+        output_names = set( info.get_full_output_name() for infos in same_content.values() for info in infos )
+        for output_name in list(written.keys()):
+            if output_name not in output_names:
+                del written[output_name]
+                if os.path.exists(output_name):
+                    os.remove(output_name)
+
+        decompiled_count = 0
+        update_alerts = alerts.Alert_Collector()
+        for content_key in same_content:
+            if content_key in decompiled:
+                code, mode = decompiled[content_key]
+            else:
+                content_key, code, mode, new_entries, profile, file_alerts = decompile_batch_work( batch_work(same_content, [content_key])[0] )
+                update_alerts.merge(file_alerts)
+                decompiled_count += 1
+            write_files(content_key, code, mode)
+        procedure_cache.save()
+        eprint("Decompiled " + str(decompiled_count) + " files after changes to " + ", ".join(sorted(changed)) + " in " + "{:.0f}".format( 1000 * (time.time() - start) ) + "ms")
+        if update_alerts.total:
+            stderr.write( update_alerts.summary() )
+
+    # watches for changes until interrupted; a burst of changes is handled once the files settle
+    if args.watch:
+        init_batch_worker(*worker_args)
+        previous = watched_stamps()
+        eprint("Watching for changes...")
+        try:
+            while True:
+                time.sleep(args.watch_interval)
+                current = watched_stamps()
+                if current == previous:
+                    continue
+                while True:
+                    time.sleep(args.debounce)
+                    settled = watched_stamps()
+                    if settled == current:
+                        break
+                    current = settled
+                changed = set( path for path in set(previous) | set(current) if previous.get(path) != current.get(path) )
+                previous = current
+                update(changed)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,173 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Sends requests to a running decompile_server.py
+# if run from the command line, the command's arguments are the same as those of the script it stands in for:
+#     disassemble      unpack_ai.py
+#     decompile        decompile_ai.py
+#     decompile_enemy  decompile_enemy_ai.py
+#     name_table       unpack_EO_name_table.py
+#     msg              unpack_msg.py
+#     skill_table      unpack_EO_skill_table.py
+# so that, for example, "decompile_client.py decompile EO3 in.bf out.txt --fully_optimize" gives the same
+# output file as "decompile_ai.py EO3 in.bf out.txt --fully_optimize", without starting a new interpreter
+#
+# this module imports nothing from the rest of the scripts, so that it starts quickly
+
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+from sys import stderr
+
+def eprint(s):
+    stderr.write(s + "\n")
+
+# where the server listens if no socket is given; each user gets their own
+default_socket_path = os.path.join(tempfile.gettempdir(), "eo_decompile_server_" + str(os.getuid()) + ".sock")
+
+game_codes = ["EO3","EOU"]
+
+# the options that are paths, which are sent to the server as absolute paths
+path_options = ["input_file", "input_name_file", "input_skill_file", "game_dir"]
+
+# the options used by the client itself, which are not sent to the server
+client_options = ["socket", "command", "output_file", "show_output"]
+
+def add_optimization_arguments(parser):
+    parser.add_argument("--fully_optimize", action="store_true", help="all optimization passes will be performed on the code; specific optimization flags will be ignored")
+    parser.add_argument("--flatten_conditionals", action="store_true", help="(if t1 else if t2 else f) will be converted to (if t1 elif t2 else f) when permissable to reduce the nesting depth and resulting indentation of code")
+    parser.add_argument("--flatten_elses", action="store_true", help="(if t return else f ) will be converted to (if t return f) when permissable to reduce the nesting depth and resulting indentation of code")
+    parser.add_argument("--constant_folding", action="store_true", help="any arithmetic containing only constants will be replaced with the value of that expression")
+    parser.add_argument("--simplify_conditions", action="store_true", help="boolean conditions will be simplified when it is permissable; see docs/ai_notes.txt for some warnings about this flag")
+    parser.add_argument("--handwritten", action="store_true", help="use this for handwritten scripts if they don't seem to decompile well without it; see docs/ai_notes.txt for more details")
+    parser.add_argument("--share_expressions", action="store_true", help="identical expressions will be stored once and shared, which saves time and memory on scripts that repeat the same expressions")
+
+def add_output_arguments(parser):
+    parser.add_argument("output_file", help="name of the file in which to place the output")
+    parser.add_argument("--show_output", action="store_true", help="output will be printed to console in addition to being saved to the output_file")
+
+def parseArguments():
+    # Create argument parser
+    parser = argparse.ArgumentParser(description="Sends a disassembly, decompilation, or table conversion request to a running decompile_server.py.")
+    parser.add_argument("--socket", default=default_socket_path, help="path of the server's Unix socket")
+
+    # Print version
+    parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
+
+    subparsers = parser.add_subparsers(dest="command", help="the request to send")
+    subparsers.required = True
+
+    sub = subparsers.add_parser("disassemble", help="disassemble an AI file, as unpack_ai.py does")
+    sub.add_argument("input_file", help="name of the file containing the raw flw0 data")
+    add_output_arguments(sub)
+    sub.add_argument("--hide_alerts", action="store_true", help="the server will not print warnings if unexpected values are encountered while disassembling")
+    sub.add_argument("--no_dce", action="store_true", help="dead code will not be eliminated")
+    sub.add_argument("--detect_cycles", action="store_true", help="the server will print a warning if a procedure's flow blocks contain a cycle")
+    sub.add_argument("--roots", action="append", metavar="NAME", help="only disassemble the procedures with this name (wildcards are allowed) and the procedures they call; may be given more than once, and a name that matches no procedure is an error")
+
+    sub = subparsers.add_parser("decompile", help="decompile an AI file, as decompile_ai.py does")
+    sub.add_argument("game", choices=game_codes, help="which game the data is from")
+    sub.add_argument("input_file", help="name of the file containing the raw flw0 data")
+    add_output_arguments(sub)
+    sub.add_argument("--hide_alerts", action="store_true", help="the server will not print warnings if unexpected values are encountered")
+    sub.add_argument("--proc", action="append", metavar="NAME", help="only decompile the procedures with this name (wildcards are allowed) and the procedures they call; may be given more than once, and a name that matches no procedure is an error")
+    add_optimization_arguments(sub)
+
+    sub = subparsers.add_parser("decompile_enemy", help="decompile an enemy AI file, naming skills and entities, as decompile_enemy_ai.py does")
+    sub.add_argument("game", choices=game_codes, help="which game the data is from")
+    sub.add_argument("input_file", help="name of the file containing the raw flw0 data")
+    add_output_arguments(sub)
+    sub.add_argument("--game_dir", help="directory holding the game's Enemy/, Skill/, and AI/ folders; by default, the directory named after the game")
+    sub.add_argument("--show_users", action="store_true", help="the enemies that use this script (according to the game's procedure list and the file's name) are listed before the decompilation")
+    add_optimization_arguments(sub)
+
+    sub = subparsers.add_parser("name_table", help="convert a name table, as unpack_EO_name_table.py does")
+    sub.add_argument("input_file", help="name of the file containing the raw name table data")
+    add_output_arguments(sub)
+    sub.add_argument("--index_width", type=int, choices=[2,4], default=2, help="width, in bytes, of the indexes at the start of the table")
+    sub.add_argument("--hide_pos", action="store_true", help="positions will not be displayed")
+    sub.add_argument("--hide_raw", action="store_true", help="raw names will not be displayed")
+    sub.add_argument("--hide_alerts", action="store_true", help="the server will not print warnings if unknown characters are encountered")
+
+    sub = subparsers.add_parser("msg", help="convert an .mbm/MSG2 file, as unpack_msg.py does")
+    sub.add_argument("input_file", help="name of the file containing the raw message table data")
+    add_output_arguments(sub)
+    sub.add_argument("--hide_alerts", action="store_true", help="the server will not print warnings if unknown characters are encountered")
+
+    sub = subparsers.add_parser("skill_table", help="convert a skill data table, as unpack_EO_skill_table.py does")
+    sub.add_argument("game", choices=game_codes, help="which game the data is from")
+    sub.add_argument("input_name_file", help="name of the file containing the raw name table")
+    sub.add_argument("input_skill_file", help="name of the file containing the skill data table")
+    add_output_arguments(sub)
+    sub.add_argument("--name_index_width", type=int, choices=[2,4], default=2, help="width, in bytes, of the indexes at the start of the name table")
+    sub.add_argument("--hide_raw_name", action="store_true", help="raw skill names will not be displayed")
+    sub.add_argument("--hide_unknowns", action="store_true", help="the server will not print messages if unknown characters or unkown parts of skill data are encountered")
+    sub.add_argument("--hide_raw_data", action="store_true", help="skill data will not have the raw hex values displayed alongside the readable data")
+
+    subparsers.add_parser("status", help="print what the server has cached")
+    subparsers.add_parser("shutdown", help="stop the server")
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    return args
+
+# sends a request to the server listening on the given socket, and returns its response
+# a request is a dict with the command and its options; see decompile_server.py
+def send_request(socket_path, request):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall( (json.dumps(request) + "\n").encode("utf-8") )
+        chunks = []
+        while True:
+            chunk = client.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        client.close()
+    return json.loads( b"".join(chunks).decode("utf-8") )
+
+# returns the request for the given arguments
+def build_request(args):
+    request = { "command" : args.command }
+    for option, value in vars(args).items():
+        if option in client_options:
+            continue
+        if option in path_options and value is not None:
+            value = os.path.abspath(value)
+        request[option] = value
+    # like decompile_enemy_ai.py, the game's files are looked for in the directory named after it
+    if args.command == "decompile_enemy" and args.game_dir is None:
+        request["game_dir"] = os.path.abspath(args.game)
+    return request
+
+if __name__ == '__main__':
+    # Parse the arguments
+    args = parseArguments()
+
+    try:
+        response = send_request(args.socket, build_request(args))
+    except socket.error as e:
+        eprint("Could not reach the server at " + args.socket + ": " + str(e))
+        sys.exit(1)
+
+    if "error" in response:
+        eprint(response["error"])
+        sys.exit(1)
+
+    if "status" in response:
+        print( json.dumps(response["status"], indent=2, sort_keys=True) )
+    elif "output" in response:
+        output = response["output"]
+
+        if args.show_output:
+            print(output)
+
+        # Write result to a file
+        with open(args.output_file, "w") as f:
+            f.write(output)
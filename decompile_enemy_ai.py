@@ -7,6 +7,7 @@
 #  game_name/Enemy/enemynametable.tbl
 #  game_name/Skill/enemyskillnametable.tbl
 # to fill in these names.
+# With --show_users, also uses game_name/AI/BtlScrFileTable.tbl to find the enemies that use the script.
 #
 # written by TheOnlyOne (@modest_ralts)
 
@@ -18,6 +19,9 @@ import unpack_EO_name_table
 import unpack_ai_proc_list
 import unpack_ai
 import decompile_ai
+import phase_profile
+import alerts
+from game_context import Game_Context
 
 def parseArguments():
     # Create argument parser
@@ -35,6 +39,11 @@ def parseArguments():
     parser.add_argument("--constant_folding", action="store_true", help="any arithmetic containing only constants will be replaced with the value of that expression")
     parser.add_argument("--simplify_conditions", action="store_true", help="boolean conditions will be simplified when it is permissable; see docs/ai_notes.txt for some warnings about this flag")
     parser.add_argument("--handwritten", action="store_true", help="use this for handwritten scripts if they don't seem to decompile well without it; see docs/ai_notes.txt for more details")
+    parser.add_argument("--show_users", action="store_true", help="the enemies that use this script (according to the game's procedure list and the file's name) are listed before the decompilation")
+    parser.add_argument("--share_expressions", action="store_true", help="identical expressions will be stored once and shared, which saves time and memory on scripts that repeat the same expressions")
+    parser.add_argument("--alert_report", metavar="FILE", help="alerts are collected instead of printed as they are raised, and written to this file as JSON, with a summary printed to stderr")
+    parser.add_argument("--profile", metavar="FILE", help="the time spent in each phase of decompilation, and counts of blocks, nodes, and pass iterations, are written to this file as JSON")
+    parser.add_argument("--profile_memory", action="store_true", help="with --profile, the peak memory allocated in each phase is recorded too (this makes decompilation much slower)")
 
     # Print version
     parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
@@ -44,30 +53,58 @@ def parseArguments():
 
     return args
 
+# builds the enemy name table and the enemy skill name table from a game's directory
+def enemy_name_tables(game_dir):
+    scr_names = unpack_EO_name_table.EO_name_table()
+    scr_names.build_from_file(os.path.join(game_dir, "Enemy", "enemynametable.tbl"), 2, False)
+    scr_skill_names = unpack_EO_name_table.EO_name_table()
+    scr_skill_names.build_from_file(os.path.join(game_dir, "Skill", "enemyskillnametable.tbl"), 2, False)
+    return scr_names, scr_skill_names
+
+# returns the line listing the enemies that use an AI file, found from the procedure the file is named after
+def users_header(procedure_index, input_file):
+    kind, listed_proc_name = unpack_ai_proc_list.listed_procedure_name( os.path.basename(input_file) )
+    users = []
+    for kind, idx in procedure_index.entities_of(listed_proc_name):
+        name = procedure_index.entity_name(kind, idx)
+        users.append( (name if name is not None else "unknown") + " (" + unpack_ai_proc_list.entity_kind_names[kind] + " " + str(idx) + ")" )
+    if not users:
+        users = ["unknown"]
+    return "Used by: " + ", ".join(users) + "\n\n"
+
 if __name__ == '__main__':
     # Parse the arguments
     args = parseArguments()
 
-    # Build the enemy name table
-    scr_names = unpack_EO_name_table.EO_name_table()
-    scr_names.build_from_file(args.game + "/Enemy/enemynametable.tbl", 2, False)
-    # Build the enemy skill name table
-    scr_skill_names = unpack_EO_name_table.EO_name_table()
-    scr_skill_names.build_from_file(args.game + "/Skill/enemyskillnametable.tbl", 2, False)
+    # Build the enemy name table and enemy skill name table
+    scr_names, scr_skill_names = enemy_name_tables(args.game)
+    if args.alert_report:
+        alerts.start_collecting(args.input_file)
+    if args.profile:
+        phase_profile.start_profile(args.profile_memory)
+
     # Build the decompilation
-    decompile_ai.set_game_specific_values(args.game)
-    flow = unpack_ai.Flow_File(args.input_file)
+    game_context = Game_Context(args.game)
+    flow = unpack_ai.Flow_File(args.input_file, game_context)
     basic_blocks, proc_info, special_labels = decompile_ai.abstract_flow(flow)
-    abst = decompile_ai.ABST(basic_blocks, proc_info, special_labels, args.handwritten)
+    abst = decompile_ai.ABST(game_context, basic_blocks, proc_info, special_labels, args.handwritten, args.share_expressions)
     if args.fully_optimize:
         abst.optimize_abst()
     else:
         abst.optimize_abst(args.flatten_conditionals, args.flatten_elses, args.constant_folding, args.simplify_conditions)
     func_display = decompile_ai.get_enemy_function_formater(abst, scr_names.names, scr_skill_names.names)
     output = abst.display_decompilation(func_display)
+
+    if args.show_users:
+        output = users_header( unpack_ai_proc_list.build_procedure_index(args.game), args.input_file ) + output
+
+    if args.profile:
+        phase_profile.write_profile(phase_profile.stop_profile(), args.profile)
+    if args.alert_report:
+        alerts.report(alerts.stop_collecting(), args.alert_report)
     
     if args.show_output:
-        print output
+        print(output)
 
     # Write decompilation to a file
     with open(args.output_file, "w") as f:
@@ -0,0 +1,303 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Serves disassembly, decompilation, and table conversion requests over a Unix socket
+# if run from the command line, will listen on the socket until a client asks it to shut down
+# (see decompile_client.py, whose commands take the same arguments as the scripts they stand in for)
+#
+# a request is a line of JSON holding the command and its options, named as in the command line scripts,
+# and the answer is a line of JSON holding the output (or status), or an error
+#
+# parsed scripts and tables, abstracted scripts, and decompiled procedures are kept between requests,
+# and are reused until the files they came from change
+# each request is handled in its own Game_Context, but one at a time, since the caches and the parsed scripts
+# in them (which are pruned in place) are shared
+# alerts are printed to the server's stderr
+
+import argparse
+import json
+import os
+import socket
+from collections import OrderedDict
+from sys import stderr
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+import unpack_EO_name_table
+import unpack_EO_skill_table
+import unpack_msg
+import unpack_ai_proc_list
+import unpack_ai
+import decompile_ai
+import decompile_enemy_ai
+from game_context import Game_Context
+from decompile_client import default_socket_path
+
+def eprint(s):
+    stderr.write(s + "\n")
+
+def parseArguments():
+    # Create argument parser
+    parser = argparse.ArgumentParser(description="Serves Etrian Odyssey disassembly, decompilation, and table conversion requests over a Unix socket, keeping parsed files warm between requests.")
+
+    # Optional arguments
+    parser.add_argument("--socket", default=default_socket_path, help="path of the Unix socket to listen on")
+    parser.add_argument("--max_files", type=int, default=256, help="number of parsed scripts, abstracted scripts, and tables each kept in memory; the least recently used are dropped first")
+
+    # Print version
+    parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    return args
+
+optimization_options = {
+    "fully_optimize" : False,
+    "flatten_conditionals" : False,
+    "flatten_elses" : False,
+    "constant_folding" : False,
+    "simplify_conditions" : False,
+    "handwritten" : False,
+    "share_expressions" : False,
+}
+
+# the options of each command, with their defaults; options without a default (None) must be given
+command_options = {
+    "disassemble" : dict( input_file=None, hide_alerts=False, no_dce=False, detect_cycles=False, roots=[] ),
+    "decompile" : dict( game=None, input_file=None, hide_alerts=False, proc=[], **optimization_options ),
+    "decompile_enemy" : dict( game=None, input_file=None, game_dir=None, show_users=False, **optimization_options ),
+    "name_table" : dict( input_file=None, index_width=2, hide_pos=False, hide_raw=False, hide_alerts=False ),
+    "msg" : dict( input_file=None, hide_alerts=False ),
+    "skill_table" : dict( game=None, input_name_file=None, input_skill_file=None, name_index_width=2, hide_raw_name=False, hide_unknowns=False, hide_raw_data=False ),
+    "status" : {},
+    "shutdown" : {},
+}
+
+# returns the options of a request, with defaults filled in
+def request_options(request):
+    command = request.get("command")
+    if command not in command_options:
+        raise ValueError("Unknown command: " + str(command))
+    options = dict(command_options[command])
+    for option, value in request.items():
+        if option == "command":
+            continue
+        if option not in options:
+            raise ValueError("Unknown option for " + command + ": " + option)
+        if value is not None:
+            options[option] = value
+    for option, value in options.items():
+        if value is None:
+            raise ValueError(command + " needs the option " + option)
+    return options
+
+# returns what changes when a file changes
+def file_stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime, stat.st_size)
+
+# returns the optimize_abst arguments asked for by the options
+def optimize_flags(options):
+    if options["fully_optimize"]:
+        return (True, True, True, True)
+    return (options["flatten_conditionals"], options["flatten_elses"], options["constant_folding"], options["simplify_conditions"])
+
+# everything the server keeps between requests
+class Server_State():
+
+    # returns build(), reusing its result from an earlier call with the same key while none of the given files have changed
+    def cached(self, cache, key, paths, build):
+        stamp = tuple( file_stamp(path) for path in paths )
+        entry = cache.pop(key, None)
+        if entry is not None and entry[0] == stamp:
+            self.hits += 1
+            value = entry[1]
+        else:
+            self.misses += 1
+            value = build()
+        cache[key] = (stamp, value)
+        while len(cache) > self.max_files:
+            cache.popitem(last=False)
+        return value
+
+    # returns the parsed script at path, with every procedure live
+    # parsing does not depend on the game, so the script is shared by every game_context with the same parsing options
+    def flow_file(self, path, game_context):
+        key = (path, game_context.dead_code_elimination, game_context.detect_cycles)
+        flow = self.cached( self.flows, key, [path], lambda : unpack_ai.Flow_File(path, game_context) )
+        flow.restore_procedures()
+        # later alerts about the script follow this request's options
+        flow.game_context = game_context
+        return flow
+
+    # returns the abstracted script at path (as abstract_flow does), keeping only the given procedures and the ones they call
+    def abstracted(self, path, game_context, proc):
+        def build():
+            flow = self.flow_file(path, game_context)
+            if proc:
+                flow.prune_procedures( flow.find_procedures(proc) )
+            return decompile_ai.abstract_flow(flow, game_context=game_context)
+        return self.cached( self.abstracts, (path, game_context.game, tuple(proc)), [path], build )
+
+    def name_table(self, path, width, show_alerts):
+        def build():
+            tbl = unpack_EO_name_table.EO_name_table()
+            tbl.build_from_file(path, width, show_alerts)
+            return tbl
+        return self.cached( self.tables, ("names", path, width), [path], build )
+
+    # decompiles the script at path, as decompile_ai does; enemy_names are the enemy and enemy skill name tables,
+    # if functions should be displayed as decompile_enemy_ai does
+    # returns the code of each procedure
+    def decompile(self, options, game_context, proc, enemy_names=None, names_context=None):
+        basic_blocks, proc_info, special_labels = self.abstracted(options["input_file"], game_context, proc)
+        flags = optimize_flags(options)
+
+        # decompiles the procedures at the given proc_info indices, returning their code
+        def decompile_procedures(procedures):
+            tree = decompile_ai.ABST(game_context, basic_blocks, proc_info, special_labels, options["handwritten"], options["share_expressions"], procedures)
+            tree.optimize_abst(*flags)
+            if enemy_names is not None:
+                return tree.display_procedures( decompile_ai.get_enemy_function_formater(tree, enemy_names[0].names, enemy_names[1].names) )
+            return tree.display_procedures()
+
+        # enemy functions are displayed with the names from the tables, so their code is kept apart from the rest
+        context = repr( (options["handwritten"], flags, names_context) )
+        return decompile_ai.decompile_with_cache(self.procedure_cache, context, game_context, basic_blocks, proc_info, special_labels, decompile_procedures)
+
+    def handle_disassemble(self, options):
+        game_context = Game_Context(show_alerts=not options["hide_alerts"], dead_code_elimination=not options["no_dce"], detect_cycles=options["detect_cycles"])
+        flow = self.flow_file(options["input_file"], game_context)
+        if options["roots"]:
+            pruned = flow.prune_procedures( flow.find_procedures(options["roots"]) )
+            if pruned and game_context.show_alerts:
+                eprint("Dropped " + str(len(pruned)) + " unreachable procedures: " + ", ".join(pruned))
+        return flow.display_disassembly()
+
+    def handle_decompile(self, options):
+        game_context = Game_Context(options["game"], show_alerts=not options["hide_alerts"])
+        return self.decompile(options, game_context, options["proc"]) + "\n\n"
+
+    def handle_decompile_enemy(self, options):
+        # like decompile_enemy_ai, alerts are shown
+        game_context = Game_Context(options["game"])
+        game_dir = options["game_dir"]
+        table_paths = [ os.path.join(game_dir, "Enemy", "enemynametable.tbl"), os.path.join(game_dir, "Skill", "enemyskillnametable.tbl") ]
+        enemy_names = self.cached( self.tables, ("enemy", game_dir), table_paths, lambda : decompile_enemy_ai.enemy_name_tables(game_dir) )
+        names_context = (game_dir,) + tuple( file_stamp(path) for path in table_paths )
+        output = self.decompile(options, game_context, [], enemy_names, names_context)
+
+        if options["show_users"]:
+            index_paths = []
+            for list_file, name_file in unpack_ai_proc_list.procedure_list_files.values():
+                index_paths += [ os.path.join(game_dir, f) for f in [list_file, name_file] if f is not None and os.path.exists(os.path.join(game_dir, f)) ]
+            procedure_index = self.cached( self.tables, ("index", game_dir, tuple(sorted(index_paths))), sorted(index_paths), lambda : unpack_ai_proc_list.build_procedure_index(game_dir) )
+            output = decompile_enemy_ai.users_header(procedure_index, options["input_file"]) + output
+        return output
+
+    def handle_name_table(self, options):
+        tbl = self.name_table(options["input_file"], options["index_width"], not options["hide_alerts"])
+        return unpack_EO_name_table.display_name_table(tbl, options["hide_pos"], options["hide_raw"])
+
+    def handle_msg(self, options):
+        path = options["input_file"]
+        def build():
+            tbl = unpack_msg.EO_MSG_table()
+            tbl.build_from_file(path, not options["hide_alerts"])
+            return tbl
+        return unpack_msg.display_msg_table( self.cached(self.tables, ("msg", path), [path], build) )
+
+    def handle_skill_table(self, options):
+        game_context = Game_Context(options["game"], show_alerts=not options["hide_unknowns"])
+        names = self.name_table(options["input_name_file"], options["name_index_width"], game_context.show_alerts)
+        skill_path = options["input_skill_file"]
+        key = ("skills", skill_path, options["game"], options["input_name_file"], options["name_index_width"])
+        skills = self.cached( self.tables, key, [skill_path, options["input_name_file"]],
+                              lambda : unpack_EO_skill_table.unpack_skills_from_file(names, skill_path, game_context, options["hide_unknowns"]) )
+        return unpack_EO_skill_table.display_skills( skills, names, argparse.Namespace(**options) )
+
+    def handle_status(self, options):
+        return {
+            "requests" : self.requests,
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "flow_files" : len(self.flows),
+            "abstracted_files" : len(self.abstracts),
+            "tables" : len(self.tables),
+            "cached_procedures" : len(self.procedure_cache.code),
+            "procedure_cache_hits" : self.procedure_cache.hits,
+            "procedure_cache_misses" : self.procedure_cache.misses,
+        }
+
+    # handles a request, returning the response
+    def handle_request(self, request):
+        self.requests += 1
+        options = request_options(request)
+        command = request["command"]
+        if command == "shutdown":
+            self.done = True
+            return {}
+        if command == "status":
+            return { "status" : self.handle_status(options) }
+        return { "output" : getattr(self, "handle_" + command)(options) }
+
+    def __init__(self, max_files=256):
+        self.max_files = max_files
+        # each cache maps a key to the stamps of the files it was built from, and what was built
+        self.flows = OrderedDict()
+        self.abstracts = OrderedDict()
+        self.tables = OrderedDict()
+        self.procedure_cache = decompile_ai.Procedure_Cache()
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.done = False
+
+# answers one request per connection
+class Request_Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads( self.rfile.readline().decode("utf-8") )
+            response = self.server.state.handle_request(request)
+        except Exception as e:
+            # a bad request or file should not bring down the server
+            response = { "error" : type(e).__name__ + ": " + str(e) }
+        self.wfile.write( (json.dumps(response) + "\n").encode("utf-8") )
+
+# listens on the socket until a shutdown request is handled
+def serve(socket_path, max_files):
+    # a socket file left behind by a server that is no longer running is removed
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            probe.close()
+            eprint("A server is already listening on " + socket_path)
+            return
+        except socket.error:
+            os.remove(socket_path)
+
+    # only this user can connect
+    old_umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, Request_Handler)
+    finally:
+        os.umask(old_umask)
+    server.state = Server_State(max_files)
+    eprint("Listening on " + socket_path)
+    try:
+        while not server.state.done:
+            server.handle_request()
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+if __name__ == '__main__':
+    # Parse the arguments
+    args = parseArguments()
+
+    serve(args.socket, args.max_files)
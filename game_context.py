@@ -0,0 +1,31 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Contains the context files are converted in: the game they are from, its lookup tables,
+# and the options that change how they are read
+# the conversions take a context instead of reading module globals, so that files from
+# different games (or with different options) can be converted at the same time, in one process
+
+import eo_value_lookup
+
+# the game specific tables of eo_value_lookup that a context holds
+game_tables = ["native_functions", "skill_types", "requirements_flags", "target_types", "target_teams",
+               "stat_modifier_stacks", "stat_modifier_types", "damage_type_flags", "ailment_kinds",
+               "ailment_flags", "level_data_types"]
+
+class Game_Context():
+
+    def __init__(self, game=None, show_alerts=True, dead_code_elimination=True, detect_cycles=False):
+        # game is one of eo_value_lookup.game_codes, or None when nothing game specific is needed (as in disassembly)
+        self.game = game
+        # warnings are printed to stderr if unexpected values are encountered
+        self.show_alerts = show_alerts
+        # instructions after an END or unconditional jump, and blocks that are never reached, are dropped
+        self.dead_code_elimination = dead_code_elimination
+        # an alert is printed for each procedure whose jumps form a loop
+        self.detect_cycles = detect_cycles
+
+        # the game's tables, which are empty if there is no game
+        for name in game_tables:
+            setattr( self, name, getattr(eo_value_lookup, name).get(game, {}) )
+        self.num_level_tables, self.level_table_size = eo_value_lookup.level_table_shapes.get(game, (0, 0))
@@ -0,0 +1,293 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Contains functionality for generating synthetic EO ai scripts
+# if run from the command line, will write a random, but valid, FLW0 file
+# whose shape is controlled by the given parameters
+#
+# the generated code mimics the output of a non-optimizing compiler, so that
+# it exercises the same paths in the disassembler and decompiler as real scripts
+
+import argparse
+import random
+from struct import pack
+
+import eo_value_lookup
+from eo_value_lookup import game_codes
+
+def parseArguments():
+    # Create argument parser
+    parser = argparse.ArgumentParser(description="Generates a synthetic Etrian Odyssey AI file (.bf, with the FLW0 tag.)")
+
+    # Positional mandatory arguments
+    parser.add_argument("output_file", help="name of the file in which to place the generated flw0 data")
+
+    # Optional arguments
+    parser.add_argument("--game", choices=game_codes, default="EO3", help="which game's native functions to use")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random generator; the same seed and shape always give the same file")
+    parser.add_argument("--procedures", type=int, default=4, help="number of procedures in the script")
+    parser.add_argument("--statements", type=int, default=8, help="number of statements in each procedure body")
+    parser.add_argument("--depth", type=int, default=3, help="maximum nesting depth of conditionals and loops")
+    parser.add_argument("--if_chain", type=int, default=0, help="length of an extra if/else if chain added to each procedure")
+    parser.add_argument("--loops", type=float, default=0.15, help="chance that a nested statement is a loop")
+    parser.add_argument("--conditionals", type=float, default=0.3, help="chance that a nested statement is a conditional")
+    parser.add_argument("--special_labels", type=int, default=0, help="number of goto labels (labels not starting with an underscore) per procedure")
+    parser.add_argument("--exp_depth", type=int, default=2, help="maximum depth of generated expressions")
+    parser.add_argument("--variables", type=int, default=4, help="number of storage spaces used by the script")
+    parser.add_argument("--wide_literals", type=float, default=0.1, help="chance that a literal is too large for a narrow instruction")
+
+    # Print version
+    parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    return args
+
+# the knobs that control the shape of a generated script
+class Flow_Shape():
+
+    def __init__(self, procedures=4, statements=8, depth=3, if_chain=0, loops=0.15, conditionals=0.3,
+                 special_labels=0, exp_depth=2, variables=4, wide_literals=0.1):
+        self.procedures = procedures
+        self.statements = statements
+        self.depth = depth
+        self.if_chain = if_chain
+        self.loops = loops
+        self.conditionals = conditionals
+        self.special_labels = special_labels
+        self.exp_depth = exp_depth
+        self.variables = variables
+        self.wide_literals = wide_literals
+
+# builds the instruction and label lists for a script, one procedure at a time
+class Flow_Generator():
+
+    # create a fresh jump label, returning its index
+    # the label is not placed until place_label is called
+    def new_label(self, special=False):
+        idx = len(self.jump_labels)
+        name = ("goto_" if special else "_") + str(idx)
+        self.jump_labels.append( [name, None] )
+        return idx
+
+    # place a jump label at the current instruction location
+    def place_label(self, idx):
+        self.jump_labels[idx][1] = len(self.instructions)
+
+    # add a narrow instruction
+    def emit(self, opcode, operand=0):
+        self.instructions.append( pack("<hh", opcode, operand) )
+
+    # add a wide instruction, which takes up two instruction slots
+    def emit_wide(self, opcode, operand):
+        self.instructions.append( pack("<I", opcode) )
+        self.instructions.append( pack("<I", operand & 0xFFFFFFFF) )
+
+    # emit code that leaves a single value on the stack
+    def emit_exp(self, depth):
+        roll = self.rng.random()
+        if depth <= 0 or roll < 0.3:
+            kind = self.rng.randrange(3)
+            if kind == 0:
+                # literals are usually small, but occasionally need a wide instruction
+                if self.rng.random() < self.shape.wide_literals:
+                    self.emit_wide(0x00, self.rng.randrange(0x8000, 0x100000))   # PUSHI
+                else:
+                    self.emit(0x1D, self.rng.randrange(0, 100))   # PUSHIS
+            elif kind == 1:
+                self.emit(0x1E, self.rng.randrange(self.shape.variables))   # PUSHLIX
+            else:
+                self.emit_func(0)
+        elif roll < 0.75:
+            self.emit_exp(depth - 1)
+            self.emit_exp(depth - 1)
+            self.emit(self.rng.choice([0x0E, 0x0F, 0x10, 0x11, 0x14, 0x15, 0x16, 0x17, 0x18, 0x19, 0x1A, 0x1B]))
+        elif roll < 0.85:
+            self.emit_exp(depth - 1)
+            self.emit(self.rng.choice([0x12, 0x13]))   # MINUS or NOT
+        else:
+            self.emit_func(depth - 1)
+
+    # emit a native function call that returns a value
+    def emit_func(self, depth):
+        func = self.rng.choice(self.funcs)
+        # the first argument is the top of the stack, so push them in reverse
+        for _ in range(func.num_params):
+            self.emit_exp(depth)
+        self.emit(0x08, func.func_index)   # COMM
+        self.emit(0x04)   # PUSHREG
+
+    # emit a condition for a conditional or loop
+    def emit_cond(self):
+        self.emit_exp(self.shape.exp_depth)
+
+    # emit a simple statement (one that does not change control flow)
+    def emit_simple_stmt(self, proc_idx):
+        roll = self.rng.random()
+        if roll < 0.5:
+            func = self.rng.choice(self.sends)
+            for _ in range(func.num_params):
+                self.emit_exp(self.shape.exp_depth)
+            self.emit(0x08, func.func_index)   # COMM
+        elif roll < 0.9 or proc_idx + 1 >= self.shape.procedures:
+            self.emit_exp(self.shape.exp_depth)
+            self.emit(0x20, self.rng.randrange(self.shape.variables))   # POPLIX
+        else:
+            # only call later procedures so there is no recursion
+            self.emit(0x0B, self.rng.randrange(proc_idx + 1, self.shape.procedures))   # CALL
+
+    # emit a statement, nesting control structures until depth runs out
+    # loop is a (continue label, break label) pair if inside a loop
+    def emit_stmt(self, proc_idx, depth, loop):
+        roll = self.rng.random()
+        if depth > 0 and roll < self.shape.conditionals:
+            self.emit_if(proc_idx, depth, loop, self.rng.random() < 0.6)
+        elif depth > 0 and roll < self.shape.conditionals + self.shape.loops:
+            self.emit_loop(proc_idx, depth)
+        else:
+            self.emit_simple_stmt(proc_idx)
+
+    # emit a sequence of statements
+    # the sequence may end in a return, break, or continue
+    # it always starts with a simple statement, since the compiler never places a label directly after an IF
+    def emit_seq(self, proc_idx, depth, loop, length):
+        self.emit_simple_stmt(proc_idx)
+        for _ in range(length):
+            self.emit_stmt(proc_idx, depth, loop)
+        roll = self.rng.random()
+        if roll < 0.1:
+            self.emit(0x09)   # END
+        elif loop is not None and roll < 0.2:
+            self.emit(0x0D, self.rng.choice(loop))   # GOTO
+
+    # emit an if, with or without an else
+    def emit_if(self, proc_idx, depth, loop, has_else):
+        self.emit_cond()
+        else_label = self.new_label()
+        self.emit(0x1C, else_label)   # IF
+        self.emit_seq(proc_idx, depth - 1, loop, self.rng.randrange(0, 3))
+        if has_else:
+            end_label = self.new_label()
+            self.emit(0x0D, end_label)   # GOTO
+            self.place_label(else_label)
+            self.emit_seq(proc_idx, depth - 1, loop, self.rng.randrange(0, 3))
+            self.place_label(end_label)
+        else:
+            self.place_label(else_label)
+
+    # emit an if / else if / ... / else chain of the given length
+    def emit_if_chain(self, proc_idx, length):
+        end_label = self.new_label()
+        for _ in range(length):
+            self.emit_cond()
+            next_label = self.new_label()
+            self.emit(0x1C, next_label)   # IF
+            self.emit_simple_stmt(proc_idx)
+            self.emit(0x0D, end_label)   # GOTO
+            self.place_label(next_label)
+        self.emit_simple_stmt(proc_idx)
+        self.place_label(end_label)
+
+    # emit a for loop; the update block is where continues go
+    def emit_loop(self, proc_idx, depth):
+        cond_label = self.new_label()
+        update_label = self.new_label()
+        break_label = self.new_label()
+        self.place_label(cond_label)
+        self.emit_cond()
+        self.emit(0x1C, break_label)   # IF
+        self.emit_seq(proc_idx, depth - 1, (update_label, break_label), self.rng.randrange(0, 3))
+        self.place_label(update_label)
+        self.emit_simple_stmt(proc_idx)
+        self.emit(0x0D, cond_label)   # GOTO
+        self.place_label(break_label)
+
+    # emit a full procedure
+    def emit_procedure(self, proc_idx):
+        self.proc_labels.append( ["proc_" + str(proc_idx), len(self.instructions)] )
+        self.emit(0x07, proc_idx)   # PROC
+        # the decompiler reads pops directly after a PROC as parameters, so initialize a variable first
+        self.emit(0x1D, 0)   # PUSHIS
+        self.emit(0x20, self.rng.randrange(self.shape.variables))   # POPLIX
+        # goto labels are placed between top level statements, and jumped to from earlier ones
+        special_points = sorted( self.rng.sample(range(1, self.shape.statements), min(self.shape.special_labels, self.shape.statements - 1)) )
+        specials = dict( (point, self.new_label(True)) for point in special_points )
+        for stmt_idx in range(self.shape.statements):
+            if stmt_idx in specials:
+                # keep the goto label from sharing a location with the end of the previous statement
+                self.emit_simple_stmt(proc_idx)
+                self.place_label(specials[stmt_idx])
+                self.emit_simple_stmt(proc_idx)
+            later = [label for point, label in specials.items() if point > stmt_idx]
+            if later and self.rng.random() < 0.5:
+                # conditionally jump forward to a label that will be placed later
+                self.emit_cond()
+                skip_label = self.new_label()
+                self.emit(0x1C, skip_label)   # IF
+                self.emit(0x0D, self.rng.choice(later))   # GOTO
+                self.place_label(skip_label)
+            self.emit_stmt(proc_idx, self.shape.depth, None)
+        if self.shape.if_chain > 0:
+            self.emit_if_chain(proc_idx, self.shape.if_chain)
+        self.emit(0x09)   # END
+
+    # serialize the script into FLW0 data
+    def build(self):
+        # returns the data for a section of labels
+        def label_data(labels):
+            data = b""
+            for name, loc in labels:
+                data += pack("<24s2I", name.encode("ascii"), loc, 0)
+            return data
+
+        sections = [
+            (0x20, len(self.proc_labels), label_data(self.proc_labels)),
+            (0x20, len(self.jump_labels), label_data(self.jump_labels)),
+            (0x04, len(self.instructions), b"".join(self.instructions)),
+            (0x01, 0, b""),
+            (0x01, 0x10, b"\x00" * 0x10),
+        ]
+        offset = 0x20 + 0x10 * len(sections)
+        section_headers = b""
+        section_data = b""
+        for idx, (entry_size, num_entries, data) in enumerate(sections):
+            section_headers += pack("<4I", idx, entry_size, num_entries, offset)
+            section_data += data
+            offset += len(data)
+        has_wide = 0
+        header = pack("<BBH4IH10B", 0, 0, 0, offset, 0x30574C46, 0, len(sections), self.shape.variables, has_wide, *([0] * 9))
+        return header + section_headers + section_data
+
+    def __init__(self, game, seed, shape):
+        self.rng = random.Random(seed)
+        self.shape = shape
+        natives = sorted(eo_value_lookup.native_functions[game].values(), key=lambda f : f.func_index)
+        self.funcs = [f for f in natives if f.has_retval]
+        self.sends = [f for f in natives if not f.has_retval]
+        self.proc_labels = []
+        self.jump_labels = []
+        self.instructions = []
+        for proc_idx in range(shape.procedures):
+            self.emit_procedure(proc_idx)
+
+# generate a script and return the raw FLW0 data
+def generate_flow_data(game="EO3", seed=0, shape=None):
+    if shape is None:
+        shape = Flow_Shape()
+    return Flow_Generator(game, seed, shape).build()
+
+def generate_flow_main():
+    # Parse the arguments
+    args = parseArguments()
+
+    shape = Flow_Shape(args.procedures, args.statements, args.depth, args.if_chain, args.loops, args.conditionals,
+                       args.special_labels, args.exp_depth, args.variables, args.wide_literals)
+    data = generate_flow_data(args.game, args.seed, shape)
+
+    # Write result to a file
+    with open(args.output_file, "wb") as f:
+        f.write(data)
+
+if __name__ == '__main__':
+    generate_flow_main()
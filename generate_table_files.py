@@ -0,0 +1,188 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Contains functionality for generating synthetic EO table files
+# if run from the command line, will write a random, but valid, name table,
+# MSG2 file, or skill data table (along with its name table)
+#
+# the text is made only of characters convert_EOstring can encode, so every
+# generated file parses without alerts
+
+import argparse
+import random
+from struct import pack
+
+import convert_EOstring
+import unpack_EO_skill_table
+from game_context import Game_Context
+from eo_value_lookup import game_codes
+from shared_helpers import b
+
+table_kinds = ["name_table", "msg", "skill_table"]
+
+def parseArguments():
+    # Create argument parser
+    parser = argparse.ArgumentParser(description="Generates a synthetic Etrian Odyssey name table, .mbm/MSG2 file, or skill data table.")
+
+    # Positional mandatory arguments
+    parser.add_argument("kind", choices=table_kinds, help="which kind of file to generate")
+    parser.add_argument("output_file", help="name of the file in which to place the generated data")
+
+    # Optional arguments
+    parser.add_argument("--entries", type=int, default=256, help="number of names, messages, or skills in the file")
+    parser.add_argument("--index_width", type=int, choices=[2,4], default=2, help="width, in bytes, of the indexes at the start of a name table")
+    parser.add_argument("--game", choices=game_codes, default="EO3", help="which game's skill data layout to use")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random generator; the same seed and arguments always give the same file")
+    parser.add_argument("--name_file", help="for skill_table, name of the file in which to place the matching skill name table")
+
+    # Print version
+    parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    return args
+
+# the characters words are made of, and the punctuation that can follow a word
+word_chars = "abcdefghijklmnopqrstuvwxyz"
+punctuation = [",", ".", "!", "?", "...", ":", "'s", "-"]
+
+# returns a random word, capitalized if asked
+def random_word(rng, capitalize=False):
+    word = "".join( rng.choice(word_chars) for _ in range(rng.randint(2, 9)) )
+    if capitalize:
+        word = word.capitalize()
+    if rng.random() < 0.05:
+        word += str(rng.randint(1, 99))
+    return word
+
+# returns a random name, like those of skills, items, or enemies
+def random_name(rng):
+    return " ".join( random_word(rng, True) for _ in range(rng.randint(1, 3)) )
+
+# returns a random message: a few lines of sentences
+def random_message(rng):
+    lines = []
+    for _ in range(rng.randint(1, 4)):
+        words = [ random_word(rng, True) ]
+        for _ in range(rng.randint(2, 10)):
+            word = random_word(rng)
+            if rng.random() < 0.15:
+                word += rng.choice(punctuation)
+            words.append(word)
+        lines.append( " ".join(words) + rng.choice([".", "!", "?"]) )
+    return "\n".join(lines)
+
+# returns the raw data of a name table holding the given names
+# each name is null terminated, and the positions give the end of each name
+def build_name_table_data(names, width):
+    fmat = "<H" if width == 2 else "<I"
+    raw_names = []
+    positions = []
+    end = 0
+    for name in names:
+        raw_name = b(convert_EOstring.string_to_eostring(name)) + b"\x00\x00"
+        end += len(raw_name)
+        raw_names.append(raw_name)
+        positions.append(end)
+    return pack(fmat, len(names)) + b"".join( pack(fmat, pos) for pos in positions ) + b"".join(raw_names)
+
+# returns the raw data of a name table with the given number of random names
+def generate_name_table_data(seed=0, entries=256, width=2):
+    rng = random.Random(seed)
+    return build_name_table_data( [ random_name(rng) for _ in range(entries) ], width )
+
+# returns the raw data of an MSG2 file with the given number of random messages
+# like real files, some message slots are left empty
+def generate_msg_data(seed=0, entries=256):
+    rng = random.Random(seed)
+    subheaders = []
+    messages = []
+    index = 0
+    slots = []
+    while len(messages) < entries:
+        if rng.random() < 0.05:
+            slots.append( (index, None) )
+        else:
+            raw_message = b(convert_EOstring.string_to_eostring(random_message(rng))) + b"\xff\xff"
+            messages.append(raw_message)
+            slots.append( (index, raw_message) )
+        index += 1
+
+    # the messages come after the header and all of the subheaders
+    pos = 0x20 + 0x10 * len(slots)
+    for index, raw_message in slots:
+        if raw_message is None:
+            subheaders.append( pack("<4I", index, 0, 0, 0) )
+        else:
+            subheaders.append( pack("<4I", index, len(raw_message), pos, 0) )
+            pos += len(raw_message)
+
+    # the file size field is only 2 bytes wide
+    header = pack("<2I4H4I", 0, 0x3247534D, 0, 1, pos & 0xFFFF, 0, len(messages), 0x20, 0, 0)
+    return header + b"".join(subheaders) + b"".join(messages)
+
+# returns a value with a random subset of the given flag indexes set
+def random_flags(rng, flag_table):
+    value = 0
+    for idx in flag_table:
+        if rng.random() < 0.3:
+            value |= 1 << idx
+    return value
+
+# returns the raw data of a single skill entry for the game of the given Game_Context
+def random_skill_entry(rng, game_context, unpacker):
+    values = [
+        0x0A,
+        rng.choice( sorted(game_context.skill_types) ),
+        random_flags( rng, game_context.requirements_flags ),
+        rng.randint(0, 0xFFFF),
+        rng.choice( sorted(game_context.target_types) ),
+        rng.choice( sorted(game_context.target_teams) ),
+        0x04,
+        rng.choice( sorted(game_context.stat_modifier_stacks) ),
+        rng.choice( sorted(game_context.stat_modifier_types) ),
+        random_flags( rng, game_context.damage_type_flags ),
+        random_flags( rng, game_context.damage_type_flags ),
+        rng.choice( sorted(game_context.ailment_kinds) ),
+        random_flags( rng, game_context.ailment_flags ),
+        0x00,
+    ]
+    level_data_types = sorted(game_context.level_data_types)
+    for _ in range(game_context.num_level_tables):
+        values.append( rng.choice(level_data_types) )
+        base = rng.randint(0, 200)
+        values += [ base + level * rng.randint(0, 10) for level in range(game_context.level_table_size) ]
+    return unpacker.pack(*values)
+
+# returns the raw data of a skill table with the given number of random skills,
+# and the raw data of its name table
+def generate_skill_data(game="EO3", seed=0, entries=256, width=2):
+    unpacker = unpack_EO_skill_table.get_game_unpacker(game)
+    game_context = Game_Context(game)
+
+    rng = random.Random(seed)
+    names = [ random_name(rng) for _ in range(entries) ]
+    skill_data = b"".join( random_skill_entry(rng, game_context, unpacker) for _ in range(entries) )
+    return skill_data, build_name_table_data(names, width)
+
+def generate_table_main():
+    # Parse the arguments
+    args = parseArguments()
+
+    if args.kind == "name_table":
+        data = generate_name_table_data(args.seed, args.entries, args.index_width)
+    elif args.kind == "msg":
+        data = generate_msg_data(args.seed, args.entries)
+    else:
+        data, name_data = generate_skill_data(args.game, args.seed, args.entries, args.index_width)
+        if args.name_file:
+            with open(args.name_file, "wb") as f:
+                f.write(name_data)
+
+    # Write result to a file
+    with open(args.output_file, "wb") as f:
+        f.write(data)
+
+if __name__ == '__main__':
+    generate_table_main()
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Contains functionality for measuring the phases of disassembling and decompiling
+# the library code marks its phases (with the profiled decorator or the phase context manager)
+# and counts things (with count); none of this is recorded unless a profile has been started
+#
+# for each phase a profile records how many times it ran, its wall and cpu time, and
+# optionally (with tracemalloc) the peak memory allocated while it ran
+# phases that run inside other phases are recorded under the path of phase names leading to them
+#
+# hooks let other code see each phase as it ends, for example to aggregate the numbers of a batch
+
+import json
+import time
+from functools import wraps
+
+# the profile being recorded, or None
+current = None
+
+# imported by start_profile when memory is traced, since it is slow to import and rarely needed
+tracemalloc = None
+
+# functions called as hook(path, wall, cpu, peak_bytes) whenever a phase ends while profiling
+# peak_bytes is None if memory is not being traced
+hooks = []
+
+def add_hook(hook):
+    hooks.append(hook)
+
+def remove_hook(hook):
+    hooks.remove(hook)
+
+# returns the cpu time used by this process so far
+def cpu_time():
+    if hasattr(time, "process_time"):
+        return time.process_time()
+    return time.clock()
+
+# the measurements of one run
+class Profile():
+
+    # starts a phase; returns the entry that end_phase needs
+    def start_phase(self, name):
+        path = "/".join( [entry["path"] for entry in self.open_phases[-1:]] + [name] )
+        entry = { "path" : path, "wall" : time.time(), "cpu" : cpu_time(), "memory" : 0, "peak" : 0 }
+        if self.trace_memory:
+            # the peak so far belongs to the phases already open, since the peak is reset for the new one
+            memory, peak = tracemalloc.get_traced_memory()
+            for outer in self.open_phases:
+                outer["peak"] = max(outer["peak"], peak)
+            tracemalloc.reset_peak()
+            entry["memory"] = memory
+            entry["peak"] = memory
+        self.open_phases.append(entry)
+        return entry
+
+    # ends the innermost phase, adding its measurements to its record
+    def end_phase(self, entry):
+        wall = time.time() - entry["wall"]
+        cpu = cpu_time() - entry["cpu"]
+        peak_bytes = None
+        if self.trace_memory:
+            entry["peak"] = max(entry["peak"], tracemalloc.get_traced_memory()[1])
+            peak_bytes = entry["peak"] - entry["memory"]
+            for outer in self.open_phases[:-1]:
+                outer["peak"] = max(outer["peak"], entry["peak"])
+        self.open_phases.pop()
+
+        record = self.phases.setdefault( entry["path"], { "calls" : 0, "wall" : 0.0, "cpu" : 0.0 } )
+        record["calls"] += 1
+        record["wall"] += wall
+        record["cpu"] += cpu
+        if peak_bytes is not None:
+            record["peak_bytes"] = max(record.get("peak_bytes", 0), peak_bytes)
+        for hook in hooks:
+            hook(entry["path"], wall, cpu, peak_bytes)
+
+    # adds the measurements of another profile (in the form given by as_dict) to this one
+    def merge(self, other):
+        for path, other_record in other["phases"].items():
+            record = self.phases.setdefault( path, { "calls" : 0, "wall" : 0.0, "cpu" : 0.0 } )
+            record["calls"] += other_record["calls"]
+            record["wall"] += other_record["wall"]
+            record["cpu"] += other_record["cpu"]
+            if "peak_bytes" in other_record:
+                record["peak_bytes"] = max(record.get("peak_bytes", 0), other_record["peak_bytes"])
+        for name, amount in other["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + amount
+        self.total["wall"] += other["total"]["wall"]
+        self.total["cpu"] += other["total"]["cpu"]
+
+    # records the time since the profile was started as its total
+    def finish(self):
+        self.total["wall"] += time.time() - self.started[0]
+        self.total["cpu"] += cpu_time() - self.started[1]
+
+    def as_dict(self):
+        return { "total" : self.total, "phases" : self.phases, "counters" : self.counters }
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        # the record of each phase, by path
+        self.phases = {}
+        # named counts, such as the number of blocks or of pass iterations
+        self.counters = {}
+        # the phases that have started but not ended, outermost first
+        self.open_phases = []
+        # the wall and cpu time of the whole run (and of the runs merged into it)
+        self.total = { "wall" : 0.0, "cpu" : 0.0 }
+        self.started = (time.time(), cpu_time())
+
+# starts recording a new profile, which becomes the current one
+# if trace_memory is set, allocation peaks are recorded as well (this makes everything slower)
+def start_profile(trace_memory=False):
+    global current
+    global tracemalloc
+    if trace_memory and tracemalloc is None:
+        import tracemalloc
+    # reset_peak is needed to find the peak of each phase, and is only in newer versions of python
+    trace_memory = trace_memory and hasattr(tracemalloc, "reset_peak")
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    current = Profile(trace_memory)
+    return current
+
+# stops recording, returning the profile that was recorded
+def stop_profile():
+    global current
+    profile = current
+    current = None
+    if profile is not None:
+        profile.finish()
+        if profile.trace_memory:
+            tracemalloc.stop()
+    return profile
+
+# adds to a named counter of the current profile
+def count(name, amount=1):
+    if current is not None:
+        current.counters[name] = current.counters.get(name, 0) + amount
+
+# context manager that records the code run inside it as a phase with the given name
+class phase():
+
+    def __enter__(self):
+        if current is not None:
+            self.profile = current
+            self.entry = current.start_phase(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.entry is not None:
+            self.profile.end_phase(self.entry)
+        return False
+
+    def __init__(self, name):
+        self.name = name
+        self.profile = None
+        self.entry = None
+
+# decorator that records each call of a function as a phase with the given name
+def profiled(name):
+    def decorate(func):
+        @wraps(func)
+        def profiled_func(*args, **kwargs):
+            if current is None:
+                return func(*args, **kwargs)
+            with phase(name):
+                return func(*args, **kwargs)
+        return profiled_func
+    return decorate
+
+# writes a profile (or a dict of profiles, as from as_dict) to a file as JSON
+def write_profile(profile, filename):
+    if isinstance(profile, Profile):
+        profile = profile.as_dict()
+    with open(filename, "w") as f:
+        json.dump(profile, f, indent=2, sort_keys=True)
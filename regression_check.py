@@ -0,0 +1,274 @@
+#!/usr/bin/python
+# coding: utf-8
+
+# Checks that the conversion scripts still give the same output, in about the same time and memory
+# if run from the command line, will run every conversion of a corpus, compare each output against
+# its golden copy, and compare each conversion's time and peak memory against a saved baseline
+#
+# the corpus is a directory with a manifest.tsv, where each line is the name of a conversion and its
+# command line (run from the corpus directory, with {output} standing for the output file), e.g.
+#     enemy_names	unpack_EO_name_table.py --hide_alerts Enemy/enemynametable.tbl {output}
+# without a manifest, every .bf, .mbm, and .tbl file in the corpus is converted with default options
+# (.tbl files as name tables) - see default_conversions()
+#
+# --generate fills the corpus directory with synthetic files and a manifest (see generate_flow_file.py
+# and generate_table_files.py), and --record saves the outputs and measurements as the new goldens
+# and baseline; nothing here needs the network or the game files
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from sys import stderr
+
+from generate_flow_file import Flow_Shape, generate_flow_data
+from generate_table_files import generate_name_table_data, generate_msg_data, generate_skill_data
+
+def eprint(s):
+    stderr.write(s + "\n")
+
+def parseArguments():
+    # Create argument parser
+    parser = argparse.ArgumentParser(description="Runs a corpus through the conversion scripts, failing if any output differs from its golden copy or if time or memory regress against the baseline.")
+
+    # Positional mandatory arguments
+    parser.add_argument("corpus_dir", help="directory containing the files to convert, and optionally a manifest.tsv of conversions")
+    parser.add_argument("golden_dir", help="directory containing the golden outputs and baseline.json")
+
+    # Optional arguments
+    parser.add_argument("--generate", action="store_true", help="fill the corpus directory with synthetic files and a manifest before running")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --generate")
+    parser.add_argument("--record", action="store_true", help="save the outputs as the goldens and the measurements as the baseline, instead of checking them")
+    parser.add_argument("--repeats", type=int, default=1, help="each conversion is run this many times, and the smallest time and memory are kept")
+    parser.add_argument("--time_threshold", type=float, default=0.25, help="fraction by which a conversion may be slower than the baseline before failing")
+    parser.add_argument("--memory_threshold", type=float, default=0.25, help="fraction by which a conversion's peak memory may exceed the baseline before failing")
+    parser.add_argument("--min_time", type=float, default=0.1, help="time differences smaller than this many seconds never count as regressions, since they are mostly noise")
+    parser.add_argument("--output_dir", help="directory in which to place the outputs of this run; by default a temporary directory is used, and kept only if an output differs")
+    parser.add_argument("--report", help="name of a file in which to place the measurements of this run (JSON)")
+
+    # Print version
+    parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    return args
+
+# the directory the conversion scripts are in
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+manifest_name = "manifest.tsv"
+baseline_name = "baseline.json"
+
+# returns the (name, command) of each conversion listed in a manifest
+# blank lines and lines starting with # are skipped
+def read_manifest(filename):
+    conversions = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            name, command = line.split("\t", 1)
+            conversions.append( (name, command.split()) )
+    return conversions
+
+def write_manifest(filename, conversions):
+    with open(filename, "w") as f:
+        f.write("# name\tcommand\n")
+        for name, command in conversions:
+            f.write(name + "\t" + " ".join(command) + "\n")
+
+# returns the conversions of every recognized file in the corpus, for when there is no manifest
+def default_conversions(corpus_dir):
+    conversions = []
+    for root, dirs, files in os.walk(corpus_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.relpath( os.path.join(root, filename), corpus_dir )
+            name, ext = os.path.splitext( path.replace(os.sep, "_") )
+            if ext == ".bf":
+                conversions.append( (name + ".dis", ["unpack_ai.py", path, "{output}"]) )
+                conversions.append( (name + ".dec", ["decompile_ai.py", "EO3", path, "{output}"]) )
+                conversions.append( (name + ".opt", ["decompile_ai.py", "EO3", path, "{output}", "--fully_optimize"]) )
+            elif ext == ".mbm":
+                conversions.append( (name + ".msg", ["unpack_msg.py", path, "{output}"]) )
+            elif ext == ".tbl":
+                conversions.append( (name + ".names", ["unpack_EO_name_table.py", path, "{output}"]) )
+    return conversions
+
+# writes a synthetic corpus, and its manifest, into the corpus directory
+def generate_corpus(corpus_dir, seed):
+    if not os.path.isdir(corpus_dir):
+        os.makedirs(corpus_dir)
+    def write(filename, data):
+        with open(os.path.join(corpus_dir, filename), "wb") as f:
+            f.write(data)
+
+    conversions = []
+
+    # scripts of a few sizes and shapes
+    # handwritten decompilation duplicates code heavily on random scripts, so it is only run on small ones
+    shapes = [
+        ("small", Flow_Shape(procedures=2, statements=6), True),
+        ("medium", Flow_Shape(procedures=8, statements=20), False),
+        ("large", Flow_Shape(procedures=16, statements=50, depth=4), False),
+        ("labels", Flow_Shape(procedures=4, statements=20, special_labels=3), False),
+        ("chains", Flow_Shape(procedures=4, statements=10, if_chain=12), True),
+    ]
+    for name, shape, handwritten in shapes:
+        filename = "ai_" + name + ".bf"
+        write(filename, generate_flow_data("EO3", seed, shape))
+        conversions.append( (name + ".dis", ["unpack_ai.py", "--hide_alerts", filename, "{output}"]) )
+        conversions.append( (name + ".dec", ["decompile_ai.py", "--hide_alerts", "EO3", filename, "{output}"]) )
+        conversions.append( (name + ".opt", ["decompile_ai.py", "--hide_alerts", "--fully_optimize", "EO3", filename, "{output}"]) )
+        if handwritten:
+            conversions.append( (name + ".hw", ["decompile_ai.py", "--hide_alerts", "--fully_optimize", "--handwritten", "EO3", filename, "{output}"]) )
+
+    # tables
+    for width in [2, 4]:
+        filename = "names_" + str(width) + ".tbl"
+        write(filename, generate_name_table_data(seed, 1000, width))
+        conversions.append( ("names_" + str(width) + ".tsv", ["unpack_EO_name_table.py", "--index_width", str(width), filename, "{output}"]) )
+    write("messages.mbm", generate_msg_data(seed, 500))
+    conversions.append( ("messages.tsv", ["unpack_msg.py", "messages.mbm", "{output}"]) )
+    for game in ["EO3", "EOU"]:
+        skill_data, name_data = generate_skill_data(game, seed, 300)
+        write("skills_" + game + ".tbl", skill_data)
+        write("skill_names_" + game + ".tbl", name_data)
+        conversions.append( ("skills_" + game + ".txt", ["unpack_EO_skill_table.py", game, "skill_names_" + game + ".tbl", "skills_" + game + ".tbl", "{output}"]) )
+
+    write_manifest( os.path.join(corpus_dir, manifest_name), conversions )
+
+# runs a conversion once, writing its output to the given file
+# returns the wall time in seconds and the peak memory in kilobytes (None if it cannot be measured)
+def run_conversion(corpus_dir, command, output_file):
+    args = [ sys.executable, os.path.join(script_dir, command[0]) ] + [ output_file if arg == "{output}" else arg for arg in command[1:] ]
+    with open(os.devnull, "w") as devnull:
+        start = time.time()
+        process = subprocess.Popen(args, cwd=corpus_dir, stdout=devnull, stderr=devnull)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(process.pid, 0)
+            if os.WIFSIGNALED(status):
+                status = -os.WTERMSIG(status)
+            else:
+                status = os.WEXITSTATUS(status)
+            process.returncode = status
+            elapsed = time.time() - start
+            # ru_maxrss is in kilobytes, except on macOS where it is in bytes
+            peak_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+        else:
+            status = process.wait()
+            elapsed = time.time() - start
+            peak_kb = None
+    if status < 0:
+        raise RuntimeError(" ".join(command) + " was killed by signal " + str(-status))
+    if status != 0:
+        raise RuntimeError(" ".join(command) + " failed with status " + str(status))
+    return elapsed, peak_kb
+
+# returns the messages describing how a measurement regressed against the baseline, if it did
+def find_regressions(name, measured, baseline, time_threshold, memory_threshold, min_time):
+    messages = []
+    if name not in baseline:
+        return messages
+    base = baseline[name]
+    seconds = measured["seconds"]
+    if seconds > base["seconds"] * (1 + time_threshold) and seconds - base["seconds"] > min_time:
+        messages.append( name + ": took " + "{:.3f}".format(seconds) + "s, the baseline is " + "{:.3f}".format(base["seconds"]) + "s" )
+    peak_kb = measured["peak_kb"]
+    if peak_kb is not None and base.get("peak_kb") is not None and peak_kb > base["peak_kb"] * (1 + memory_threshold):
+        messages.append( name + ": used " + str(peak_kb) + "KB, the baseline is " + str(base["peak_kb"]) + "KB" )
+    return messages
+
+# runs every conversion of the corpus, checking or recording the results
+# returns True if nothing differed or regressed
+def run_regression_check(args):
+    if args.generate:
+        generate_corpus(args.corpus_dir, args.seed)
+
+    manifest = os.path.join(args.corpus_dir, manifest_name)
+    if os.path.exists(manifest):
+        conversions = read_manifest(manifest)
+    else:
+        conversions = default_conversions(args.corpus_dir)
+    if not conversions:
+        eprint("No conversions found in " + args.corpus_dir)
+        return False
+
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix="regression_check_")
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    if not os.path.isdir(args.golden_dir):
+        os.makedirs(args.golden_dir)
+
+    baseline = {}
+    baseline_file = os.path.join(args.golden_dir, baseline_name)
+    if not args.record:
+        if os.path.exists(baseline_file):
+            with open(baseline_file) as f:
+                baseline = json.load(f)
+        else:
+            eprint("No baseline found; only outputs will be checked")
+
+    measurements = {}
+    failures = []
+    outputs_differ = False
+    for name, command in conversions:
+        output_file = os.path.abspath( os.path.join(output_dir, name) )
+        seconds, peak_kb = None, None
+        try:
+            for _ in range(args.repeats):
+                run_seconds, run_peak_kb = run_conversion(args.corpus_dir, command, output_file)
+                seconds = run_seconds if seconds is None else min(seconds, run_seconds)
+                peak_kb = run_peak_kb if peak_kb is None else min(peak_kb, run_peak_kb)
+        except RuntimeError as e:
+            failures.append( name + ": " + str(e) )
+            continue
+        measurements[name] = { "seconds" : seconds, "peak_kb" : peak_kb }
+
+        golden_file = os.path.join(args.golden_dir, name)
+        if args.record:
+            shutil.copyfile(output_file, golden_file)
+            continue
+        if not os.path.exists(golden_file):
+            failures.append( name + ": no golden output" )
+            outputs_differ = True
+            continue
+        with open(golden_file, "rb") as f:
+            golden = f.read()
+        with open(output_file, "rb") as f:
+            output = f.read()
+        if output != golden:
+            failures.append( name + ": output differs from " + golden_file )
+            outputs_differ = True
+        failures += find_regressions(name, measurements[name], baseline, args.time_threshold, args.memory_threshold, args.min_time)
+
+    if args.record:
+        with open(baseline_file, "w") as f:
+            json.dump(measurements, f, indent=2, sort_keys=True)
+        eprint("Recorded " + str(len(measurements)) + " conversions in " + args.golden_dir)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(measurements, f, indent=2, sort_keys=True)
+
+    for failure in failures:
+        eprint(failure)
+    if outputs_differ:
+        eprint("The outputs of this run are in " + output_dir)
+    elif not args.output_dir:
+        shutil.rmtree(output_dir)
+    if not failures and not args.record:
+        eprint("All " + str(len(conversions)) + " conversions match")
+    return not failures
+
+if __name__ == '__main__':
+    # Parse the arguments
+    args = parseArguments()
+
+    if not run_regression_check(args):
+        sys.exit(1)
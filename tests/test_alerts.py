@@ -0,0 +1,45 @@
+# coding: utf-8
+
+# Tests for collecting alerts with the alerts module
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alerts
+
+class Collecting_Test(unittest.TestCase):
+
+    def tearDown(self):
+        alerts.stop_collecting()
+
+    def test_alerts_are_counted_for_the_file_set(self):
+        collector = alerts.start_collecting("first.bf")
+        alerts.alert("unknown value", "Unknown value 0x10")
+        alerts.set_file("second.bf")
+        alerts.alert("unknown value", "Unknown value 0x11")
+        self.assertIs( alerts.stop_collecting(), collector )
+        self.assertEqual( collector.as_dict()["kinds"]["unknown value"]["files"], { "first.bf" : 1, "second.bf" : 1 } )
+
+    # alerts raised in another thread go to that thread's collector, not to this one
+    def test_threads_collect_separately(self):
+        collector = alerts.start_collecting("main.bf")
+        collected = {}
+        def work():
+            alerts.start_collecting("thread.bf")
+            alerts.alert("unknown value", "Unknown value 0x20")
+            collected["thread"] = alerts.stop_collecting()
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        alerts.alert("unknown opcode", "Unknown opcode 0x30")
+
+        self.assertIs( alerts.collector(), collector )
+        self.assertEqual( sorted(collector.as_dict()["kinds"]), ["unknown opcode"] )
+        self.assertEqual( sorted(collected["thread"].as_dict()["kinds"]), ["unknown value"] )
+
+if __name__ == '__main__':
+    unittest.main()
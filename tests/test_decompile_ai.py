@@ -0,0 +1,275 @@
+# coding: utf-8
+
+# Tests for decompile_ai: its optimization passes, on small scripts written instruction by instruction, and its procedure cache
+
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generate_flow_file
+import unpack_ai
+import decompile_ai
+from game_context import Game_Context
+
+# native functions used in the scripts
+SET_ACTION_ATTACK = 0x90
+SET_ACTION_FLEE = 0x92
+SET_ACTION_DEFEND = 0x93
+
+# a script with a single procedure, written with the generator's emit functions
+class Script():
+
+    def __init__(self):
+        self.gen = generate_flow_file.Flow_Generator("EO3", 0, generate_flow_file.Flow_Shape(procedures=0))
+        self.gen.proc_labels.append( ["proc_0", 0] )
+        self.gen.emit(0x07, 0)   # PROC
+
+    def emit(self, opcode, operand=0):
+        self.gen.emit(opcode, operand)
+
+    def new_label(self):
+        return self.gen.new_label()
+
+    def place_label(self, label):
+        self.gen.place_label(label)
+
+    def send(self, func_index):
+        self.emit(0x08, func_index)   # COMM
+
+    def data(self):
+        return self.gen.build()
+
+class Decompile_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # returns the structured ABST of a script (as FLW0 data), before any optimizations
+    def abstract(self, data):
+        path = os.path.join(self.directory, "script.bf")
+        with open(path, "wb") as f:
+            f.write(data)
+        game_context = Game_Context("EO3")
+        flow = unpack_ai.Flow_File(path, game_context)
+        basic_blocks, proc_info, special_labels = decompile_ai.abstract_flow(flow)
+        return decompile_ai.ABST(game_context, basic_blocks, proc_info, special_labels, False)
+
+    # returns the decompilation of a script, with the given arguments to optimize_abst
+    def decompile(self, script, *optimize_flags):
+        tree = self.abstract( script.data() )
+        tree.optimize_abst(*optimize_flags)
+        return tree.display_decompilation()
+
+class Clean_Empty_Blocks_Test(Decompile_Test):
+
+    # a loop's break block that is also where an if and its else join is merged into the if's block,
+    # which leaves it unused, but the loop still displays it; its jump to the outer loop's update
+    # block leads to a block that merging emptied, and is cleaned even though the block is unused
+    def test_unused_displayed_blocks_are_cleaned(self):
+        script = Script()
+        outer_cond, outer_update, outer_break = script.new_label(), script.new_label(), script.new_label()
+        else_label, end_label, continue_label = script.new_label(), script.new_label(), script.new_label()
+        inner_cond, inner_update, inner_break = script.new_label(), script.new_label(), script.new_label()
+        script.send(SET_ACTION_DEFEND)
+        script.place_label(outer_cond)
+        script.emit(0x1E, 5)   # PUSHLIX
+        script.emit(0x1C, outer_break)   # IF
+        script.send(SET_ACTION_FLEE)
+        script.emit(0x1E, 4)   # PUSHLIX
+        script.emit(0x1C, outer_update)   # IF
+        script.send(SET_ACTION_FLEE)
+        script.emit(0x1E, 0)   # PUSHLIX
+        script.emit(0x1C, else_label)   # IF
+        script.send(SET_ACTION_FLEE)
+        script.place_label(inner_cond)
+        script.emit(0x1E, 1)   # PUSHLIX
+        script.emit(0x1C, inner_break)   # IF
+        script.send(SET_ACTION_ATTACK)
+        script.place_label(inner_update)
+        script.emit(0x1D, 1)   # PUSHIS
+        script.emit(0x20, 3)   # POPLIX
+        script.emit(0x0D, inner_cond)   # GOTO
+        script.place_label(inner_break)
+        script.emit(0x0D, end_label)   # GOTO
+        script.place_label(else_label)
+        script.send(SET_ACTION_DEFEND)
+        script.place_label(end_label)
+        script.emit(0x1D, 1)   # PUSHIS
+        script.emit(0x20, 2)   # POPLIX
+        script.place_label(continue_label)
+        script.emit(0x0D, outer_update)   # GOTO
+        script.place_label(outer_update)
+        script.emit(0x1D, 2)   # PUSHIS
+        script.emit(0x20, 5)   # POPLIX
+        script.emit(0x0D, outer_cond)   # GOTO
+        script.place_label(outer_break)
+        script.send(SET_ACTION_FLEE)
+        script.emit(0x09)   # END
+
+        # the same as before block passes were driven by a worklist
+        self.assertEqual( self.decompile(script, False, False, False, False), "\n".join([
+            "proc_0():",
+            "    set_action_defend()",
+            "    while r5:",
+            "        set_action_flee()",
+            "        if r4:",
+            "            set_action_flee()",
+            "            if r0:",
+            "                set_action_flee()",
+            "                while r1:",
+            "                    set_action_attack()",
+            "                    r3 = 1",
+            "                r2 = 1",
+            "            else:",
+            "                set_action_defend()",
+            "            r2 = 1",
+            "        r5 = 2",
+            "    set_action_flee()",
+            "    return",
+        ]) )
+
+class Eliminate_Useless_Elses_Test(Decompile_Test):
+
+    # if r0:
+    #     (then)
+    # else:
+    #     set_action_defend()
+    # set_action_flee()
+    def if_else_script(self, emit_then):
+        script = Script()
+        script.emit(0x1E, 0)   # PUSHLIX
+        else_label = script.new_label()
+        script.emit(0x1C, else_label)   # IF
+        emit_then(script)
+        end_label = script.new_label()
+        script.emit(0x0D, end_label)   # GOTO
+        script.place_label(else_label)
+        script.send(SET_ACTION_DEFEND)
+        script.place_label(end_label)
+        script.send(SET_ACTION_FLEE)
+        script.emit(0x09)   # END
+        return script
+
+    def test_else_after_return_is_hoisted(self):
+        def emit_then(script):
+            script.send(SET_ACTION_ATTACK)
+            script.emit(0x09)   # END
+        output = self.decompile( self.if_else_script(emit_then), False, True, False, False )
+        self.assertNotIn("else:", output)
+        self.assertIn("    set_action_defend()", output)
+
+    # a branch that jumps to an empty block falls through, so the else has to stay
+    def test_else_after_jump_to_empty_block_is_kept(self):
+        def emit_then(script):
+            script.send(SET_ACTION_ATTACK)
+            script.emit(0x09)   # END
+        tree = self.abstract( self.if_else_script(emit_then).data() )
+        # end the if block with a jump to an empty block, rather than with a return
+        proc_block = tree.block_nodes[ tree.procedure_info[0].block_num ]
+        if_stmt = [ tree.inner_nodes[ptr] for ptr in proc_block.children if tree.inner_nodes[ptr].tag == "if" ][0]
+        empty_block = tree.add_block( decompile_ai.AST_Node("seq", [], []) )
+        goto_ptr = tree.fresh_var()
+        tree.inner_nodes[goto_ptr] = decompile_ai.AST_Node("goto", [empty_block], [])
+        tree.inner_used[goto_ptr] = True
+        tree.block_nodes[ if_stmt.vals[0] ].children[-1] = goto_ptr
+        tree.update_block_edges( if_stmt.vals[0] )
+
+        tree.optimize_abst(False, True, False, False)
+        self.assertIn("else:\n        set_action_defend()", tree.display_decompilation())
+
+    # an if without an else at the end of the branch can fall through, so the else has to stay
+    def test_else_after_if_without_else_is_kept(self):
+        def emit_then(script):
+            script.emit(0x1E, 1)   # PUSHLIX
+            skip_label = script.new_label()
+            script.emit(0x1C, skip_label)   # IF
+            script.send(SET_ACTION_ATTACK)
+            script.place_label(skip_label)
+        output = self.decompile( self.if_else_script(emit_then), False, True, False, False )
+        self.assertIn("else:\n        set_action_defend()", output)
+
+class Fold_Constants_Test(Decompile_Test):
+
+    # r0 = (operation)(7, 2)
+    def constant_script(self, *operations):
+        script = Script()
+        script.emit(0x1D, 2)   # PUSHIS
+        script.emit(0x1D, 7)   # PUSHIS
+        for opcode in operations:
+            script.emit(opcode)
+        script.emit(0x20, 0)   # POPLIX
+        script.emit(0x09)   # END
+        return script
+
+    # integer division folds to an integer, as it did when the decompiler ran under python 2
+    def test_integer_division_is_folded_to_an_integer(self):
+        output = self.decompile( self.constant_script(0x11), False, False, True, False )   # DIV
+        self.assertIn("r0 = 3\n", output)
+
+    # an integer result can go on to be folded by integer-only operations
+    def test_integer_division_result_is_folded_again(self):
+        output = self.decompile( self.constant_script(0x11, 0x13), False, False, True, False )   # DIV, NOT
+        self.assertIn("r0 = -4\n", output)
+
+class Display_Test(Decompile_Test):
+
+    # an if / elif chain that is not flattened nests each else inside the one before it,
+    # so the code of every level repeats all of the levels below it
+    def test_deep_if_chain_is_displayed_in_memory_proportional_to_its_code(self):
+        data = generate_flow_file.generate_flow_data("EO3", 0, generate_flow_file.Flow_Shape(procedures=1, statements=1, depth=0, if_chain=200))
+        tree = self.abstract(data)
+        tree.optimize_abst(False, False, False, False)
+        tracemalloc.start()
+        try:
+            output = tree.display_decompilation()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        # the innermost statements are inside the procedure and 200 elses
+        self.assertIn( "\n" + " " * 4 * 201 + "play_music(", output )
+        # keeping the code of every level until the end takes around 75 times the size of the code
+        self.assertLess( peak, 10 * len(output) )
+
+class Procedure_Cache_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_saved_code_is_reused(self):
+        cache = decompile_ai.Procedure_Cache(self.path)
+        cache.code["context:hash"] = "():\n    return"
+        cache.save()
+        self.assertEqual( decompile_ai.Procedure_Cache(self.path).code, { "context:hash" : "():\n    return" } )
+
+    # the code in a file written by another version of the decompiler may be stale
+    def test_other_versions_are_not_used(self):
+        cache = decompile_ai.Procedure_Cache(self.path)
+        cache.code["context:hash"] = "():\n    return"
+        cache.save()
+        old_version = decompile_ai.procedure_cache_version
+        decompile_ai.procedure_cache_version = old_version + 1
+        try:
+            self.assertEqual( decompile_ai.Procedure_Cache(self.path).code, {} )
+        finally:
+            decompile_ai.procedure_cache_version = old_version
+
+    # files from before the cache had a version are not used either
+    def test_unversioned_files_are_not_used(self):
+        with open(self.path, "w") as f:
+            f.write('{"context:hash" : "():\\n    return"}')
+        self.assertEqual( decompile_ai.Procedure_Cache(self.path).code, {} )
+
+if __name__ == '__main__':
+    unittest.main()
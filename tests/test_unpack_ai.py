@@ -0,0 +1,38 @@
+# coding: utf-8
+
+# Tests for reading AI scripts with unpack_ai
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generate_flow_file
+import unpack_ai
+from game_context import Game_Context
+
+class Find_Procedures_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "script.bf")
+        with open(path, "wb") as f:
+            f.write( generate_flow_file.generate_flow_data("EO3", 0, generate_flow_file.Flow_Shape(procedures=3)) )
+        self.flow = unpack_ai.Flow_File(path, Game_Context())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_patterns_are_matched(self):
+        self.assertEqual( self.flow.find_procedures(["proc_0", "proc_[12]"]), [0, 1, 2] )
+
+    def test_unmatched_patterns_are_an_error(self):
+        with self.assertRaises(ValueError) as raised:
+            self.flow.find_procedures(["proc_0", "porc_1", "missing_*"])
+        self.assertEqual( str(raised.exception), "No procedure matches porc_1, missing_*" )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,9 @@
 
 import argparse
 from struct import unpack
+import alerts
 import convert_EOstring
+import phase_profile
 from shared_helpers import d
 
 def parseArguments():
@@ -26,6 +28,9 @@ def parseArguments():
     parser.add_argument("--hide_raw", action="store_true", help="raw names will not be displayed")
     parser.add_argument("--show_output", action="store_true", help="output will be printed to console in addition to being saved to the output_file")
     parser.add_argument("--hide_alerts", action="store_true", help="warnings will not be printed to stderr if unknown characters are encountered") 
+    parser.add_argument("--alert_report", metavar="FILE", help="alerts are collected instead of printed as they are raised, and written to this file as JSON, with a summary printed to stderr")
+    parser.add_argument("--profile", metavar="FILE", help="the time spent parsing and displaying the table is written to this file as JSON")
+    parser.add_argument("--profile_memory", action="store_true", help="with --profile, the peak memory allocated while parsing and displaying is recorded too (this makes everything much slower)")
 
 
     # Print version
@@ -47,6 +52,7 @@ def parseArguments():
 class EO_name_table:
 
     # Populate the table using given raw data
+    @phase_profile.profiled("name table")
     def build_from_data(self, data, width, alert_unk=False):
         # grabs the correctly-widthed starting at index i
         def data_slice(i):
@@ -101,32 +107,48 @@ class EO_name_table:
 
 
 
-if __name__ == '__main__':
-    # Parse the arguments
-    args = parseArguments()
-
-    # Build the table from the given file
-    tbl = EO_name_table()
-    tbl.build_from_file(args.input_file, args.index_width, not args.hide_alerts)
-
-    # Construct the output
+# Construct the tsv output for a table
+def display_name_table(tbl, hide_pos=False, hide_raw=False):
     header = ["index"]
-    if not args.hide_pos:
+    if not hide_pos:
         header.append( "end" )
-    if not args.hide_raw:
+    if not hide_raw:
         header.append( "raw name" )
     header.append( "name" )
     output = "\t".join(header) + "\n"
 
     for index in range(0, tbl.size):
         row_data = [str(index)]
-        if not args.hide_pos:
+        if not hide_pos:
             row_data.append( str(tbl.positions[index]) )
-        if not args.hide_raw:
+        if not hide_raw:
             row_data.append( convert_EOstring.display_eostring(tbl.raw_names[index]) )
         row_data.append( tbl.names[index] )
         output += "\t".join(row_data) + "\n"
 
+    return output
+
+
+if __name__ == '__main__':
+    # Parse the arguments
+    args = parseArguments()
+
+    # Build the table from the given file
+    if args.alert_report:
+        alerts.start_collecting(args.input_file)
+    if args.profile:
+        phase_profile.start_profile(args.profile_memory)
+    tbl = EO_name_table()
+    tbl.build_from_file(args.input_file, args.index_width, not args.hide_alerts)
+    if args.alert_report:
+        alerts.report(alerts.stop_collecting(), args.alert_report)
+
+    # Construct the output
+    with phase_profile.phase("display"):
+        output = display_name_table(tbl, args.hide_pos, args.hide_raw)
+    if args.profile:
+        phase_profile.write_profile(phase_profile.stop_profile(), args.profile)
+
     if args.show_output:
         print(output)
 
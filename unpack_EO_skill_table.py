@@ -5,19 +5,20 @@
 # if run from the command line, will take a skill data table file and a skill name table
 # and output all of the available information for each skill
 #
-# when calling this from outside, make sure to call set_game_specific_values()
-# with the appropriate game code first
+# when calling this from outside, make sure to pass a Game_Context
+# for the appropriate game
 #
 # written by TheOnlyOne (@modest_ralts)
 
 import argparse
-from sys import stderr
 from struct import Struct
+import alerts
 import convert_EOstring
+import phase_profile
 import unpack_EO_name_table
 from shared_helpers import *
+from game_context import Game_Context
 
-import eo_value_lookup
 from eo_value_lookup import game_codes
 
 def parseArguments():
@@ -35,6 +36,9 @@ def parseArguments():
     parser.add_argument("--hide_raw_name", action="store_true", help="raw skill names will not be displayed")
     parser.add_argument("--show_output", action="store_true", help="output will be printed to console in addition to being saved to the output_file")
     parser.add_argument("--hide_unknowns", action="store_true", help="messages will not be printed to stderr if unknown characters or unkown parts of skill data are encountered")
+    parser.add_argument("--alert_report", metavar="FILE", help="alerts are collected instead of printed as they are raised, and written to this file as JSON, with a summary printed to stderr")
+    parser.add_argument("--profile", metavar="FILE", help="the time spent parsing and displaying the skills is written to this file as JSON")
+    parser.add_argument("--profile_memory", action="store_true", help="with --profile, the peak memory allocated while parsing and displaying is recorded too (this makes everything much slower)")
     parser.add_argument("--hide_raw_data", action="store_true", help="skill data will not have the raw hex values displayed alongside the readable data")
 
     # Print version
@@ -46,19 +50,6 @@ def parseArguments():
     return args
 
 
-num_level_tables = 0
-level_table_size = 0
-skill_types = {}
-requirements_flags = {}
-target_types = {}
-target_teams = {}
-stat_modifier_stacks = {}
-stat_modifier_types = {}
-damage_type_flags = {}
-ailment_kinds = {}
-ailment_flags = {}
-level_data_types = {}
-
 # Create an unpacker based on the game
 def get_game_unpacker(game):
     if game == "EOU":
@@ -67,53 +58,20 @@ def get_game_unpacker(game):
         return Struct("<BBHH4B5HI88i")
 
 
-# Modifies values and maps that are game specific
-def set_game_specific_values(game):
-    global num_level_tables
-    global level_table_size
-
-    global skill_types
-    global requirements_flags
-    global target_types
-    global target_teams
-    global stat_modifier_stacks
-    global stat_modifier_types
-    global damage_type_flags
-    global ailment_kinds
-    global ailment_flags
-    global level_data_types
-
-    if game == "EO3":
-        num_level_tables = 8
-        level_table_size = 10
-    elif game == "EOU":
-        num_level_tables = 10
-        level_table_size = 15
-
-    skill_types = eo_value_lookup.skill_types[game]
-    requirements_flags = eo_value_lookup.requirements_flags[game]
-    target_types = eo_value_lookup.target_types[game]
-    target_teams = eo_value_lookup.target_teams[game]
-    stat_modifier_stacks = eo_value_lookup.stat_modifier_stacks[game]
-    stat_modifier_types = eo_value_lookup.stat_modifier_types[game]
-    damage_type_flags = eo_value_lookup.damage_type_flags[game]
-    ailment_kinds = eo_value_lookup.ailment_kinds[game]
-    ailment_flags = eo_value_lookup.ailment_flags[game]
-    level_data_types = eo_value_lookup.level_data_types[game]
-
-
 # Data structure that stores the data for a single skill
 class EO_skill_data_entry:
 
     # Parse a skill entry given the raw data and the game's unpacker
     # Suppress stderr by giving hide_unknowns = True
+    # game_context is a Game_Context for the game the data is from
     # name is used to locate the unknowns
-    def build_skill_entry(self, data, unpacker, name="", hide_unknowns=False):
+    def build_skill_entry(self, data, unpacker, game_context, name="", hide_unknowns=False):
+        self.game_context = game_context
 
-        # prints to stderr if hide_unknowns is False
+        # raises an alert located at this skill if hide_unknowns is False
         def eprint(s):
             if not hide_unknowns:
-                stderr.write(name + ": " + s + "\n")
+                alerts.alert("skill data", s, name)
 
         # check if there are True flags that don't have named indexes in the given map
         def check_unnamed_flags(flags, index_map, name):
@@ -163,20 +121,20 @@ class EO_skill_data_entry:
             eprint("unk1 is not 0x0A! It is " + "{:#04x}".format(self.unk1) )
 
         # get the skill type
-        self.skill_type, self.skill_type_name = unpack_named_value(1, skill_types, 1, "skill type")
+        self.skill_type, self.skill_type_name = unpack_named_value(1, game_context.skill_types, 1, "skill type")
 
         # get the usage requirements for this skill
-        self.requirements, self.requirements_flags = unpack_flag_list(2, requirements_flags, 16, "Requirements")
+        self.requirements, self.requirements_flags = unpack_flag_list(2, game_context.requirements_flags, 16, "Requirements")
 
         # get unk2
         self.unk2 = unpacked_data[3]
         self.unk2_flags = int_like_to_flag_list( self.unk2, 16 )
 
         # get the targeting type
-        self.target_type, self.target_type_name = unpack_named_value(4, target_types, 1, "target type")
+        self.target_type, self.target_type_name = unpack_named_value(4, game_context.target_types, 1, "target type")
  
         # get the targeted team
-        self.target_team, self.target_team_name = unpack_named_value(5, target_teams, 1, "target team")
+        self.target_team, self.target_team_name = unpack_named_value(5, game_context.target_teams, 1, "target team")
 
         # unk3 seems to always be 0x04. Check if there are exceptions
         self.unk3 = unpacked_data[6]
@@ -184,22 +142,22 @@ class EO_skill_data_entry:
             eprint("unk3 is not 0x04! It is " + "{:#04x}".format(self.unk3) )
 
         # get the stat modifier stack
-        self.stat_modifier_stack, self.stat_modifier_stack_name = unpack_named_value(7, stat_modifier_stacks, 1, "buff kind")
+        self.stat_modifier_stack, self.stat_modifier_stack_name = unpack_named_value(7, game_context.stat_modifier_stacks, 1, "buff kind")
 
         # get the stat modifier type
-        self.stat_modifier_type, self.stat_modifier_type_name = unpack_named_value(8, stat_modifier_types, 2, "buff type")
+        self.stat_modifier_type, self.stat_modifier_type_name = unpack_named_value(8, game_context.stat_modifier_types, 2, "buff type")
 
         # get the stat modifier damage types
-        self.stat_modifier_damage_type, self.stat_modifier_damage_type_flags = unpack_flag_list(9, damage_type_flags, 16, "buff damage types")
+        self.stat_modifier_damage_type, self.stat_modifier_damage_type_flags = unpack_flag_list(9, game_context.damage_type_flags, 16, "buff damage types")
 
         # get the damage types
-        self.damage_type, self.damage_type_flags = unpack_flag_list(10, damage_type_flags, 16, "damage types")
+        self.damage_type, self.damage_type_flags = unpack_flag_list(10, game_context.damage_type_flags, 16, "damage types")
 
         # get the ailment kind
-        self.ailment_kind, self.ailment_kind_name = unpack_named_value(11, ailment_kinds, 2, "ailment kind")
+        self.ailment_kind, self.ailment_kind_name = unpack_named_value(11, game_context.ailment_kinds, 2, "ailment kind")
 
         # get the ailment flags
-        self.possible_ailments, self.possible_ailments_flags = unpack_flag_list(12, ailment_flags, 16, "ailment flags")
+        self.possible_ailments, self.possible_ailments_flags = unpack_flag_list(12, game_context.ailment_flags, 16, "ailment flags")
 
         # unk4 seems to always be 0x00. Check if there are exceptions
         self.unk4 = unpacked_data[13]
@@ -212,17 +170,17 @@ class EO_skill_data_entry:
         # 2) the name associated with this value, and
         # 3) the list of values for each level
         level_tables_base = 14
-        for tbl in range(0, num_level_tables):
-            our_base = level_tables_base + tbl * (level_table_size + 1)
+        for tbl in range(0, game_context.num_level_tables):
+            our_base = level_tables_base + tbl * (game_context.level_table_size + 1)
             data_value = unpacked_data[ our_base ]
             data_value_name = ""
-            if data_value in level_data_types:
-                data_value_name = level_data_types[data_value]
+            if data_value in game_context.level_data_types:
+                data_value_name = game_context.level_data_types[data_value]
             else:
                 eprint("Unknown level data value: " + "{:#010x}".format(data_value) )
                 data_value_name = "<" + "{:#010x}".format(data_value) + ">"
             level_values = []
-            for level in range(0, level_table_size):
+            for level in range(0, game_context.level_table_size):
                 level_values.append( unpacked_data[our_base + level + 1] )
             self.level_data.append( (data_value, data_value_name, level_values) )
 
@@ -267,7 +225,7 @@ class EO_skill_data_entry:
         output += "Skill Type:\t" + display_skill_data_value(self.skill_type, self.skill_type_name, 1) + "\n"
 
         # requirements
-        output += "Requirements:\t" + display_flag_list(self.requirements_flags, requirements_flags) + "\n"
+        output += "Requirements:\t" + display_flag_list(self.requirements_flags, self.game_context.requirements_flags) + "\n"
 
         # unk2
         output += "Unknown2:\t" + "{:#06x}".format(self.unk2) + "\n"
@@ -288,16 +246,16 @@ class EO_skill_data_entry:
         output += "Buff Type:\t" + display_skill_data_value(self.stat_modifier_type, self.stat_modifier_type_name, 2) + "\n"
 
         # stat modifier flags
-        output += "Buff Flags:\t" + display_flag_list(self.stat_modifier_damage_type_flags, damage_type_flags) + "\n"
+        output += "Buff Flags:\t" + display_flag_list(self.stat_modifier_damage_type_flags, self.game_context.damage_type_flags) + "\n"
 
         # damage types
-        output += "Damage Types:\t" + display_flag_list(self.damage_type_flags, damage_type_flags) + "\n"
+        output += "Damage Types:\t" + display_flag_list(self.damage_type_flags, self.game_context.damage_type_flags) + "\n"
 
         # ailment kind
         output += "Ailment effect:\t" + display_skill_data_value(self.ailment_kind, self.ailment_kind_name, 2) + "\n"
  
         # ailment flages
-        output += "Ailments:\t" + display_flag_list(self.possible_ailments_flags, ailment_flags) + "\n"
+        output += "Ailments:\t" + display_flag_list(self.possible_ailments_flags, self.game_context.ailment_flags) + "\n"
 
         # unk4
         output += "Unknown4:\t" + "{:#010x}".format(self.unk4) + "\n"
@@ -307,8 +265,8 @@ class EO_skill_data_entry:
         def pad6(i):
             return str(i).ljust(6)
         output += "Level Table:\n"
-        output += "param \\ level".rjust(just_size) + "  " + "".join( map(pad6, range(1, level_table_size + 1)) ) + "\n"
-        for tbl in range(0, num_level_tables):
+        output += "param \\ level".rjust(just_size) + "  " + "".join( map(pad6, range(1, self.game_context.level_table_size + 1)) ) + "\n"
+        for tbl in range(0, self.game_context.num_level_tables):
             tag, tag_name, vals = self.level_data[tbl]
             row = tag_name.rjust(just_size) + "  " + "".join( map(pad6, vals) ) + "\n"
             output += row
@@ -318,6 +276,7 @@ class EO_skill_data_entry:
 
     # Create an empty skill entry
     def __init__(self):
+        self.game_context = None
         self.unk1 = 0
         self.skill_type = 0
         self.skill_type_name = ""
@@ -349,8 +308,10 @@ class EO_skill_data_entry:
 # data is the raw file data containing all of the skill entries
 # unpacker is the game's unpacker, obtained from get_game_unpacker()
 # names is a EO_name_table with a matching number of indices
+# game_context is a Game_Context for the game the data is from
 # hide_unknowns gets passed on to the entry parser
-def unpack_skills(data, unpacker, names, hide_unknowns=False):
+@phase_profile.profiled("skill table")
+def unpack_skills(data, unpacker, names, game_context, hide_unknowns=False):
 
     struct_size = unpacker.size
     skills = []
@@ -359,28 +320,35 @@ def unpack_skills(data, unpacker, names, hide_unknowns=False):
         skill = EO_skill_data_entry()
         data_slice = data[index*struct_size : (1+index)*struct_size]
         if len(data_slice) < struct_size:
-            print "End of file reached before finding data for every skill name."
+            print("End of file reached before finding data for every skill name.")
         else:
-            skill.build_skill_entry(data_slice, unpacker, names.names[index], args.hide_unknowns)
+            skill.build_skill_entry(data_slice, unpacker, game_context, names.names[index], hide_unknowns)
             skills.append(skill)
 
     return skills
 
 # takes a converted name table and skill table filename,
-# the game, and the hide_unknowns flag, and passes these
+# the game's Game_Context, and the hide_unknowns flag, and passes these
 # on to unpack_skills after reading and using the,
-def unpack_skills_from_file(name_table, skill_file, game, hide_unknowns=False):
+def unpack_skills_from_file(name_table, skill_file, game_context, hide_unknowns=False):
 
-    # Get this game's unpacker, and set it's specific values
-    unpacker = get_game_unpacker(game)
-    set_game_specific_values(game)
+    # Get this game's unpacker
+    unpacker = get_game_unpacker(game_context.game)
 
     data = ""
-    with open(skill_file) as f:
+    with open(skill_file, "rb") as f:
         data = f.read()
 
     # parse all skills and add their display to the output
-    return unpack_skills(data, unpacker, names, hide_unknowns)
+    return unpack_skills(data, unpacker, name_table, game_context, hide_unknowns)
+
+# displays every skill of a table, given its name table
+# args holds the display options (hide_raw_name and hide_raw_data), as for display_skill
+def display_skills(skills, names, args):
+    output = ""
+    for index, skill in enumerate(skills):
+        output += skill.display_skill(index, names.raw_names[index], names.names[index], args)
+    return output
 
 
 if __name__ == '__main__':
@@ -388,18 +356,26 @@ if __name__ == '__main__':
     args = parseArguments()
 
     # Build the name table from the given file
+    if args.alert_report:
+        alerts.start_collecting(args.input_name_file)
+    if args.profile:
+        phase_profile.start_profile(args.profile_memory)
     names = unpack_EO_name_table.EO_name_table()
     names.build_from_file(args.input_name_file, args.name_index_width, not args.hide_unknowns)
 
     # Build the skill table from the given file
-    skills = unpack_skills_from_file(names, args.input_skill_file, args.game, args.hide_unknowns)
+    alerts.set_file(args.input_skill_file)
+    skills = unpack_skills_from_file(names, args.input_skill_file, Game_Context(args.game), args.hide_unknowns)
+    if args.alert_report:
+        alerts.report(alerts.stop_collecting(), args.alert_report)
 
-    output = ""
-    for index, skill in enumerate(skills):
-        output += skill.display_skill(index, names.raw_names[index], names.names[index], args)
+    with phase_profile.phase("display"):
+        output = display_skills(skills, names, args)
+    if args.profile:
+        phase_profile.write_profile(phase_profile.stop_profile(), args.profile)
 
     if args.show_output:
-        print output
+        print(output)
 
     # Write result to a file
     with open(args.output_file, "w") as f:
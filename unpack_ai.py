@@ -10,9 +10,15 @@
 # and https://github.com/ThatOneStruggle/RMDEditor-master/blob/master/RMDEditor/FLW0/Flw0.cs for more details
 
 import argparse
+import sys
+from collections import deque
+from fnmatch import fnmatchcase
 from struct import pack, unpack
 from sys import stderr
 from shared_helpers import *
+from game_context import Game_Context
+import phase_profile
+import alerts
 
 def eprint(s):
     stderr.write(s + "\n")
@@ -29,6 +35,11 @@ def parseArguments():
     parser.add_argument("--show_output", action="store_true", help="output will be printed to console in addition to being saved to the output_file")
     parser.add_argument("--hide_alerts", action="store_true", help="warnings will not be printed to stderr if unexpected values are encountered")
     parser.add_argument("--no_dce", action="store_true", help="dead code elimination will not be performed")
+    parser.add_argument("--roots", action="append", metavar="NAME", help="procedures that cannot be reached by calls and jumps from the procedures with this name (wildcards are allowed) are dropped; may be given more than once, and a name that matches no procedure is an error")
+    parser.add_argument("--alert_report", metavar="FILE", help="alerts are collected instead of printed as they are raised, and written to this file as JSON, with a summary printed to stderr")
+    parser.add_argument("--profile", metavar="FILE", help="the time spent parsing the file is written to this file as JSON")
+    parser.add_argument("--profile_memory", action="store_true", help="with --profile, the peak memory allocated while parsing is recorded too (this makes parsing much slower)")
+    parser.add_argument("--detect_cycles", action="store_true", help="an alert will be printed for each procedure whose jumps form a loop")
 
     # Print version
     parser.add_argument("--version", action="version", version='%(prog)s - Version 1.0')
@@ -38,14 +49,11 @@ def parseArguments():
 
     return args
 
-show_alerts = True
-dead_code_elimination = True
-
 # class that contains the data in the flow file
 class Flow_Header():
 
     # data should be 0x20 = 32 bytes
-    def __init__(self, data):
+    def __init__(self, data, show_alerts=True):
         unpacked = unpack("<BBH4IH10B", data)
         self.file_type = unpacked[0]
         self.compresion_flag = unpacked[1]
@@ -71,10 +79,10 @@ class Flow_Header():
             for name, val in expected.items():
                 our_val = self.__dict__[name]
                 if our_val != val:
-                    eprint( name + " is not " + "{:#04x}".format(val) + "! It is: " + "{:#04x}".format(our_val) )
+                    alerts.alert( "flow header", name + " is not " + "{:#04x}".format(val) + "! It is: " + "{:#04x}".format(our_val) )
             for p in self.pad:
                 if p != 0:
-                    eprint( "found non-zero pading: " + "{:#04x}".format(p) )
+                    alerts.alert( "flow header", "found non-zero pading: " + "{:#04x}".format(p) )
 
 # class that contains the data for a section's header in the flow file
 class Flow_Section_Header():
@@ -175,7 +183,7 @@ no_operands = [0x04, 0x05, 0x06, 0x09, 0x0C, 0x0E, 0x0F, 0x10, 0x11, 0x12, 0x13,
 class Flow_Instruction():
 
     # return a string displaying the instruction
-    def display(self, proc_labels, jump_labels):
+    def display(self, proc_labels, jump_labels, show_alerts=True):
         loc_str = str(self.loc)
 
         raw_instr_str = ""
@@ -213,7 +221,7 @@ class Flow_Instruction():
         # if it does not use an operand, ommit it
         if self.opcode in no_operands:
             if show_alerts and self.operand != 0:
-                eprint( "Found a " + opcode_name + " with a non-zero operand: " + operand_name )
+                alerts.alert( "instruction operand", "Found a " + opcode_name + " with a non-zero operand: " + operand_name )
             operand_name = ""
         readable_inst = " ".join( ["#", opcode_name, operand_name] )
 
@@ -238,10 +246,10 @@ class Flow_Instruction():
 class Flow_Block():
 
     # return a string displaying the full flow block
-    def display(self, proc_labels, jump_labels):
+    def display(self, proc_labels, jump_labels, show_alerts=True):
         instr_strs = []
         for instr in self.instructions:
-            instr_strs.append( instr.display(proc_labels, jump_labels) )
+            instr_strs.append( instr.display(proc_labels, jump_labels, show_alerts) )
         return "\n".join( ["label: " + self.name] + instr_strs )
 
     # eliminate dead instructions (those after an END or unconditional jump)
@@ -256,7 +264,7 @@ class Flow_Block():
     
     # label is the label that starts this block
     # instructions should be a slice of the full instruction list
-    def __init__(self, label, instructions, procedure_id, next_label):
+    def __init__(self, label, instructions, procedure_id, next_label, show_alerts=True):
         self.name = label.name
         self.start = label.loc
         self.label_index = label.index
@@ -278,34 +286,65 @@ class Flow_Block():
         if no_fallthrough:
             if next_label is None:
                 if show_alerts:
-                    eprint("Final block does not end in an IF, JUMP, GOTO, or END, or is empty.")
+                    alerts.alert("flow block", "Final block does not end in an IF, JUMP, GOTO, or END, or is empty.")
             instr_data = b('\x0d\x00') + pack("<H", next_label.index)
             goto_instr = Flow_Instruction(instr_data, -1)
             self.instructions.append(goto_instr)
 
 # block flow graph for a single procedure
 class Flow_Block_Graph():
-    
-    # construct the graph as a list of out edges
-    # uses a flow file's flow block list
-    def __init__(self, flow_blocks, labels):
+
+    # depth-first search over the reachable blocks, looking for a directed cycle
+    # uses an explicit stack so long procedures cannot hit the recursion limit
+    # sets has_cycles, and stores the labels of the first cycle found in cycle_labels
+    def find_cycles(self, labels):
         self.has_cycles = False
+        self.cycle_labels = []
+        # blocks on the current path are "open", finished blocks are "done"
+        state = {}
+        for root in self.start_outs:
+            if root in state:
+                continue
+            state[root] = "open"
+            path = [root]
+            stack = [iter(self.other_outs[root])]
+            while stack:
+                for out in stack[-1]:
+                    if out not in state:
+                        state[out] = "open"
+                        path.append(out)
+                        stack.append( iter(self.other_outs[out]) )
+                        break
+                    if state[out] == "open" and not self.has_cycles:
+                        self.has_cycles = True
+                        cycle = path[path.index(out):] + [out]
+                        self.cycle_labels = [labels[idx].name for idx in cycle]
+                else:
+                    state[path.pop()] = "done"
+                    stack.pop()
+
+    # construct the graph as a list of out edges
+    # uses a flow file's flow block list, and its list of jump labels
+    # label_locs maps an instruction location to the first jump label there; it is built from labels if not given
+    # cycles are only looked for if detect_cycles is set; otherwise has_cycles is None
+    def __init__(self, flow_blocks, labels, label_locs=None, detect_cycles=False):
+        self.has_cycles = None
+        self.cycle_labels = []
+        if label_locs is None:
+            label_locs = jump_label_locations(labels)
 
         # get the out edges for a single block and return it
         def get_out_edges(block):
-            outs = []
+            outs = set([])
             for instr in block.instructions:
                 if instr.opcode in jumpers:
-                    if instr.operand not in outs:
-                        outs.append(instr.operand)
+                    outs.add(instr.operand)
             # if the last instruction is an IF, we need to add the following block as well
             if len(block.instructions) > 0 and block.instructions[-1].opcode == 0x1C:
                 loc = block.instructions[-1].loc + 1
-                for idx, label in enumerate(labels):
-                    if label.loc == loc:
-                        outs.append(idx)
-                        break
-            return set(outs)
+                if loc in label_locs:
+                    outs.add( label_locs[loc] )
+            return outs
 
         # having only one block is an easy special case
         if len(flow_blocks) == 1:
@@ -320,58 +359,132 @@ class Flow_Block_Graph():
         for block in flow_blocks[1:]:
             self.other_outs[block.label_index] = get_out_edges(block)
 
-        # compute the reachable blocks, and detect any directed cycles
-        self.reachable = dict((i, False) for (i, _) in self.other_outs.items())
-        reachable_queue = []
-        preds = dict((i, []) for (i, _) in self.other_outs.items()) 
-        # pushes new reachable blocks to the stack and marks them as reachable
-        # returns True if no new blocks were pushed
-        def push_new_reachables(outs, pre):
-            for block_index in outs:
-                if self.reachable[block_index]:
-                    if block_index in pre:
-                        labels_in_cycle = []
-                        for idx in (pre + [block_index]):
-                            labels_in_cycle.append( labels[idx].name )
-                        #eprint("Cycle detected in block flow graph! " + "->".join(labels_in_cycle) )
-                        labels_in_cycle.append( labels_in_cycle[0] )
-                        self.has_cycles = True
-                else:
+        # compute the reachable blocks with a breadth-first search
+        self.reachable = dict((i, False) for i in self.other_outs)
+        reachable_queue = deque([])
+        for block_index in self.start_outs:
+            if not self.reachable[block_index]:
+                self.reachable[block_index] = True
+                reachable_queue.append( block_index )
+        while reachable_queue:
+            cur_block = reachable_queue.popleft()
+            for block_index in self.other_outs[cur_block]:
+                if not self.reachable[block_index]:
                     self.reachable[block_index] = True
-                    preds[block_index] = pre + [block_index]
                     reachable_queue.append( block_index )
-        depth = 0
-        push_new_reachables(self.start_outs, [])
-        while reachable_queue:
-            cur_block = reachable_queue.pop(0)
-            push_new_reachables( self.other_outs[ cur_block ], preds[cur_block] )
-            
 
-        
+        if detect_cycles:
+            self.find_cycles(labels)
+
+# returns the number of instruction slots in a flow file, reading only its headers
+# this is a cheap way to estimate how much work a file will be
+def count_instructions(filename):
+    with open(filename, "rb") as f:
+        data = f.read(0x20 + 0x10 * 3)
+    # section 2 holds the instructions
+    if len(data) < 0x50:
+        return 0
+    return Flow_Section_Header( data[0x40 : 0x50] ).num_entries
+
+# maps each instruction location that has a jump label to the index of the first such label
+def jump_label_locations(labels):
+    label_locs = {}
+    for idx, label in enumerate(labels):
+        if label.loc not in label_locs:
+            label_locs[label.loc] = idx
+    return label_locs
+
+# returns the procedures reachable from the given root procedures in a call graph (see Flow_File.call_graph)
+# procedures are identified by their procedure label index; the roots are included, and the result is sorted
+def call_graph_closure(call_graph, roots):
+    found = set(roots)
+    queue = deque(found)
+    while queue:
+        cur_proc = queue.popleft()
+        for callee in call_graph[cur_proc]:
+            if callee not in found:
+                found.add(callee)
+                queue.append(callee)
+    return sorted(found)
 
 # a full flow file
 class Flow_File():
 
+    # returns the call graph of the procedures, as a dict from each procedure label index
+    # to the set of procedure label indices it CALLs or JUMPs to
+    # instructions in unreachable blocks are ignored
+    def call_graph(self):
+        graph = {}
+        for proc_blocks, block_graph in zip(self.flow_blocks, self.block_graphs):
+            callees = set([])
+            for block in proc_blocks:
+                if block.label_kind == "jump" and not block_graph.reachable[block.label_index]:
+                    continue
+                for instr in block.instructions:
+                    if instr.opcode in callers:
+                        callees.add(instr.operand)
+            graph[ proc_blocks[0].label_index ] = callees
+        return graph
+
+    # returns the sorted procedure label indices of the procedures whose names match any of the given glob patterns
+    # raises a ValueError naming the patterns that match nothing, since they are most likely typos
+    def find_procedures(self, patterns):
+        found = set([])
+        unmatched = []
+        for pattern in patterns:
+            matches = [label.index for label in self.proc_labels if fnmatchcase(label.name, pattern)]
+            if not matches:
+                unmatched.append(pattern)
+            found.update(matches)
+        if unmatched:
+            raise ValueError("No procedure matches " + ", ".join(unmatched))
+        return sorted(found)
+
+    # drops the procedures that cannot be reached from the given root procedures (procedure label indices)
+    # the remaining procedure label indices are stored in live_procedures, which is None if nothing was pruned
+    # returns the names of the dropped procedures
+    def prune_procedures(self, roots):
+        self.live_procedures = call_graph_closure(self.call_graph(), roots)
+        live = set(self.live_procedures)
+        self.live_procedure_ids = set( proc_blocks[0].procedure_id for proc_blocks in self.flow_blocks if proc_blocks[0].label_index in live )
+        return [label.name for label in self.proc_labels if label.index not in live]
+
+    # undoes prune_procedures, so that every procedure is live again
+    def restore_procedures(self):
+        self.live_procedures = None
+        self.live_procedure_ids = None
+
     # displays the disassembled instructions
     def display_disassembly(self):
         output = "Number of allocated storage spaces: " + str(self.header.storage_space) + "\n\n"
         displayed_blocks = []
         for block in flatten(self.flow_blocks):
-            if block.label_kind == "proc" or not dead_code_elimination or self.block_graphs[block.procedure_id].reachable[block.label_index]:
-                displayed_blocks.append( block.display(self.proc_labels, self.jump_labels) )
+            if self.live_procedures is not None and block.procedure_id not in self.live_procedure_ids:
+                continue
+            if block.label_kind == "proc" or not self.game_context.dead_code_elimination or self.block_graphs[block.procedure_id].reachable[block.label_index]:
+                displayed_blocks.append( block.display(self.proc_labels, self.jump_labels, self.game_context.show_alerts) )
             first = False
         return output + "\n\n".join(displayed_blocks)
             
 
     # data will contain the full file
-    def __init__(self, filename):
+    # game_context holds the options the file is read with (see game_context.py); by default, a Game_Context()
+    @phase_profile.profiled("Flow_File")
+    def __init__(self, filename, game_context=None):
+        if game_context is None:
+            game_context = Game_Context()
+        self.game_context = game_context
+        show_alerts = game_context.show_alerts
+
         #read the file
         data = ""
         with open(filename, "rb") as f:
             data = f.read()
         
         # get the file's header
-        self.header = Flow_Header( data[0x00 : 0x20] )
+        self.header = Flow_Header( data[0x00 : 0x20], show_alerts )
+        self.live_procedures = None
+        self.live_procedure_ids = None
 
         # get the file's sections
         self.sections = []
@@ -419,13 +532,13 @@ class Flow_File():
         if show_alerts:
             # Section 3: Expected to be empty
             if self.sections[3].header.num_entries > 0:
-                eprint("Section 3 is not empty!")
+                alerts.alert("flow sections", "Section 3 is not empty!")
             
             # Section 4: Expected to be 0 padding
             sec = self.sections[4]
             for pad in sec.entries:
                 if pad != b'\x00':
-                    eprint("Section 4 has non-zero padding: " + str(pad))
+                    alerts.alert("flow sections", "Section 4 has non-zero padding: " + str(pad))
 
         
         # break the instructions up into flow blocks using the given labels
@@ -440,37 +553,57 @@ class Flow_File():
         for label, end, next_l in zip(all_labels, end_points, next_labels):
             if label.kind == "proc":
                 cur_procedure += 1
-            block = Flow_Block( label, self.instructions[label.loc : end], cur_procedure, next_l )
+            block = Flow_Block( label, self.instructions[label.loc : end], cur_procedure, next_l, show_alerts )
             self.flow_blocks[cur_procedure].append(block)
 
         # dead instruction elimination pass for each block (flattened flow_blocks list)
-        if dead_code_elimination:
+        if game_context.dead_code_elimination:
             for block in flatten(self.flow_blocks):
                 block.eliminate_dead_instructions()
 
         # construct a flow graph for the flow blocks of each procedure
+        self.jump_label_locs = jump_label_locations(self.jump_labels)
         self.block_graphs = []
         for proc_blocks in self.flow_blocks:
-            self.block_graphs.append( Flow_Block_Graph(proc_blocks, self.jump_labels) )
+            graph = Flow_Block_Graph(proc_blocks, self.jump_labels, self.jump_label_locs, game_context.detect_cycles)
+            if graph.has_cycles and show_alerts:
+                alerts.alert("block cycle", "Cycle detected in block flow graph! " + "->".join(graph.cycle_labels) )
+            self.block_graphs.append( graph )
 
 def unpack_ai_main():
-    global show_alerts
-    global dead_code_elimination
-
     # Parse the arguments
     args = parseArguments()
-    show_alerts = not args.hide_alerts
-    dead_code_elimination = not args.no_dce
+    game_context = Game_Context(show_alerts=not args.hide_alerts, dead_code_elimination=not args.no_dce, detect_cycles=args.detect_cycles)
 
     # Build the table from the given file
     # tbl = EO_name_table()
     # tbl.build_from_file(args.input_file, args.index_width, not args.hide_alerts)
 
+    if args.alert_report:
+        alerts.start_collecting(args.input_file)
+    if args.profile:
+        phase_profile.start_profile(args.profile_memory)
+
     # parse the AI script file
-    flow = Flow_File(args.input_file)
+    flow = Flow_File(args.input_file, game_context)
+    if args.roots:
+        try:
+            roots = flow.find_procedures(args.roots)
+        except ValueError as e:
+            eprint(str(e))
+            sys.exit(1)
+        pruned = flow.prune_procedures(roots)
+        if pruned and game_context.show_alerts:
+            eprint("Dropped " + str(len(pruned)) + " unreachable procedures: " + ", ".join(pruned))
 
     output = ""
-    output += flow.display_disassembly()
+    with phase_profile.phase("display"):
+        output += flow.display_disassembly()
+
+    if args.profile:
+        phase_profile.write_profile(phase_profile.stop_profile(), args.profile)
+    if args.alert_report:
+        alerts.report(alerts.stop_collecting(), args.alert_report)
 
     if args.show_output:
         print(output)
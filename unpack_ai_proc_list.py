@@ -7,7 +7,9 @@
 # written by TheOnlyOne (@modest_ralts)
 
 import argparse
+import os
 from shared_helpers import d
+import unpack_EO_name_table
 
 def parseArguments():
     # Create argument parser
@@ -55,6 +57,90 @@ def get_procedure_names(filename, num_names):
 
     return proc_names
 
+# the procedure lists of each kind of AI, relative to the game's directory, and the name table for its entities (if known)
+procedure_list_files = {
+    "scr" : ("AI/BtlScrFileTable.tbl", "Enemy/enemynametable.tbl"),     # enemies
+    "scrn" : ("AI/BtlNPCScrFileTable.tbl", None),                       # sea allies
+    "scrb" : ("AI/BtlBSTScrFileTable.tbl", None),                       # summons
+}
+
+# what the entities of each kind of AI are called
+entity_kind_names = {
+    "scr" : "enemy",
+    "scrn" : "ally",
+    "scrb" : "summon",
+}
+
+# returns the kind of AI ("scr", "scrn", or "scrb") and the procedure name listed for an AI file's name
+# AI files are named 'AI_<procedure name>.bf', where the procedure name starts with its kind
+def listed_procedure_name(filename):
+    name_info = filename[:-3].split('_', 2)  # 'AI_scr?_name.bf'
+    return name_info[1], '_'.join(name_info[1:])
+
+# maps between the procedures named in a game's procedure lists and the entities that use them
+# entities are identified by their kind and their index in that kind's list
+class Procedure_Index():
+
+    # adds a procedure list of the given kind
+    # entity_names, if known, gives the name of the entity at each index; empty procedure names are skipped
+    def add_list(self, kind, proc_names, entity_names=None):
+        self.procedures[kind] = proc_names
+        self.names[kind] = entity_names
+        for idx, proc_name in enumerate(proc_names):
+            if proc_name:
+                self.entities.setdefault(proc_name, []).append( (kind, idx) )
+
+    # returns the (kind, index) of each entity that uses a procedure, in list order
+    def entities_of(self, proc_name):
+        return self.entities.get(proc_name, [])
+
+    # returns the names of the entities that use a procedure, for the entities whose names are known
+    def entity_names_of(self, proc_name):
+        return [ self.names[kind][idx] for kind, idx in self.entities_of(proc_name) if self.names[kind] is not None ]
+
+    # returns the procedure used by an entity, or None if it does not have one
+    def procedure_of(self, kind, idx):
+        if kind in self.procedures and idx < len(self.procedures[kind]) and self.procedures[kind][idx]:
+            return self.procedures[kind][idx]
+        return None
+
+    # returns the name of an entity, or None if it is not known
+    def entity_name(self, kind, idx):
+        if self.names.get(kind) is not None and idx < len(self.names[kind]):
+            return self.names[kind][idx]
+        return None
+
+    # returns every procedure name in the index
+    def procedure_names(self):
+        return list(self.entities)
+
+    def __init__(self):
+        # procedure names of each kind, by entity index
+        self.procedures = {}
+        # entity names of each kind, by entity index (None if unknown)
+        self.names = {}
+        # (kind, index) of the entities using each procedure name
+        self.entities = {}
+
+# builds the procedure index for the game data in the given directory (such as "EO3")
+# the lists that are missing from the directory are left out
+def build_procedure_index(game_dir):
+    index = Procedure_Index()
+    for kind, (list_file, name_file) in sorted(procedure_list_files.items()):
+        list_path = os.path.join(game_dir, list_file)
+        if not os.path.exists(list_path):
+            continue
+        entity_names = None
+        if name_file is not None and os.path.exists( os.path.join(game_dir, name_file) ):
+            name_table = unpack_EO_name_table.EO_name_table()
+            name_table.build_from_file(os.path.join(game_dir, name_file), 2, False)
+            entity_names = name_table.names
+            num_procs = name_table.size
+        else:
+            num_procs = os.path.getsize(list_path) // 0x20
+        index.add_list( kind, get_procedure_names(list_path, num_procs), entity_names )
+    return index
+
 def unpack_proc_main():
 
     # Parse the arguments
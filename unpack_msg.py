@@ -7,13 +7,11 @@
 
 import argparse
 from struct import unpack
+import alerts
 import convert_EOstring
-from sys import stderr
+import phase_profile
 from shared_helpers import d
 
-def eprint(s):
-    stderr.write(s + "\n")
-
 def parseArguments():
     # Create argument parser
     parser = argparse.ArgumentParser(description="Parses an Etrian Odyssey .mbm/MSG2 file.")
@@ -26,6 +24,9 @@ def parseArguments():
     parser.add_argument("--hide_pos", action="store_true", help="positions will not be displayed")
     parser.add_argument("--show_output", action="store_true", help="output will be printed to console in addition to being saved to the output_file")
     parser.add_argument("--hide_alerts", action="store_true", help="warnings will not be printed to stderr if unknown characters are encountered") 
+    parser.add_argument("--alert_report", metavar="FILE", help="alerts are collected instead of printed as they are raised, and written to this file as JSON, with a summary printed to stderr")
+    parser.add_argument("--profile", metavar="FILE", help="the time spent parsing and displaying the messages is written to this file as JSON")
+    parser.add_argument("--profile_memory", action="store_true", help="with --profile, the peak memory allocated while parsing and displaying is recorded too (this makes everything much slower)")
 
 
     # Print version
@@ -48,27 +49,28 @@ def parseArguments():
 class EO_MSG_table:
 
     # Populate the table using the raw data
+    @phase_profile.profiled("message table")
     def build_from_data(self, data, alert_unk=False):
 
         # read the header of the file
         header = unpack("<2I4H4I", data[0:0x20])
         if alert_unk:
             if header[0] != 0:
-                eprint("Unknown padding at byte 0x00: " + "{:#010x}".format(header[0]))
+                alerts.alert("msg header", "Unknown padding at byte 0x00: " + "{:#010x}".format(header[0]))
             if header[1] != 0x3247534D:
-                eprint("MSG2 tag not found, it was: " + "{:#010x}".format(header[1]))
+                alerts.alert("msg header", "MSG2 tag not found, it was: " + "{:#010x}".format(header[1]))
             if header[2] != 0:
-                eprint("Unknown padding at byte 0x08: " + "{:#06x}".format(header[2]))
+                alerts.alert("msg header", "Unknown padding at byte 0x08: " + "{:#06x}".format(header[2]))
             if header[3] != 1:
-                eprint("Unknown padding at byte 0x0A: " + "{:#06x}".format(header[3]))
+                alerts.alert("msg header", "Unknown padding at byte 0x0A: " + "{:#06x}".format(header[3]))
             if header[5] != 0:
-                eprint("Unknown padding at byte 0x0E: " + "{:#06x}".format(header[5]))
+                alerts.alert("msg header", "Unknown padding at byte 0x0E: " + "{:#06x}".format(header[5]))
             if header[7] != 0x20:
-                eprint("Unknown padding at byte 0x14: " + "{:#010x}".format(header[7]))
+                alerts.alert("msg header", "Unknown padding at byte 0x14: " + "{:#010x}".format(header[7]))
             if header[8] != 0:
-                eprint("Unknown padding at byte 0x18: " + "{:#010x}".format(header[8]))
+                alerts.alert("msg header", "Unknown padding at byte 0x18: " + "{:#010x}".format(header[8]))
             if header[9] != 0:
-                eprint("Unknown padding at byte 0x1B: " + "{:#010x}".format(header[9]))
+                alerts.alert("msg header", "Unknown padding at byte 0x1B: " + "{:#010x}".format(header[9]))
 
         filesize = header[4]
         self.size = header[6]
@@ -84,7 +86,7 @@ class EO_MSG_table:
             self.sizes.append(subheader[1])
             self.positions.append(subheader[2])
             if subheader[3] != 0:
-                eprint("Unknown padding at position " + "{:#010x}".format(cur_pos-0x10) + ": " + "{:#010x}".format(subheader[3]))
+                alerts.alert("msg padding", "Unknown padding at position " + "{:#010x}".format(cur_pos-0x10) + ": " + "{:#010x}".format(subheader[3]))
             amount_found += 1 
 
         # read the names
@@ -116,22 +118,35 @@ class EO_MSG_table:
         self.indices = []
         self.sizes = []
 
+# Construct the output for a table
+def display_msg_table(tbl):
+    lines = ["index\tmessage"]
+
+    for index in range(0, tbl.size):
+        row_data = [str(tbl.indices[index])]
+        row_data.append( tbl.names[index].replace("\n", "\n\t") )
+        lines += ["\t".join(row_data) + "\n"]
+    return "\n".join(lines)
+
 if __name__ == '__main__':
     # Parse the arguments
     args = parseArguments()
 
     # Build the table from the given file
+    if args.alert_report:
+        alerts.start_collecting(args.input_file)
+    if args.profile:
+        phase_profile.start_profile(args.profile_memory)
     tbl = EO_MSG_table()
     tbl.build_from_file(args.input_file,  not args.hide_alerts)
+    if args.alert_report:
+        alerts.report(alerts.stop_collecting(), args.alert_report)
 
     # Construct the output
-    lines = ["index\tmessage"]
-
-    for index in range(0, tbl.size):
-        row_data = [str(tbl.indices[index])]
-        row_data.append( tbl.names[index].replace("\n", "\n\t") )
-        lines += ["\t".join(row_data) + "\n"]
-    output = "\n".join(lines)
+    with phase_profile.phase("display"):
+        output = display_msg_table(tbl)
+    if args.profile:
+        phase_profile.write_profile(phase_profile.stop_profile(), args.profile)
 
     if args.show_output:
         print(output)